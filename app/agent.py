@@ -11,38 +11,91 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from google.cloud.trace_v1 import ListTracesRequest
 # mypy: disable-error-code="union-attr"
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any
+
+from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langchain_google_vertexai import ChatVertexAI
+from langchain_google_vertexai.utils import create_context_cache
 from langgraph.graph import END, MessagesState, StateGraph
-from langgraph.prebuilt import ToolNode
-from google.cloud import logging
-from github import Github
-from github import Auth
-from dotenv import load_dotenv
-import os
-import requests
-import json
-from google.cloud import trace_v1
-from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
+from langgraph.utils.runnable import RunnableCallable
+
+from app.utils.alerts import (
+    DEFAULT_BURST,
+    DEFAULT_DEDUP_WINDOW,
+    DEFAULT_MAX_CHARS,
+    AlertPipeline,
+    logs_console_url,
+    slack_payload,
+    trace_console_url,
+)
+from app.utils.clients import get_github, get_http_session, registry
+from app.utils.github_contents import ContentCache, GitHubContents
+from app.utils.history import DEFAULT_KEEP_TURNS, DEFAULT_MAX_TOKENS, compact_history
+from app.utils.log_templates import TemplateMiner
+from app.utils.logs import (
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_ENTRIES,
+    DEFAULT_PAGE_SIZE,
+    InvalidPageToken,
+    LogPage,
+    build_log_filter,
+    iter_log_records,
+    read_log_page,
+)
+from app.utils.monitor import Anomaly, AnomalyMonitor
+from app.utils.prompt import DEFAULT_CACHE_TTL, PromptCache, SystemPrompt
+from app.utils.repo_index import RepoIndex
+from app.utils.result_store import (
+    DEFAULT_INLINE_LIMIT,
+    DEFAULT_MAX_DISK_BYTES,
+    DEFAULT_READ_LIMIT,
+    ResultStore,
+    UnknownHandle,
+)
+from app.utils.sketches import LatencySketches
+from app.utils.source_slice import enclosing_block, slice_lines
+from app.utils.sources import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_SOURCE_TIMEOUT,
+    Source,
+    SourceRegistry,
+    decode_cursor,
+    encode_cursor,
+    load_sources,
+    merge_by_timestamp,
+)
+from app.utils.time_buckets import DEFAULT_BUCKET_SECONDS
+from app.utils.tool_executor import DEFAULT_QUEUE_TIMEOUT, ParallelToolExecutor
+from app.utils.traces import (
+    DEFAULT_SERVICE_LABEL,
+    DEFAULT_TOP_N,
+    iter_trace_records,
+    summarize_trace_records,
+    trace_filter,
+)
+from app.utils.window_cache import DEFAULT_OPEN_TTL, WindowCache
 
 load_dotenv()
 
 LOCATION = "us-central1"
 LLM = "gemini-2.0-flash-001"
 
-system_message = f"""
+system_message = """
 You are an advanced production monitoring agent responsible for overseeing our deployed environment. Your tasks include:
 
 1. Querying logs and traces from the past 24 hours—do not look beyond this period.
 2. Answer questions such as:
    - "Can you give me the list of calls we had in the Cloud Run service in the last 12 hours?"
    - "What was the last issue faced?"
-   - "Analyze the logs and traces to determine which part of the project’s code might be the root cause."
+   - "Analyze the logs and traces to determine which part of the project's code might be the root cause."
 3. For any incident detected:
    - Extract key details (error messages, timestamps, etc.) from logs and traces.
    - Identify if the error references a specific source file.
@@ -52,109 +105,607 @@ You are an advanced production monitoring agent responsible for overseeing our d
 4. If no anomalies or errors are found, confirm that the system is operating normally.
 
 Always include relevant context (e.g., error details, affected file names) in your responses and ensure that the timeframe does not exceed 24 hours.
-Current date and time (Europe/Paris): {datetime.now(ZoneInfo("Europe/Paris")).strftime('%Y-%m-%d %H:%M')}
 """
+# The current time is rendered per call; the instructions above are static.
+system_prompt = SystemPrompt(system_message)
 
 SLACK_WEBHOOK_URL = os.environ.get("SLACK_WEBHOOK_URL")
 GCP_PROJECT_NAME = os.environ.get("GCP_PROJECT_NAME")
 CLOUD_RUN_NAME = os.environ.get("CLOUD_RUN_NAME")
 ACCESS_TOKEN = os.environ.get("ACCESS_TOKEN")
+GITHUB_REPO = os.environ.get("GITHUB_REPO", "dashq-norma/dashq-api-service")
+GITHUB_FILE_REF = os.environ.get("GITHUB_FILE_REF", "dev")
+GITHUB_SEARCH_REF = os.environ.get("GITHUB_SEARCH_REF", "main")
+REPO_MIRROR_ENABLED = os.environ.get("REPO_MIRROR_ENABLED", "true").lower() == "true"
+REPO_MIRROR_REFRESH_INTERVAL = float(
+    os.environ.get("REPO_MIRROR_REFRESH_INTERVAL", 300)
+)
+LOG_PAGE_SIZE = int(os.environ.get("LOG_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", DEFAULT_MAX_BYTES))
+LOG_SUMMARY_MAX_ENTRIES = int(os.environ.get("LOG_SUMMARY_MAX_ENTRIES", 20000))
+LOG_SUMMARY_TOP_TEMPLATES = int(os.environ.get("LOG_SUMMARY_TOP_TEMPLATES", 30))
+TRACE_PAGE_SIZE = int(os.environ.get("TRACE_PAGE_SIZE", 100))
+TRACE_MAX_TRACES = int(os.environ.get("TRACE_MAX_TRACES", 2000))
+# Span label naming the service, to tell apart sources sharing a project.
+TRACE_SERVICE_LABEL = os.environ.get("TRACE_SERVICE_LABEL", DEFAULT_SERVICE_LABEL)
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 30))
+TOOL_MAX_WORKERS = int(os.environ.get("TOOL_MAX_WORKERS", 32))
+TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT", 120))
+TOOL_QUEUE_TIMEOUT = float(os.environ.get("TOOL_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT))
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "false").lower() == "true"
+PROMPT_CACHE_TTL = float(os.environ.get("PROMPT_CACHE_TTL", DEFAULT_CACHE_TTL))
+HISTORY_MAX_TOKENS = int(os.environ.get("HISTORY_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", DEFAULT_KEEP_TURNS))
+RESULT_INLINE_LIMIT = int(os.environ.get("RESULT_INLINE_LIMIT", DEFAULT_INLINE_LIMIT))
+RESULT_STORE_MAX_DISK_BYTES = int(
+    os.environ.get("RESULT_STORE_MAX_DISK_BYTES", DEFAULT_MAX_DISK_BYTES)
+)
+ALERT_DEDUP_WINDOW = float(os.environ.get("ALERT_DEDUP_WINDOW", DEFAULT_DEDUP_WINDOW))
+ALERT_RATE_PER_MINUTE = float(os.environ.get("ALERT_RATE_PER_MINUTE", 1))
+ALERT_BURST = int(os.environ.get("ALERT_BURST", DEFAULT_BURST))
+ALERT_MAX_CHARS = int(os.environ.get("ALERT_MAX_CHARS", DEFAULT_MAX_CHARS))
+ANOMALY_MONITOR_ENABLED = (
+    os.environ.get("ANOMALY_MONITOR_ENABLED", "false").lower() == "true"
+)
+ANOMALY_MONITOR_INTERVAL = float(os.environ.get("ANOMALY_MONITOR_INTERVAL", 60))
+ANOMALY_THRESHOLD = float(os.environ.get("ANOMALY_THRESHOLD", 4.0))
+SKETCH_BUCKET_SECONDS = int(
+    os.environ.get("SKETCH_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS)
+)
+WINDOW_CACHE_BUCKET_SECONDS = int(
+    os.environ.get("WINDOW_CACHE_BUCKET_SECONDS", DEFAULT_BUCKET_SECONDS)
+)
+WINDOW_CACHE_OPEN_TTL = float(os.environ.get("WINDOW_CACHE_OPEN_TTL", DEFAULT_OPEN_TTL))
+# JSON list of {"name", "project", "service", "trace_label"}, or the path of a
+# JSON file.
+MONITORED_SOURCES = os.environ.get("MONITORED_SOURCES")
+SOURCE_MAX_WORKERS = int(os.environ.get("SOURCE_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+SOURCE_TIMEOUT = float(os.environ.get("SOURCE_TIMEOUT", DEFAULT_SOURCE_TIMEOUT))
+
+github_contents = GitHubContents(
+    GITHUB_REPO,
+    ACCESS_TOKEN,
+    cache=ContentCache(disk_dir=os.environ.get("GITHUB_CACHE_DIR")),
+    timeout=HTTP_TIMEOUT,
+)
+repo_index = RepoIndex(
+    GITHUB_REPO,
+    ACCESS_TOKEN,
+    ref=GITHUB_SEARCH_REF,
+    contents=github_contents,
+    refresh_interval=REPO_MIRROR_REFRESH_INTERVAL,
+)
+
+
+result_store = ResultStore(
+    spill_dir=os.environ.get("RESULT_STORE_DIR"),
+    max_disk_bytes=RESULT_STORE_MAX_DISK_BYTES,
+    inline_limit=RESULT_INLINE_LIMIT,
+)
+
+# The monitored environments; the tools query the default one unless asked.
+default_source = Source(CLOUD_RUN_NAME or "default", GCP_PROJECT_NAME, CLOUD_RUN_NAME)
+source_registry = SourceRegistry(
+    load_sources(MONITORED_SOURCES),
+    default_source,
+    max_workers=SOURCE_MAX_WORKERS,
+    timeout=SOURCE_TIMEOUT,
+)
+
+# Root span latencies of every fetched trace, for constant-size comparisons.
+latency_sketches = LatencySketches(bucket_seconds=SKETCH_BUCKET_SECONDS)
+
+# Trace and log records of already fetched time buckets, reused across queries.
+window_cache = WindowCache(
+    bucket_seconds=WINDOW_CACHE_BUCKET_SECONDS, open_ttl=WINDOW_CACHE_OPEN_TTL
+)
+
+alerts = AlertPipeline(
+    SLACK_WEBHOOK_URL,
+    session=get_http_session,
+    dedup_window=ALERT_DEDUP_WINDOW,
+    rate=ALERT_RATE_PER_MINUTE / 60,
+    burst=ALERT_BURST,
+    max_chars=ALERT_MAX_CHARS,
+    timeout=HTTP_TIMEOUT,
+)
+
+
+def _repo_index_ready() -> bool:
+    """Start the repository mirror on first use and report whether it is synced.
+
+    Searches fall back to the GitHub API until the first snapshot is indexed.
+    """
+    if not REPO_MIRROR_ENABLED:
+        return False
+    repo_index.start()
+    return repo_index.ready.is_set()
+
 
 # 1. Create an alert context
 # severity="DEFAULT" should be switch to "ERROR" in prod.
-def send_slack_alert(error_logs, severity="DEFAULT", dry_run=False):
-    """Sends an error message with GCP logs."""
+def send_slack_alert(
+    error_logs, severity="DEFAULT", dry_run=False, signature=None, link=None
+):
+    """Queues an error message with GCP logs.
+
+    Alerts are deduplicated by the fingerprint of `signature` (or of the message),
+    rate limited, and sent in the background, so this never waits on Slack.
+    Returns whether the alert was queued.
+    """
+    if dry_run:
+        payload = slack_payload(error_logs, severity)
+        print("[Test] Slack alert:", json.dumps(payload, indent=2))
+        return False
 
-    payload = {
-        "attachments": [
-            {
-                "fallback": f"*{severity} in production",
-                "text": f"```{error_logs}```",
+    return alerts.submit(error_logs, severity=severity, signature=signature, link=link)
 
-            }
-        ]
-    }
 
-    if dry_run:
-        print("[Test] Slack alert:", json.dumps(payload, indent=2))
-        return
+def source_trace_filter(source: Source) -> str:
+    """Returns the Cloud Trace filter selecting the traces of a source."""
+    return trace_filter(
+        source.service, source_registry.trace_label(source, TRACE_SERVICE_LABEL)
+    )
+
+
+def list_trace_records(
+    start_time: datetime, end_time: datetime, source: Source = default_source
+) -> list[dict]:
+    """Lists the compact records of the traces of a source started in a time range."""
+    # Imported here to keep the Cloud Trace protos out of the startup path.
+    from google.cloud.trace_v1 import ListTracesRequest
+
+    request = ListTracesRequest(
+        project_id=source.project or GCP_PROJECT_NAME,
+        start_time=start_time,
+        end_time=end_time,
+        filter=source_trace_filter(source),
+        view=ListTracesRequest.ViewType.COMPLETE,
+        page_size=TRACE_PAGE_SIZE,
+    )
+
+    # The pager fetches pages lazily, so traces beyond the limit are never read.
+    records = registry.call(
+        "trace",
+        lambda client: list(
+            iter_trace_records(
+                client.list_traces(request=request), limit=TRACE_MAX_TRACES
+            )
+        ),
+    )
+    latency_sketches.add_trace_records(records, source.name)
+    # Covered ranges are only tracked for the default source. A truncated fetch
+    # is covered too: fetching it again would stop at the same limit.
+    if source == default_source:
+        latency_sketches.mark_covered(
+            start_time, end_time, complete=len(records) < TRACE_MAX_TRACES
+        )
+    return records
+
+
+def _with_completeness(records: list[dict], limit: int) -> tuple[list[dict], bool]:
+    """Pairs fetched records with whether the fetch stopped before its limit."""
+    return records, len(records) < limit
+
+
+def list_error_logs(
+    start_time: datetime, end_time: datetime, source: Source = default_source
+) -> list[dict]:
+    """Lists the error log records of a monitored service in a time range."""
+    filter_str = build_log_filter(
+        source.service,
+        start_time.isoformat(),
+        end_time.isoformat(),
+        min_severity="ERROR",
+    )
+    return registry.call(
+        "logging",
+        lambda client: list(
+            iter_log_records(
+                client,
+                filter_str,
+                page_size=LOG_PAGE_SIZE,
+                limit=LOG_SUMMARY_MAX_ENTRIES,
+                fields=["timestamp", "severity", "message"],
+            )
+        ),
+        source.project,
+    )
 
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(SLACK_WEBHOOK_URL, data=json.dumps(payload), headers=headers)
 
-    if response.status_code != 200:
-        print(f"Error while sending message to Slack: {response.text}")
+def _anomaly_link(anomaly: Anomaly) -> str | None:
+    """Links an anomaly to its example trace, or to the query of its error logs."""
+    if anomaly.source != "logs":
+        return trace_console_url(default_source.project, anomaly.trace_id)
+    if anomaly.start is None or anomaly.end is None:
+        return None
+    query = build_log_filter(
+        default_source.service,
+        anomaly.start.isoformat(),
+        anomaly.end.isoformat(),
+        min_severity="ERROR",
+    )
+    return logs_console_url(default_source.project, query)
+
+
+# Watches the traces and logs of the default source in the background, started
+# by the server when enabled.
+anomaly_monitor = AnomalyMonitor(
+    list_trace_records,
+    list_error_logs,
+    alert=lambda anomaly: send_slack_alert(
+        anomaly.describe(), signature=anomaly.signature, link=_anomaly_link(anomaly)
+    ),
+    state_path=os.environ.get("ANOMALY_MONITOR_STATE"),
+    interval=ANOMALY_MONITOR_INTERVAL,
+    threshold=ANOMALY_THRESHOLD,
+)
 
 
 # 2. Define tools
 @tool
-def check_gcp_traces(start_time: str, end_time: str) -> str:
-    """Check GCP traces for anomalies and return relevant details."""
-    client = trace_v1.TraceServiceClient()
+def check_gcp_traces(
+    start_time: str,
+    end_time: str,
+    top_n: int = DEFAULT_TOP_N,
+    sources: list[str] | None = None,
+) -> str:
+    """
+    Check GCP traces for anomalies and return relevant details.
+
+    Traces are summarized rather than returned raw: latency percentiles
+    (p50/p95/p99) per root span name, the slowest traces, the erroring traces
+    with their error messages, and the error messages grouped into templates.
+
+    Args:
+        start_time (datetime): The start time (inclusive) for the trace query in UTC.
+        end_time (datetime): The end time (exclusive) for the trace query in UTC.
+        top_n (int): Number of slowest and erroring traces to list.
+        sources (list[str], optional): Names of the monitored services to check,
+            or ["all"]; the default service if omitted.
 
+    Returns:
+        str: A JSON object with the trace summary. With several sources, the
+            listed traces are tagged with their `source`, trace counts are given
+            per source, and sources that failed or timed out are listed in
+            `source_errors`.
+    """
+    try:
+        selected = source_registry.resolve(sources)
+    except ValueError as e:
+        return f"Invalid trace query: {e}"
     start_time = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
     end_time = datetime.fromisoformat(end_time.replace("Z", "+00:00"))
 
-    request = trace_v1.ListTracesRequest(
-        project_id=GCP_PROJECT_NAME,
-        start_time=start_time,
-        end_time=end_time,
-    )
+    # Sources sharing a project are queried for the traces of their own
+    # service, so they are still told apart.
+    def fetch(source: Source) -> tuple[list[dict], bool]:
+        return window_cache.get(
+            ("traces", source.project or GCP_PROJECT_NAME, source_trace_filter(source)),
+            start_time,
+            end_time,
+            lambda start, end: _with_completeness(
+                list_trace_records(start, end, source), TRACE_MAX_TRACES
+            ),
+            timestamp=lambda record: record["start_time"],
+        )
+
+    if len(selected) == 1:
+        records, complete = fetch(selected[0])
+        summary = summarize_trace_records(records, top_n=top_n)
+        summary["truncated"] = not complete
+    else:
+        results, errors = source_registry.fan_out(selected, fetch)
+        records = merge_by_timestamp(
+            {name: result[0] for name, result in results.items()}, key="start_time"
+        )
+        summary = summarize_trace_records(records, top_n=top_n)
+        summary["truncated"] = not all(result[1] for result in results.values())
+        summary["by_source"] = {
+            name: {"trace_count": len(result[0]), "truncated": not result[1]}
+            for name, result in results.items()
+        }
+        summary["source_errors"] = errors
+
+    if summary["error_trace_count"]:
+        # Link the latest erroring trace, in the project of its source.
+        latest: dict[str, Any] = next(iter(summary["error_traces"]), {})
+        project = next(
+            (s.project for s in selected if s.name == latest.get("source")),
+            selected[0].project,
+        )
+        # Re-checking the same incident yields the same templates, which
+        # deduplicates the alert whatever the counts.
+        send_slack_alert(
+            json.dumps(
+                {
+                    "error_trace_count": summary["error_trace_count"],
+                    "error_templates": summary["error_templates"],
+                },
+                indent=2,
+            ),
+            signature="\n".join(
+                sorted(t["template"] for t in summary["error_templates"])
+            ),
+            link=trace_console_url(project or GCP_PROJECT_NAME, latest.get("trace_id")),
+        )
+
+    return json.dumps(summary)
 
-    traces = client.list_traces(request=request)
-    traces_str = str(traces)
 
-    if "error" in traces_str.lower() or "exception" in traces_str.lower():
-        send_slack_alert(traces_str)
+@tool
+def compare_trace_latency(
+    baseline_start: str,
+    baseline_end: str,
+    start_time: str,
+    end_time: str,
+    span_name: str | None = None,
+    top_n: int = DEFAULT_TOP_N,
+) -> str:
+    """
+    Compare trace latency between a baseline window and a current window.
+
+    Answers "was it slower than usual" without reading raw traces: latencies
+    are kept in quantile sketches per root span name and time bucket, and only
+    the parts of the windows that were never fetched are read from Cloud Trace.
+    Windows are aligned to the sketch buckets (5 minutes by default).
 
-    return traces_str
+    Args:
+        baseline_start (datetime): The start time (inclusive) of the baseline in UTC.
+        baseline_end (datetime): The end time (exclusive) of the baseline in UTC.
+        start_time (datetime): The start time (inclusive) of the current window in UTC.
+        end_time (datetime): The end time (exclusive) of the current window in UTC.
+        span_name (str, optional): Only compare this root span name.
+        top_n (int): Number of root span names to return, busiest first.
+
+    Returns:
+        str: A JSON object with, per root span name, the count and p50/p95/p99
+            latencies of both windows and the change of the share of traces in
+            each latency band. `truncated` tells, per window, whether some of
+            its traces were not counted because a fetch hit its trace limit.
+    """
+    baseline = (baseline_start, baseline_end)
+    current = (start_time, end_time)
+    for start, end in (baseline, current):
+        for gap_start, gap_end in latency_sketches.missing(start, end):
+            list_trace_records(gap_start, gap_end)
+    spans = latency_sketches.compare(
+        baseline, current, service=default_source.name, span=span_name
+    )
+    return json.dumps(
+        {
+            "bucket_seconds": SKETCH_BUCKET_SECONDS,
+            "truncated": {
+                "baseline": latency_sketches.truncated(*baseline),
+                "current": latency_sketches.truncated(*current),
+            },
+            "by_root_span": spans[:top_n],
+        }
+    )
 
 
 @tool
-def get_gcp_logs(start_time: str, end_time: str) -> str:
+def get_gcp_logs(
+    start_time: str,
+    end_time: str,
+    page_token: str | None = None,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    min_severity: str | None = None,
+    text: str | None = None,
+    regex: str | None = None,
+    status_min: int | None = None,
+    status_max: int | None = None,
+    trace_id: str | None = None,
+    fields: list[str] | None = None,
+    summarize: bool = False,
+    sources: list[str] | None = None,
+) -> str:
     """
     Get app logs within a specified timestamp range.
 
+    Logs are returned one bounded page at a time as compact records
+    (timestamp, severity, message, trace, source location). When more entries
+    are available, the result contains a `next_page_token`: call this tool again
+    with the same arguments and that token to read the next page.
+
+    Prefer narrowing the query with the filter arguments (e.g.
+    `min_severity="ERROR"`) rather than paging through every INFO line, and
+    start with `summarize=True` to get an overview of a large window: log
+    messages are then grouped into templates with counts, first/last seen
+    timestamps and a few exemplars instead of being returned one by one.
+
     Args:
         start_time (datetime): The start time (inclusive) for the log query in UTC.
         end_time (datetime): The end time (exclusive) for the log query in UTC.
+        page_token (str, optional): The `next_page_token` of a previous call.
+        max_entries (int): Maximum number of log records to return.
+        min_severity (str, optional): Minimum severity: DEBUG, INFO, NOTICE,
+            WARNING, ERROR, CRITICAL, ALERT or EMERGENCY.
+        text (str, optional): Substring the log message must contain.
+        regex (str, optional): RE2 regular expression the log message must match.
+        status_min (int, optional): Minimum HTTP response status, e.g. 500.
+        status_max (int, optional): Maximum HTTP response status, e.g. 599.
+        trace_id (str, optional): Only return logs written for this trace.
+        fields (list[str], optional): Record fields to return instead of the
+            defaults, e.g. ["timestamp", "message", "http_request"] or
+            "payload.<key>" for a key of a JSON payload.
+        summarize (bool): Return message templates instead of individual records.
+        sources (list[str], optional): Names of the monitored services to query,
+            or ["all"]; the default service if omitted.
 
     Returns:
-        str: A string representation of the retrieved log entries.
+        str: A JSON object with the log records and the continuation token,
+            or with the message templates when `summarize` is set. With several
+            sources, the records of all sources are merged in timestamp order
+            and tagged with their `source`, templates are returned per source,
+            and sources that failed or timed out are listed in `source_errors`.
     """
 
-    # Convert start_time and end_time to datetime objects if they are provided as strings.
-
-    # Initialize the client
-    client = logging.Client()
+    try:
+        selected = source_registry.resolve(sources)
+    except ValueError as e:
+        return f"Invalid log query: {e}"
+    query = (min_severity, text, regex, status_min, status_max, trace_id)
 
-    # Define a filter for Cloud Run logs with a timestamp range.
+    # Push every constraint into the Cloud Logging filter so that only
+    # matching entries are transferred.
     # Note: Ensure start_time and end_time are timezone-aware or in UTC.
-    filter_str = (
-        f'resource.labels.service_name="{CLOUD_RUN_NAME}" '
-        f'AND timestamp >= "{start_time}" '
-        f'AND timestamp < "{end_time}"'
-    )
-
-    # List log entries using the filter
-    entries = list(client.list_entries(filter_=filter_str))
+    try:
+        filters = {
+            source.name: build_log_filter(source.service, start_time, end_time, *query)
+            for source in selected
+        }
+    except ValueError as e:
+        return f"Invalid log query: {e}"
+
+    if summarize:
+
+        def summarize_source(source: Source) -> dict:
+            def fetch(start: datetime, end: datetime) -> tuple[list[dict], bool]:
+                # Same filter, restricted to the time buckets not cached yet.
+                run_filter = build_log_filter(
+                    source.service, start.isoformat(), end.isoformat(), *query
+                )
+                records = registry.call(
+                    "logging",
+                    lambda client: list(
+                        iter_log_records(
+                            client,
+                            run_filter,
+                            page_size=LOG_PAGE_SIZE,
+                            limit=LOG_SUMMARY_MAX_ENTRIES,
+                        )
+                    ),
+                    source.project,
+                )
+                return _with_completeness(records, LOG_SUMMARY_MAX_ENTRIES)
+
+            records, complete = window_cache.get(
+                ("logs", source.project, source.service, *query),
+                start_time,
+                end_time,
+                fetch,
+                timestamp=lambda record: record.get("timestamp"),
+            )
+            miner = TemplateMiner()
+            for record in records[:LOG_SUMMARY_MAX_ENTRIES]:
+                miner.add(
+                    record.get("message", ""),
+                    timestamp=record.get("timestamp"),
+                    severity=record.get("severity"),
+                )
+            return {
+                "templates": miner.summary(LOG_SUMMARY_TOP_TEMPLATES),
+                "template_count": len(miner.templates),
+                "scanned_entries": min(len(records), LOG_SUMMARY_MAX_ENTRIES),
+                "truncated": not complete or len(records) > LOG_SUMMARY_MAX_ENTRIES,
+            }
 
-    return str(entries)
+        if len(selected) == 1:
+            return json.dumps(summarize_source(selected[0]))
+        summaries, errors = source_registry.fan_out(selected, summarize_source)
+        return json.dumps({"sources": summaries, "source_errors": errors})
+
+    if len(selected) == 1:
+        source = selected[0]
+        try:
+            page = registry.call(
+                "log_entries",
+                lambda client: read_log_page(
+                    client,
+                    source.project,
+                    filters[source.name],
+                    page_token=page_token,
+                    page_size=LOG_PAGE_SIZE,
+                    max_entries=max_entries,
+                    max_bytes=LOG_MAX_BYTES,
+                    fields=fields,
+                ),
+            )
+        except InvalidPageToken as e:
+            return f"Invalid page_token: {e}"
+        return page.to_json()
+
+    # Each source is paged on its own; the page token holds all their tokens.
+    try:
+        tokens = (
+            decode_cursor(page_token, filters) if page_token else dict.fromkeys(filters)
+        )
+    except ValueError as e:
+        return f"Invalid page_token: {e}"
+    pending = [source for source in selected if source.name in tokens]
+
+    def read_source(source: Source) -> LogPage:
+        return registry.call(
+            "log_entries",
+            lambda client: read_log_page(
+                client,
+                source.project,
+                filters[source.name],
+                page_token=tokens[source.name],
+                page_size=LOG_PAGE_SIZE,
+                max_entries=max(max_entries // len(pending), 1),
+                max_bytes=LOG_MAX_BYTES // len(pending),
+                fields=fields,
+            ),
+        )
+
+    pages, errors = source_registry.fan_out(pending, read_source)
+    next_tokens = {
+        name: page.next_page_token
+        for name, page in pages.items()
+        if page.next_page_token is not None
+    }
+    # Failed sources are reported in `source_errors` and not paged further,
+    # so that paging ends even when a source keeps failing.
+    entries = merge_by_timestamp({name: page.entries for name, page in pages.items()})
+    return json.dumps(
+        {
+            "entries": entries,
+            "count": len(entries),
+            "truncated": bool(next_tokens),
+            "next_page_token": encode_cursor(next_tokens) if next_tokens else None,
+            "source_errors": errors,
+        },
+        default=str,
+    )
 
 
 @tool
 def query_github_file(
-        relative_path: str
+    relative_path: str,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    around_line: int | None = None,
 ) -> str:
-    """Get the code source of a files on the GitHub repository."""
-    print('==================== GET GITHUB FILE ====================')
+    """
+    Get the code source of a files on the GitHub repository.
+
+    Prefer reading only the relevant part of a file: when a stack trace points
+    at a line, pass it as `around_line` to get the enclosing function or class,
+    or pass `start_line`/`end_line` to read a range. Returned slices are
+    prefixed with their line numbers.
+
+    Args:
+        relative_path (str): Path of the file relative to the repository root.
+        start_line (int, optional): First line to return (1-based).
+        end_line (int, optional): Last line to return (inclusive).
+        around_line (int, optional): Return the function or class enclosing
+            this line.
+
+    Returns:
+        str: The file content, or the requested line-numbered slice.
+    """
+    print("==================== GET GITHUB FILE ====================")
     print(relative_path)
-    auth = Auth.Token(ACCESS_TOKEN)
-    g = Github(auth=auth)
-    repo = g.get_repo("dashq-norma/dashq-api-service")
-    file_content = repo.get_contents(relative_path, ref="dev")
-    g.close()
-    return file_content.decoded_content.decode("utf-8")
+    content = github_contents.read(relative_path, ref=GITHUB_FILE_REF)
+    if around_line is not None:
+        block = enclosing_block(content, around_line, relative_path)
+        header = f"# {block.name or relative_path} (lines {block.start}-{block.end})"
+        return header + "\n" + slice_lines(content, block.start, block.end)
+    if start_line is not None or end_line is not None:
+        return slice_lines(content, start_line, end_line)
+    return content
 
 
 @tool
@@ -162,23 +713,24 @@ def search_github_repo(query: str) -> str:
     """
     Search the GitHub repository for files matching the query.
     Args:
-        query (str): A keyword or regex pattern to filter file names.
+        query (str): A keyword to filter file names.
     Returns:
         str: A list of file paths (as a string) that match the query.
     """
-    auth = Auth.Token(ACCESS_TOKEN)
-    g = Github(auth=auth)
+    if _repo_index_ready():
+        return json.dumps(repo_index.search_paths(query), indent=2)
     try:
-        repo = g.get_repo("dashq-norma/dashq-api-service")
+        repo = get_github(ACCESS_TOKEN).get_repo(GITHUB_REPO)
         # Retrieve the entire repository tree (you may need to adjust branch as needed)
-        tree = repo.get_git_tree("main", recursive=True)
-        matching_files = [file.path for file in tree.tree if query.lower() in file.path.lower()]
+        tree = repo.get_git_tree(GITHUB_SEARCH_REF, recursive=True)
+        matching_files = [
+            file.path for file in tree.tree if query.lower() in file.path.lower()
+        ]
         return json.dumps(matching_files, indent=2)
     except Exception as e:
         return f"GitHub repository search error: {e}"
-    finally:
-        g.close()
-        
+
+
 @tool
 def search_github_code(query: str) -> str:
     """
@@ -186,17 +738,19 @@ def search_github_code(query: str) -> str:
     Args:
         query (str): The keyword or phrase to search within file contents.
     Returns:
-        str: A JSON-formatted list of matching file paths and code snippets.
+        str: A JSON-formatted list of matching file paths and line-numbered
+            code snippets.
     """
+    if _repo_index_ready():
+        return json.dumps(repo_index.search_code(query), indent=2)
     try:
         headers = {"Authorization": f"token {ACCESS_TOKEN}"}
         search_url = "https://api.github.com/search/code"
         # The 'q' parameter combines the query with the repository qualifier.
-        params = {
-            "q": f"{query} repo:dashq-norma/dashq-api-service",
-            "per_page": 10
-        }
-        response = requests.get(search_url, headers=headers, params=params)
+        params = {"q": f"{query} repo:{GITHUB_REPO}", "per_page": 10}
+        response = get_http_session().get(
+            search_url, headers=headers, params=params, timeout=HTTP_TIMEOUT
+        )
         if response.status_code != 200:
             return f"GitHub code search error: {response.text}"
         results = response.json()
@@ -204,7 +758,70 @@ def search_github_code(query: str) -> str:
     except Exception as e:
         return f"Exception during GitHub code search: {e}"
 
-tools = [get_gcp_logs, check_gcp_traces, query_github_file, search_github_repo, search_github_code]
+
+@tool
+def read_tool_result(
+    handle: str,
+    offset: int = 0,
+    limit: int = DEFAULT_READ_LIMIT,
+    pattern: str | None = None,
+) -> str:
+    """
+    Read a large tool result that was stored out of band.
+
+    Large tool results are replaced by a `result_handle` and a preview. Use this
+    tool to page through the lines of the full result, or to grep it. JSON
+    results are pretty-printed, one field per line.
+
+    Args:
+        handle (str): The `result_handle` of the stored result.
+        offset (int): Index of the first line (or match) to return.
+        limit (int): Maximum number of lines to return.
+        pattern (str, optional): Case-insensitive regular expression; only the
+            matching lines are returned.
+
+    Returns:
+        str: A JSON object with the numbered lines and the `next_offset` of
+            the next page, if any.
+    """
+    try:
+        return json.dumps(result_store.read(handle, offset, limit, pattern))
+    except UnknownHandle:
+        return f"Unknown result handle: {handle}"
+
+
+@tool
+def aggregate_tool_result(handle: str, field: str) -> str:
+    """
+    Count the values of a field across the records of a stored JSON result.
+
+    Args:
+        handle (str): The `result_handle` of the stored result.
+        field (str): Dotted path of the field, e.g. "severity" or
+            "payload.status".
+
+    Returns:
+        str: A JSON object with the number of records and the most common
+            values of the field with their counts.
+    """
+    try:
+        return json.dumps(result_store.aggregate(handle, field), default=str)
+    except UnknownHandle:
+        return f"Unknown result handle: {handle}"
+    except ValueError as e:
+        return str(e)
+
+
+tools = [
+    get_gcp_logs,
+    check_gcp_traces,
+    compare_trace_latency,
+    query_github_file,
+    search_github_repo,
+    search_github_code,
+    read_tool_result,
+    aggregate_tool_result,
+]
 
 # 3. Set up the language model
 llm = ChatVertexAI(
@@ -212,6 +829,49 @@ llm = ChatVertexAI(
 ).bind_tools(tools)
 
 
+def _create_prompt_cache(ttl: float) -> str:
+    """Stores the static instructions and tool schemas in a Vertex context cache."""
+    return create_context_cache(
+        ChatVertexAI(model=LLM, location=LOCATION),
+        messages=[system_prompt.static],
+        tools=tools,
+        time_to_live=timedelta(seconds=ttl),
+    )
+
+
+prompt_cache = PromptCache(_create_prompt_cache, ttl=PROMPT_CACHE_TTL)
+_cached_llms: dict[str, ChatVertexAI] = {}
+
+
+def _select_model(state: MessagesState) -> tuple[Any, list[BaseMessage]]:
+    """Returns the model to call and its input messages.
+
+    The conversation is compacted to stay within `HISTORY_MAX_TOKENS`. With
+    `PROMPT_CACHE_ENABLED`, the static instructions and tool schemas are read
+    from a Vertex context cache instead of being sent on every call.
+    """
+    conversation = compact_history(
+        state["messages"],
+        max_tokens=HISTORY_MAX_TOKENS,
+        keep_turns=HISTORY_KEEP_TURNS,
+        store=result_store,
+    )
+    cache_name = prompt_cache.name() if PROMPT_CACHE_ENABLED else None
+    if cache_name is None:
+        return llm, system_prompt.messages(conversation)
+    if cache_name not in _cached_llms:
+        _cached_llms.clear()
+        _cached_llms[cache_name] = ChatVertexAI(
+            model=LLM,
+            location=LOCATION,
+            temperature=0,
+            max_tokens=1024,
+            streaming=True,
+            cached_content=cache_name,
+        )
+    return _cached_llms[cache_name], system_prompt.messages(conversation, cached=True)
+
+
 # 4. Define workflow components
 def should_continue(state: MessagesState) -> str:
     """Determines whether to use tools or end the conversation."""
@@ -221,20 +881,41 @@ def should_continue(state: MessagesState) -> str:
 
 def call_model(state: MessagesState, config: RunnableConfig) -> dict[str, BaseMessage]:
     """Calls the language model and returns the response."""
-    messages_with_system = [
-                               {"type": "system", "content": system_message}
-                           ] + state[
-        "messages"
-    ]
+    model, messages = _select_model(state)
     # Forward the RunnableConfig object to ensure the agent is capable of streaming the response.
-    response = llm.invoke(messages_with_system, config)
+    response = model.invoke(messages, config)
+    return {"messages": response}
+
+
+async def acall_model(
+    state: MessagesState, config: RunnableConfig
+) -> dict[str, BaseMessage]:
+    """Async variant of `call_model`, used by `astream`.
+
+    Compacting the history and refreshing the prompt cache may block on Vertex
+    calls, so the model is selected in a worker thread.
+    """
+    model, messages = await asyncio.to_thread(_select_model, state)
+    response = await model.ainvoke(messages, config)
     return {"messages": response}
 
 
 # 5. Create the workflow graph
 workflow = StateGraph(MessagesState)
-workflow.add_node("agent", call_model)
-workflow.add_node("tools", ToolNode(tools))
+tool_executor = ParallelToolExecutor(
+    tools,
+    max_workers=TOOL_MAX_WORKERS,
+    timeout=TOOL_TIMEOUT,
+    queue_timeout=TOOL_QUEUE_TIMEOUT,
+    result_store=result_store,
+    inline_tools=[read_tool_result.name, aggregate_tool_result.name],
+)
+# Each node has a sync and an async implementation so that the graph can be
+# driven by both `stream` and `astream`.
+workflow.add_node("agent", RunnableCallable(call_model, acall_model, trace=False))
+workflow.add_node(
+    "tools", RunnableCallable(tool_executor, tool_executor.arun, trace=False)
+)
 workflow.set_entry_point("agent")
 
 # 6. Define graph edges
@@ -12,34 +12,103 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import logging
 import os
-from collections.abc import Generator
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import RedirectResponse, StreamingResponse
-from google.cloud import logging as google_cloud_logging
 from langchain_core.runnables import RunnableConfig
 from traceloop.sdk import Instruments, Traceloop
 
-from app.agent import agent
+from app.agent import ANOMALY_MONITOR_ENABLED, agent, anomaly_monitor
+from app.utils.clients import get_logging_client
+from app.utils.compression import compress_stream, negotiate
+from app.utils.sse import (
+    DEFAULT_COALESCE_BYTES,
+    DEFAULT_COALESCE_WINDOW,
+    DEFAULT_HEARTBEAT_INTERVAL,
+    DEFAULT_MAX_EVENTS,
+    DEFAULT_MAX_RUNS,
+    ReplayBuffer,
+    RunLog,
+    parse_event_id,
+)
+from app.utils.streaming import (
+    DEFAULT_BUFFER_SIZE,
+    DEFAULT_MAX_CONCURRENT_STREAMS,
+    DEFAULT_STALL_TIMEOUT,
+    ConcurrencyLimiter,
+    bounded_stream,
+    coalesce,
+)
 from app.utils.tracing import CloudTraceLoggingSpanExporter
-from app.utils.typing import Feedback, InputChat, Request, dumps, ensure_valid_config
+from app.utils.typing import (
+    Feedback,
+    InputChat,
+    Request,
+    StreamFormat,
+    WireFormat,
+    dumps,
+    ensure_valid_config,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """Watch traces and logs in the background while serving, when enabled."""
+    if ANOMALY_MONITOR_ENABLED:
+        anomaly_monitor.start()
+    yield
+    anomaly_monitor.stop()
+
 
 # Initialize FastAPI app and logging
 app = FastAPI(
     title="prod-monitoring-assistant",
     description="API for interacting with the Agent prod-monitoring-assistant",
+    lifespan=lifespan,
 )
-logging_client = google_cloud_logging.Client()
+logging_client = get_logging_client()
 logger = logging_client.logger(__name__)
 
+MAX_CONCURRENT_STREAMS = int(
+    os.environ.get("MAX_CONCURRENT_STREAMS", DEFAULT_MAX_CONCURRENT_STREAMS)
+)
+STREAM_BUFFER_SIZE = int(os.environ.get("STREAM_BUFFER_SIZE", DEFAULT_BUFFER_SIZE))
+STREAM_STALL_TIMEOUT = float(
+    os.environ.get("STREAM_STALL_TIMEOUT", DEFAULT_STALL_TIMEOUT)
+)
+stream_limiter = ConcurrencyLimiter(MAX_CONCURRENT_STREAMS)
+
+SSE_COALESCE_WINDOW = (
+    float(os.environ.get("SSE_COALESCE_MS", DEFAULT_COALESCE_WINDOW * 1000)) / 1000
+)
+SSE_COALESCE_BYTES = int(os.environ.get("SSE_COALESCE_BYTES", DEFAULT_COALESCE_BYTES))
+SSE_HEARTBEAT_INTERVAL = float(
+    os.environ.get("SSE_HEARTBEAT_INTERVAL", DEFAULT_HEARTBEAT_INTERVAL)
+)
+replay_buffer = ReplayBuffer(
+    max_runs=int(os.environ.get("SSE_REPLAY_RUNS", DEFAULT_MAX_RUNS)),
+    max_events=int(os.environ.get("SSE_REPLAY_EVENTS", DEFAULT_MAX_EVENTS)),
+)
+# Keeps a reference to the running SSE runs so they are not garbage collected.
+_sse_runs: set[asyncio.Task] = set()
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+STREAM_COMPRESSION_ENABLED = (
+    os.environ.get("STREAM_COMPRESSION_ENABLED", "false").lower() == "true"
+)
+
 # Initialize Telemetry
 try:
     Traceloop.init(
         app_name=app.title,
         disable_batch=False,
-        exporter=CloudTraceLoggingSpanExporter(),
+        exporter=CloudTraceLoggingSpanExporter(
+            spool_dir=os.environ.get("SPAN_SPOOL_DIR")
+        ),
         instruments={Instruments.LANGCHAIN},
     )
 except Exception as e:
@@ -63,15 +132,21 @@ def set_tracing_properties(config: RunnableConfig) -> None:
     )
 
 
-def stream_messages(
+async def stream_messages(
     input: InputChat,
     config: RunnableConfig | None = None,
-) -> Generator[str, None, None]:
+    wire_format: WireFormat = "legacy",
+) -> AsyncGenerator[str, None]:
     """Stream events in response to an input chat.
 
+    The agent runs on the event loop, so a single worker multiplexes many
+    concurrent investigations. Events are relayed through a bounded buffer:
+    a client that stops reading for too long gets its run cancelled.
+
     Args:
         input: The input chat messages
         config: Optional configuration for the runnable
+        wire_format: Serialization of the events, see `dumps`
 
     Yields:
         JSON serialized event data
@@ -80,8 +155,80 @@ def stream_messages(
     set_tracing_properties(config)
     input_dict = input.model_dump()
 
-    for data in agent.stream(input_dict, config=config, stream_mode="messages"):
-        yield dumps(data) + "\n"
+    events = agent.astream(input_dict, config=config, stream_mode="messages")
+    async for data in bounded_stream(
+        events, maxsize=STREAM_BUFFER_SIZE, stall_timeout=STREAM_STALL_TIMEOUT
+    ):
+        yield dumps(data, wire_format) + "\n"
+
+
+async def _limited(stream: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """Release the stream slot once the stream ends or the client disconnects."""
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        stream_limiter.release()
+
+
+async def _record_run(log: RunLog, events: AsyncGenerator[str, None]) -> None:
+    """Drive a run to completion, appending its events to the replay log.
+
+    The run does not depend on a connected client, so a client that loses its
+    connection can resume the stream with `Last-Event-ID`.
+    """
+    try:
+        async for line in events:
+            log.append(line.rstrip("\n"))
+        log.finish()
+    except Exception as e:
+        logging.error("Run %s failed: %s", log.run_id, e)
+        log.finish(error=str(e))
+    finally:
+        stream_limiter.release()
+
+
+def _stream_response(
+    body: AsyncGenerator[str, None],
+    accept_encoding: str | None,
+    headers: dict[str, str] | None = None,
+    coalesced: bool = False,
+) -> StreamingResponse:
+    """Build a streaming response, compressed when enabled and accepted.
+
+    The compressor is flushed after each chunk, so clients decode every write
+    as soon as it arrives. Bodies that are not `coalesced` already are joined
+    into batches first, so a token stream is not flushed once per token.
+    """
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    encoding = negotiate(accept_encoding) if STREAM_COMPRESSION_ENABLED else None
+    if encoding is None:
+        return StreamingResponse(body, media_type="text/event-stream", headers=headers)
+    headers["Content-Encoding"] = encoding
+    chunks = (
+        body if coalesced else coalesce(body, SSE_COALESCE_WINDOW, SSE_COALESCE_BYTES)
+    )
+    return StreamingResponse(
+        compress_stream(chunks, encoding),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+def _follow(
+    log: RunLog, accept_encoding: str | None, after: int = -1
+) -> StreamingResponse:
+    return _stream_response(
+        log.follow(
+            after,
+            window=SSE_COALESCE_WINDOW,
+            max_bytes=SSE_COALESCE_BYTES,
+            heartbeat=SSE_HEARTBEAT_INTERVAL,
+        ),
+        accept_encoding,
+        SSE_HEADERS,
+        coalesced=True,
+    )
 
 
 # Routes
@@ -106,18 +253,79 @@ def collect_feedback(feedback: Feedback) -> dict[str, str]:
 
 
 @app.post("/stream_messages")
-def stream_chat_events(request: Request) -> StreamingResponse:
+async def stream_chat_events(
+    request: Request,
+    wire_format: WireFormat = "legacy",
+    stream_format: StreamFormat = "ndjson",
+    last_event_id: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+) -> StreamingResponse:
     """Stream chat events in response to an input request.
 
+    By default events are written as newline-delimited JSON. With
+    `stream_format=sse`, they are framed as Server-Sent Events with
+    `<run_id>:<seq>` ids, coalesced into batched writes, and interleaved with
+    heartbeats while the agent is busy. A request carrying a `Last-Event-ID`
+    header resumes the stream of that run instead of starting a new one.
+    Responses are compressed with gzip, br or zstd when the client accepts it.
+
     Args:
         request: The chat request containing input and config
+        wire_format: "legacy" (LangChain constructor envelopes, the default)
+            or "compact" (see `app.utils.typing.message_to_wire`)
+        stream_format: "ndjson" (the default) or "sse"
+        last_event_id: Id of the last SSE event received, to resume a stream
+        accept_encoding: Content encodings accepted by the client
 
     Returns:
         Streaming response of chat events
+
+    Raises:
+        HTTPException: 404 when the run to resume is unknown or expired, 410
+            when the events to resume from are no longer retained, 409 when a
+            new run reuses the id of a retained one, 503 when the maximum
+            number of concurrent streams is reached
     """
-    return StreamingResponse(
-        stream_messages(input=request.input, config=request.config),
-        media_type="text/event-stream",
+    if stream_format == "sse" and last_event_id:
+        position = parse_event_id(last_event_id)
+        log = replay_buffer.get(position[0]) if position else None
+        if position is None or log is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired run.")
+        if not log.retains(position[1]):
+            raise HTTPException(
+                status_code=410, detail="Events to resume from were evicted."
+            )
+        return _follow(log, accept_encoding, after=position[1])
+
+    config = ensure_valid_config(request.config)
+    if stream_format == "sse" and replay_buffer.get(str(config["run_id"])):
+        raise HTTPException(status_code=409, detail="Run already exists.")
+    if not stream_limiter.try_acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent streams, retry later.",
+            headers={"Retry-After": "5"},
+        )
+    if stream_format == "sse":
+        log = replay_buffer.create(str(config["run_id"]))
+        task = asyncio.create_task(
+            _record_run(
+                log,
+                stream_messages(
+                    input=request.input, config=config, wire_format=wire_format
+                ),
+            )
+        )
+        _sse_runs.add(task)
+        task.add_done_callback(_sse_runs.discard)
+        return _follow(log, accept_encoding)
+    return _stream_response(
+        _limited(
+            stream_messages(
+                input=request.input, config=request.config, wire_format=wire_format
+            )
+        ),
+        accept_encoding,
     )
 
 
@@ -0,0 +1,295 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import quote
+
+import requests
+
+from app.utils.clients import get_http_session
+from app.utils.log_templates import tokenize
+
+DEFAULT_DEDUP_WINDOW = 900.0
+DEFAULT_RATE = 1 / 60
+DEFAULT_BURST = 5
+DEFAULT_MAX_CHARS = 3000
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MAX_QUEUE_SIZE = 100
+# Number of fingerprints remembered for deduplication.
+FINGERPRINT_CACHE_SIZE = 10_000
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+CONSOLE_URL = "https://console.cloud.google.com"
+
+
+def fingerprint(text: str) -> str:
+    """Return a signature of `text` that ignores its variable parts.
+
+    Messages are tokenized like log templates, so alerts that only differ by
+    ids, timestamps, counts or durations share a fingerprint.
+    """
+    normalized = " ".join(tokenize(text))
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+
+def trace_console_url(project: str | None, trace_id: str | None = None) -> str:
+    """Return the Cloud Trace console URL of a trace, or of the trace list."""
+    url = f"{CONSOLE_URL}/traces/list?project={project}"
+    return f"{url}&tid={trace_id}" if trace_id else url
+
+
+def logs_console_url(project: str | None, query: str) -> str:
+    """Return the Logs Explorer URL of a log query."""
+    return f"{CONSOLE_URL}/logs/query;query={quote(query, safe='')}?project={project}"
+
+
+def truncate(text: str, max_chars: int, link: str | None = None) -> str:
+    """Shorten `text` to at most `max_chars`, followed by a link to the details."""
+    if link:
+        details = f"\nDetails: {link}"
+        if len(text) + len(details) <= max_chars:
+            return text + details
+        note = f"\n… truncated, full data: {link}"
+    else:
+        if len(text) <= max_chars:
+            return text
+        note = "\n… truncated"
+    return text[: max(max_chars - len(note), 0)] + note
+
+
+def slack_payload(text: str, severity: str) -> dict[str, Any]:
+    """Build the Slack webhook payload of an alert."""
+    return {
+        "attachments": [
+            {"fallback": f"*{severity} in production", "text": f"```{text}```"}
+        ]
+    }
+
+
+class TokenBucket:
+    """A token bucket refilled at `rate` tokens per second up to `capacity`."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second.
+            capacity: Maximum number of tokens.
+            clock: Returns the current time in seconds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+
+    def try_take(self) -> bool:
+        """Take a token, returning False when the bucket is empty."""
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+@dataclass
+class _Seen:
+    sent_at: float
+    suppressed: int = 0
+
+
+class AlertPipeline:
+    """Deduplicates, rate limits and sends Slack alerts from a background thread.
+
+    An alert whose fingerprint was sent less than `dedup_window` seconds ago is
+    suppressed and counted; the count is reported with the next alert of that
+    fingerprint. Each webhook has its own token bucket, so an incident cannot
+    flood a channel. Accepted alerts are truncated and queued, and a background
+    thread posts them through the pooled HTTP session, retrying transient
+    failures, so callers never wait on Slack.
+    """
+
+    def __init__(
+        self,
+        webhook_url: str | None,
+        session: Callable[[], requests.Session] = get_http_session,
+        dedup_window: float = DEFAULT_DEDUP_WINDOW,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_chars: int = DEFAULT_MAX_CHARS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        timeout: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the pipeline; the sender thread starts on the first alert.
+
+        Args:
+            webhook_url: Default Slack webhook of the alerts.
+            session: Returns the HTTP session used for requests.
+            dedup_window: Seconds during which a repeated fingerprint is suppressed.
+            rate: Alerts per second allowed per webhook, on average.
+            burst: Alerts allowed at once per webhook.
+            max_chars: Maximum length of an alert text.
+            max_retries: Retries of a failed post.
+            max_queue_size: Maximum number of alerts waiting to be sent.
+            timeout: Request timeout in seconds.
+            clock: Returns the current time in seconds.
+        """
+        self.webhook_url = webhook_url
+        self.session = session
+        self.dedup_window = dedup_window
+        self.rate = rate
+        self.burst = burst
+        self.max_chars = max_chars
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.clock = clock
+        self.suppressed = 0
+        self.rate_limited = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self._seen: OrderedDict[str, _Seen] = OrderedDict()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._queue: queue.Queue[tuple[str, dict[str, Any]]] = queue.Queue(
+            maxsize=max_queue_size
+        )
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def submit(
+        self,
+        text: str,
+        severity: str = "DEFAULT",
+        signature: str | None = None,
+        link: str | None = None,
+        webhook_url: str | None = None,
+    ) -> bool:
+        """Queue an alert unless it is a duplicate or over the rate limit.
+
+        Args:
+            text: The alert text.
+            severity: The alert severity.
+            signature: Text fingerprinted for deduplication, `text` if None.
+            link: Where the details can be found, e.g. the trace or the log
+                query behind the alert.
+            webhook_url: Slack webhook overriding the default one.
+
+        Returns:
+            Whether the alert was queued.
+        """
+        url = webhook_url or self.webhook_url
+        if not url:
+            logging.warning("No Slack webhook configured, alert not sent")
+            return False
+        key = fingerprint(signature if signature is not None else text)
+        now = self.clock()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen.sent_at < self.dedup_window:
+                seen.suppressed += 1
+                self.suppressed += 1
+                return False
+            bucket = self._buckets.get(url)
+            if bucket is None:
+                bucket = self._buckets[url] = TokenBucket(
+                    self.rate, self.burst, self.clock
+                )
+            if not bucket.try_take():
+                self.rate_limited += 1
+                return False
+            suppressed = seen.suppressed if seen is not None else 0
+            self._seen[key] = _Seen(now)
+            self._seen.move_to_end(key)
+            while len(self._seen) > FINGERPRINT_CACHE_SIZE:
+                self._seen.popitem(last=False)
+        if suppressed:
+            text = f"{text}\n({suppressed} similar alerts suppressed)"
+        payload = slack_payload(truncate(text, self.max_chars, link), severity)
+        try:
+            self._queue.put_nowait((url, payload))
+        except queue.Full:
+            self.dropped += 1
+            logging.warning("Alert queue full, alert dropped")
+            return False
+        self._start()
+        return True
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="alert-sender", daemon=True
+                )
+                self._thread.start()
+
+    def post(self, url: str, payload: dict[str, Any]) -> bool:
+        """Post a payload, retrying transient failures with backoff.
+
+        Returns:
+            Whether the payload was accepted.
+        """
+        for attempt in range(self.max_retries + 1):
+            delay = 2.0**attempt
+            try:
+                response = self.session().post(url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                logging.warning("Error while sending message to Slack: %s", e)
+            else:
+                if response.status_code == 200:
+                    self.sent += 1
+                    return True
+                logging.warning(
+                    "Error while sending message to Slack: %s %s",
+                    response.status_code,
+                    response.text,
+                )
+                if response.status_code not in _RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = float(retry_after)
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        self.failed += 1
+        return False
+
+    def _run(self) -> None:
+        while True:
+            url, payload = self._queue.get()
+            try:
+                self.post(url, payload)
+            finally:
+                self._queue.task_done()
+
+    def join(self) -> None:
+        """Wait until all queued alerts were sent or given up on."""
+        self._queue.join()
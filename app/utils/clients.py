@@ -0,0 +1,367 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterator
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+import requests
+from google.api_core import exceptions as api_exceptions
+from google.auth import exceptions as auth_exceptions
+from requests.adapters import HTTPAdapter
+
+T = TypeVar("T")
+
+DEFAULT_HEALTH_CHECK_INTERVAL = 300.0
+# Replaced clients are closed once unused and retired for this long, so that
+# callers that got them through `get` can finish their requests.
+DEFAULT_RETIRE_GRACE = 120.0
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 32))
+
+
+@dataclass
+class ClientSpec:
+    """How to build, check and dispose of one kind of client.
+
+    Attributes:
+        factory: Builds a client from the registry key arguments.
+        health_check: Returns False (or raises) when the client must be rebuilt.
+        close: Releases the client's connections.
+        reconnect_on: Errors after which the client is rebuilt and the call retried.
+        max_age: Rebuild the client after this many seconds.
+    """
+
+    factory: Callable[..., Any]
+    health_check: Callable[[Any], bool] | None = None
+    close: Callable[[Any], None] | None = None
+    reconnect_on: tuple[type[BaseException], ...] = ()
+    max_age: float | None = None
+
+
+@dataclass
+class _Entry:
+    spec: ClientSpec
+    client: Any
+    created_at: float
+    checked_at: float
+    users: int = 0
+    retired_at: float | None = None
+
+
+class ClientRegistry:
+    """A process-wide, lazily-initialized and thread-safe pool of API clients.
+
+    Clients are created on first use and shared by every caller, so credential
+    discovery, TLS handshakes and gRPC channel setup are paid once per process
+    instead of once per tool call. Clients are health checked periodically and
+    rebuilt when the check fails, when they exceed their maximum age, or when a
+    call through `call` fails with a connection-level error.
+
+    A replaced client is not closed right away: it is retired, and closed once
+    no call through `call` is using it and `retire_grace` seconds have passed,
+    so requests in flight on other threads are not cut off.
+    """
+
+    def __init__(
+        self,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        retire_grace: float = DEFAULT_RETIRE_GRACE,
+    ) -> None:
+        """Initialize an empty registry.
+
+        Args:
+            health_check_interval: Minimum delay in seconds between health checks.
+            retire_grace: Minimum delay in seconds before closing a replaced client.
+        """
+        self.health_check_interval = health_check_interval
+        self.retire_grace = retire_grace
+        self._specs: dict[str, ClientSpec] = {}
+        self._entries: dict[Hashable, _Entry] = {}
+        self._retired: list[_Entry] = []
+        self._locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, spec: ClientSpec) -> None:
+        """Register (or replace) how clients of the given kind are built."""
+        with self._lock:
+            self._specs[kind] = spec
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _is_stale(self, entry: _Entry, now: float, probe: bool) -> bool:
+        """Whether the client must be rebuilt.
+
+        Without `probe`, only report whether it is expired or due for a health
+        check; with `probe`, run the due health check.
+        """
+        spec = entry.spec
+        if spec.max_age is not None and now - entry.created_at > spec.max_age:
+            return True
+        if spec.health_check is None:
+            return False
+        if now - entry.checked_at < self.health_check_interval:
+            return False
+        if not probe:
+            return True
+        entry.checked_at = now
+        try:
+            return not spec.health_check(entry.client)
+        except Exception as e:
+            logging.warning("Health check failed for client: %s", e)
+            return True
+
+    def _entry(self, kind: str, args: tuple[Hashable, ...]) -> _Entry:
+        spec = self._specs[kind]
+        key = (kind, *args)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and not self._is_stale(entry, now, probe=False):
+            return entry
+
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and self._is_stale(entry, now, probe=True):
+                self._retire(self._entries.pop(key))
+                entry = None
+            if entry is None:
+                entry = _Entry(spec, spec.factory(*args), now, now)
+                self._entries[key] = entry
+        self._reap()
+        return entry
+
+    def get(self, kind: str, *args: Hashable) -> Any:
+        """Return the shared client of the given kind, creating it if needed.
+
+        Args:
+            kind: A registered client kind.
+            *args: Arguments passed to the factory, e.g. a project id. Each
+                distinct set of arguments gets its own client.
+
+        Returns:
+            The client.
+        """
+        return self._entry(kind, args).client
+
+    def invalidate(self, kind: str, *args: Hashable) -> None:
+        """Retire a client so that the next `get` rebuilds it."""
+        key = (kind, *args)
+        with self._key_lock(key):
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._retire(entry)
+        self._reap()
+
+    def _retire(self, entry: _Entry) -> None:
+        with self._lock:
+            entry.retired_at = time.monotonic()
+            self._retired.append(entry)
+
+    def _reap(self) -> None:
+        """Close the retired clients that are unused and past their grace period."""
+        now = time.monotonic()
+        with self._lock:
+            closable = [
+                entry
+                for entry in self._retired
+                if entry.users == 0
+                and entry.retired_at is not None
+                and now - entry.retired_at >= self.retire_grace
+            ]
+            self._retired = [e for e in self._retired if e not in closable]
+        for entry in closable:
+            self._dispose(entry)
+
+    @contextlib.contextmanager
+    def _lease(self, kind: str, args: tuple[Hashable, ...]) -> Iterator[Any]:
+        entry = self._entry(kind, args)
+        with self._lock:
+            entry.users += 1
+        try:
+            yield entry.client
+        finally:
+            with self._lock:
+                entry.users -= 1
+            if entry.retired_at is not None:
+                self._reap()
+
+    def call(self, kind: str, fn: Callable[[Any], T], *args: Hashable) -> T:
+        """Call `fn` with the shared client, reconnecting once on transport errors.
+
+        Args:
+            kind: A registered client kind.
+            fn: The function to call with the client.
+            *args: Arguments identifying the client, see `get`.
+
+        Returns:
+            The result of `fn`.
+        """
+        spec = self._specs[kind]
+        try:
+            with self._lease(kind, args) as client:
+                return fn(client)
+        except spec.reconnect_on as e:
+            logging.warning("Reconnecting %s client after error: %s", kind, e)
+            self.invalidate(kind, *args)
+            with self._lease(kind, args) as client:
+                return fn(client)
+
+    def close_all(self) -> None:
+        """Close every client held by the registry, including retired ones."""
+        with self._lock:
+            entries = [*self._entries.values(), *self._retired]
+            self._entries.clear()
+            self._retired.clear()
+        for entry in entries:
+            self._dispose(entry)
+
+    @staticmethod
+    def _dispose(entry: _Entry) -> None:
+        if entry.spec.close is None:
+            return
+        try:
+            entry.spec.close(entry.client)
+        except Exception as e:
+            logging.warning("Failed to close client: %s", e)
+
+
+def _logging_client(project: str | None = None) -> Any:
+    from google.cloud import logging as google_cloud_logging
+
+    return google_cloud_logging.Client(project=project)
+
+
+def _log_entries_client() -> Any:
+    from google.cloud.logging_v2.services.logging_service_v2 import (
+        LoggingServiceV2Client,
+    )
+
+    return LoggingServiceV2Client()
+
+
+def _storage_client(project: str | None = None) -> Any:
+    from google.cloud import storage
+
+    return storage.Client(project=project)
+
+
+def _trace_client() -> Any:
+    from google.cloud import trace_v1
+
+    return trace_v1.TraceServiceClient()
+
+
+def _github_client(token: str | None) -> Any:
+    from github import Auth, Github
+
+    return Github(auth=Auth.Token(token)) if token else Github()
+
+
+def _http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_GOOGLE_RECONNECT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    auth_exceptions.TransportError,
+)
+
+registry = ClientRegistry()
+registry.register(
+    "logging",
+    ClientSpec(
+        factory=_logging_client,
+        close=lambda client: client.close(),
+        reconnect_on=_GOOGLE_RECONNECT_ERRORS,
+    ),
+)
+# The GAPIC client pages log entries with resumable page tokens.
+registry.register(
+    "log_entries",
+    ClientSpec(
+        factory=_log_entries_client,
+        close=lambda client: client.transport.close(),
+        reconnect_on=_GOOGLE_RECONNECT_ERRORS,
+    ),
+)
+registry.register(
+    "storage",
+    ClientSpec(
+        factory=_storage_client,
+        close=lambda client: client.close(),
+        reconnect_on=_GOOGLE_RECONNECT_ERRORS,
+    ),
+)
+registry.register(
+    "trace",
+    ClientSpec(
+        factory=_trace_client,
+        close=lambda client: client.transport.close(),
+        reconnect_on=_GOOGLE_RECONNECT_ERRORS,
+    ),
+)
+registry.register(
+    "github",
+    ClientSpec(
+        factory=_github_client,
+        # The rate limit endpoint does not count against the rate limit.
+        health_check=lambda client: client.get_rate_limit() is not None,
+        close=lambda client: client.close(),
+        reconnect_on=(requests.exceptions.ConnectionError,),
+    ),
+)
+registry.register(
+    "http",
+    ClientSpec(
+        factory=_http_session,
+        close=lambda session: session.close(),
+        reconnect_on=(requests.exceptions.ConnectionError,),
+        max_age=3600.0,
+    ),
+)
+
+
+def get_logging_client(project: str | None = None) -> Any:
+    """Return the shared Cloud Logging client for a project."""
+    return registry.get("logging", project)
+
+
+def get_storage_client(project: str | None = None) -> Any:
+    """Return the shared Cloud Storage client for a project."""
+    return registry.get("storage", project)
+
+
+def get_trace_client() -> Any:
+    """Return the shared Cloud Trace client."""
+    return registry.get("trace")
+
+
+def get_github(token: str | None) -> Any:
+    """Return the shared GitHub client for an access token."""
+    return registry.get("github", token)
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared, connection-pooling HTTP session."""
+    return registry.get("http")
@@ -0,0 +1,150 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zlib
+from collections.abc import AsyncIterator
+from typing import Any
+
+try:
+    import brotli
+
+    HAS_BROTLI = True
+except ImportError:  # pragma: no cover - brotli is an optional dependency
+    HAS_BROTLI = False
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:  # pragma: no cover - zstandard is an optional dependency
+    HAS_ZSTD = False
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> list[str]:
+    """Return the supported content encodings, in order of preference."""
+    encodings = []
+    if HAS_ZSTD:
+        encodings.append("zstd")
+    if HAS_BROTLI:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Pick the content encoding of a response from an `Accept-Encoding` header.
+
+    Args:
+        accept_encoding: The header value, e.g. "gzip, br;q=0.8".
+
+    Returns:
+        The preferred supported encoding with the highest quality, or None to
+        send the response uncompressed.
+    """
+    if not accept_encoding:
+        return None
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    wildcard = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(encoding, wildcard), -rank, encoding)
+        for rank, encoding in enumerate(available_encodings())
+    ]
+    quality, _, encoding = max(candidates)
+    return encoding if quality > 0 else None
+
+
+class StreamCompressor:
+    """Compresses a stream chunk by chunk, flushing after each chunk.
+
+    Every chunk passed to `compress` is fully decodable by the client as soon
+    as it is received, so compression does not delay the first token.
+    """
+
+    def __init__(self, encoding: str) -> None:
+        """Initialize the compressor.
+
+        Args:
+            encoding: "gzip", "br" or "zstd".
+        """
+        self.encoding = encoding
+        self._compressor: Any
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br" and HAS_BROTLI:
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd" and HAS_ZSTD:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk and flush it."""
+        if self.encoding == "gzip":
+            return self._compressor.compress(data) + self._compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self) -> bytes:
+        """Terminate the compressed stream."""
+        if self.encoding == "gzip":
+            return self._compressor.flush(zlib.Z_FINISH)
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+async def compress_stream(
+    stream: AsyncIterator[str], encoding: str
+) -> AsyncIterator[bytes]:
+    """Compress a text stream, flushing once per chunk.
+
+    Args:
+        stream: The chunks of the response, e.g. coalesced batches of events.
+        encoding: The negotiated content encoding.
+
+    Yields:
+        The compressed chunks.
+    """
+    compressor = StreamCompressor(encoding)
+    try:
+        async for chunk in stream:
+            data = compressor.compress(chunk.encode())
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Close the source right away when the client disconnects.
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -0,0 +1,237 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import asdict, dataclass
+from urllib.parse import quote
+
+import requests
+
+from app.utils.clients import get_http_session
+
+GITHUB_API_URL = "https://api.github.com"
+DEFAULT_CACHE_ENTRIES = 512
+DEFAULT_CONTENT_TTL = 24 * 3600.0
+DEFAULT_REF_TTL = 60.0
+
+_SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+
+@dataclass
+class CachedContent:
+    """A cached HTTP response body with its validator."""
+
+    content: str
+    etag: str | None
+    fetched_at: float
+
+
+class ContentCache:
+    """A TTL cache with an LRU memory tier and an optional on-disk tier.
+
+    Expired entries are not dropped: they are returned as stale so the caller
+    can revalidate them with a conditional request.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_CACHE_ENTRIES,
+        ttl: float = DEFAULT_CONTENT_TTL,
+        disk_dir: str | None = None,
+    ) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of entries kept in memory.
+            ttl: Seconds after which an entry must be revalidated.
+            disk_dir: Directory of the on-disk tier, disabled when None.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries: OrderedDict[Hashable, CachedContent] = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: Hashable) -> str:
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir or "", f"{digest}.json")
+
+    def get(self, key: Hashable) -> tuple[CachedContent | None, bool]:
+        """Look up an entry.
+
+        Returns:
+            The entry (or None) and whether it is still fresh.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.disk_dir:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    entry = CachedContent(**json.load(f))
+            except (OSError, ValueError, TypeError):
+                entry = None
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None:
+            return None, False
+        return entry, time.time() - entry.fetched_at < self.ttl
+
+    def put(self, key: Hashable, entry: CachedContent) -> None:
+        """Store an entry in both tiers."""
+        self._remember(key, entry)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(asdict(entry), f)
+                os.replace(f"{path}.tmp", path)
+            except OSError as e:
+                logging.warning("Unable to write GitHub cache entry: %s", e)
+
+    def _remember(self, key: Hashable, entry: CachedContent) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class GitHubContents:
+    """Read files of a GitHub repository through a revalidating cache.
+
+    Refs are resolved to commit SHAs, and file contents are cached by
+    (repository, commit SHA, path). Content at a commit SHA cannot change, so
+    it never expires; ref resolutions that have expired are revalidated with
+    `If-None-Match`, so an unchanged branch head costs a 304 that does not
+    count against the GitHub rate limit.
+    """
+
+    def __init__(
+        self,
+        repo: str,
+        token: str | None,
+        cache: ContentCache | None = None,
+        ref_ttl: float = DEFAULT_REF_TTL,
+        session: Callable[[], requests.Session] = get_http_session,
+        timeout: float = 30.0,
+    ) -> None:
+        """Initialize the reader.
+
+        Args:
+            repo: The repository, as "owner/name".
+            token: GitHub access token.
+            cache: The content cache, a memory-only cache by default.
+            ref_ttl: Seconds during which a resolved ref is trusted.
+            session: Returns the HTTP session used for requests.
+            timeout: Request timeout in seconds.
+        """
+        self.repo = repo
+        self.token = token
+        self.cache = cache or ContentCache()
+        self.ref_cache = ContentCache(ttl=ref_ttl)
+        self.session = session
+        self.timeout = timeout
+
+    def _get(self, url: str, accept: str, etag: str | None) -> requests.Response:
+        headers = {"Accept": accept}
+        if self.token:
+            headers["Authorization"] = f"token {self.token}"
+        if etag:
+            headers["If-None-Match"] = etag
+        response = self.session().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    def _fetch(
+        self,
+        key: Hashable,
+        cache: ContentCache,
+        url: str,
+        accept: str,
+        fallback: CachedContent | None = None,
+        immutable: bool = False,
+    ) -> tuple[CachedContent, bool]:
+        """Return the cached entry for `key`, fetching or revalidating it if stale.
+
+        Entries of `immutable` keys are never stale.
+
+        Returns:
+            The entry and whether a request was made.
+        """
+        entry, fresh = cache.get(key)
+        if entry is not None and (fresh or immutable):
+            return entry, False
+        validator = entry or fallback
+        response = self._get(url, accept, validator.etag if validator else None)
+        etag = response.headers.get("ETag")
+        if response.status_code == 304 and validator is not None:
+            content, etag = validator.content, etag or validator.etag
+        else:
+            content = response.content.decode("utf-8")
+        entry = CachedContent(content, etag, time.time())
+        cache.put(key, entry)
+        return entry, True
+
+    def resolve_ref(self, ref: str) -> str:
+        """Resolve a branch, tag or SHA to a commit SHA."""
+        if _SHA_PATTERN.fullmatch(ref):
+            return ref
+        entry, _ = self._fetch(
+            (self.repo, "ref", ref),
+            self.ref_cache,
+            f"{GITHUB_API_URL}/repos/{self.repo}/commits/{quote(ref, safe='')}",
+            "application/vnd.github.sha",
+        )
+        return entry.content.strip()
+
+    def read(self, path: str, ref: str) -> str:
+        """Return the decoded content of a file at the given ref.
+
+        Args:
+            path: Path of the file relative to the repository root.
+            ref: Branch, tag or commit SHA.
+
+        Returns:
+            The file content.
+        """
+        path = path.lstrip("/")
+        sha = self.resolve_ref(ref)
+        # The latest known version of the path (at any commit) is used as the
+        # validator when the commit changed, so an unchanged file costs a 304.
+        latest_key = (self.repo, "latest", path)
+        latest, _ = self.cache.get(latest_key)
+        entry, fetched = self._fetch(
+            (self.repo, sha, path),
+            self.cache,
+            f"{GITHUB_API_URL}/repos/{self.repo}/contents/{quote(path)}?ref={sha}",
+            "application/vnd.github.raw",
+            fallback=latest,
+            immutable=True,
+        )
+        if fetched:
+            self.cache.put(latest_key, entry)
+        return entry.content
@@ -0,0 +1,179 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections.abc import Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from app.utils.result_store import ResultStore
+
+DEFAULT_MAX_TOKENS = 100_000
+DEFAULT_KEEP_TURNS = 2
+DEFAULT_PREVIEW_CHARS = 200
+# Rough number of characters per token for English text, code and JSON.
+CHARS_PER_TOKEN = 4
+# Fixed per-message overhead of roles and framing, in tokens.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _text(content: str | list) -> str:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and isinstance(part.get("text"), str):
+            parts.append(part["text"])
+    return "".join(parts)
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Estimate the number of tokens of a message without a tokenizer."""
+    chars = len(_text(message.content))
+    if isinstance(message, AIMessage) and message.tool_calls:
+        chars += sum(
+            len(call["name"]) + len(json.dumps(call["args"], default=str))
+            for call in message.tool_calls
+        )
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def _stored_reference(text: str) -> dict | None:
+    # Results already stored out of band are replaced by a JSON reference.
+    if not text.startswith('{"result_handle"'):
+        return None
+    try:
+        reference = json.loads(text)
+    except ValueError:
+        return None
+    return reference if isinstance(reference, dict) else None
+
+
+def stub_tool_message(
+    message: ToolMessage,
+    preview_chars: int = DEFAULT_PREVIEW_CHARS,
+    store: ResultStore | None = None,
+) -> ToolMessage:
+    """Replace the content of a tool result by a short preview.
+
+    The tool call id is kept, so the stub still answers the tool call that
+    produced it. The stub names the handle of the full result, so the model
+    can read it back with `read_tool_result`: either the handle the result was
+    already stored under, or a new one in `store`. Handles are content hashes,
+    so stubbing the same result on every call stores it once.
+    """
+    text = _text(message.content)
+    if len(text) <= preview_chars:
+        return message
+    name = message.name or "tool"
+    reference = _stored_reference(text)
+    if reference is not None:
+        handle = reference["result_handle"]
+        chars = reference.get("chars", len(text))
+        preview = str(reference.get("preview", ""))
+    else:
+        handle = store.put(text) if store is not None else None
+        chars = len(text)
+        preview = text
+    if handle is None:
+        hint = "Call the tool again if the details are needed."
+    else:
+        hint = (
+            f"It is stored as {handle}, use read_tool_result with this handle "
+            "if the details are needed."
+        )
+    return message.model_copy(
+        update={
+            "content": f"[Earlier {name} output of {chars} characters, compacted. "
+            f"{hint} Preview: {preview[:preview_chars]}...]"
+        }
+    )
+
+
+def _turns(messages: Sequence[BaseMessage]) -> list[list[BaseMessage]]:
+    # A turn starts at each user message; tool calls and their results always
+    # stay in the turn of the model message that requested them.
+    turns: list[list[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _stub_all(
+    turn: list[BaseMessage],
+    preview_chars: int,
+    store: ResultStore | None,
+    keep_last_step: bool = False,
+) -> list[BaseMessage]:
+    last_ai = max(
+        (i for i, m in enumerate(turn) if isinstance(m, AIMessage)), default=-1
+    )
+    return [
+        stub_tool_message(m, preview_chars, store)
+        if isinstance(m, ToolMessage) and not (keep_last_step and i > last_ai)
+        else m
+        for i, m in enumerate(turn)
+    ]
+
+
+def compact_history(
+    messages: Sequence[BaseMessage],
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    keep_turns: int = DEFAULT_KEEP_TURNS,
+    preview_chars: int = DEFAULT_PREVIEW_CHARS,
+    store: ResultStore | None = None,
+) -> list[BaseMessage]:
+    """Shrink a conversation before sending it to the model.
+
+    The state itself is left untouched; only the view sent to the model is
+    compacted, in three stages that stop as soon as the history fits:
+
+    1. Tool results older than the last `keep_turns` user turns are replaced
+       by short previews. This always applies, so the compacted prefix is
+       stable from one call to the next.
+    2. The oldest turns are dropped, keeping at least the current one.
+    3. Tool results of the remaining turns are replaced by previews, except
+       the results of the latest tool step.
+
+    Args:
+        messages: The conversation.
+        max_tokens: Estimated token budget of the conversation.
+        keep_turns: Number of most recent user turns kept verbatim.
+        preview_chars: Number of characters kept from compacted tool results.
+        store: Store keeping the full compacted results, so the model can read
+            them back. Without it, the model has to call the tool again.
+
+    Returns:
+        The compacted conversation.
+    """
+    turns = _turns(messages)
+    split = max(len(turns) - keep_turns, 0)
+    turns = [_stub_all(t, preview_chars, store) for t in turns[:split]] + turns[split:]
+
+    sizes = [sum(estimate_tokens(m) for m in turn) for turn in turns]
+    total = sum(sizes)
+    while total > max_tokens and len(turns) > 1:
+        total -= sizes.pop(0)
+        turns.pop(0)
+
+    if total > max_tokens:
+        turns = [
+            _stub_all(turn, preview_chars, store, keep_last_step=i == len(turns) - 1)
+            for i, turn in enumerate(turns)
+        ]
+    return [message for turn in turns for message in turn]
@@ -0,0 +1,211 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import queue
+import threading
+import time
+from typing import Any
+
+DEFAULT_MAX_BATCH_SIZE = 500
+# Cloud Logging rejects write requests over 10 MB; keep a margin for the
+# request envelope.
+DEFAULT_MAX_BATCH_BYTES = 9 * 1024 * 1024
+DEFAULT_MAX_LATENCY = 2.0
+DEFAULT_MAX_QUEUE_SIZE = 10_000
+# Minimum number of seconds between two warnings about dropped entries.
+DROP_WARNING_INTERVAL = 60.0
+# Queued to wake the flusher thread up on shutdown.
+_WAKE: dict = {}
+
+
+def json_size(value: Any) -> int:
+    """Estimate the size of the JSON encoding of a value, in bytes.
+
+    Strings are measured without being encoded when they are ASCII, and only
+    the escaping of newlines, quotes and backslashes is accounted for.
+
+    Args:
+        value: A primitive, or a list, tuple or dict of values.
+
+    Returns:
+        The estimated size.
+    """
+    if isinstance(value, str):
+        size = len(value) if value.isascii() else len(value.encode())
+        escapes = value.count("\n") + value.count('"') + value.count("\\")
+        return size + escapes + 2
+    if isinstance(value, list | tuple):
+        return sum(json_size(item) + 1 for item in value) + 1
+    if isinstance(value, dict):
+        return sum(len(k) + 4 + json_size(v) for k, v in value.items()) + 1
+    if value is True or value is None:
+        return 4
+    if value is False:
+        return 5
+    return len(str(value))
+
+
+class LogBatcher:
+    """Writes structured log entries in batches from a background thread.
+
+    Entries are queued without blocking the caller and written with one
+    `entries.write` call per batch. A batch is written when it reaches
+    `max_batch_size` entries or `max_batch_bytes` bytes, or its oldest entry
+    has waited `max_latency` seconds. Batches are committed with partial
+    success, so one rejected entry does not drop the rest of its batch. When
+    the queue is full, new entries are dropped and counted rather than
+    blocking the caller.
+    """
+
+    def __init__(
+        self,
+        logger: Any,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        max_latency: float = DEFAULT_MAX_LATENCY,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        severity: str = "INFO",
+    ) -> None:
+        """Initialize the batcher and start its flusher thread.
+
+        Args:
+            logger: The Cloud Logging logger to write to.
+            max_batch_size: Maximum number of entries per write.
+            max_batch_bytes: Maximum estimated JSON size of a write, in bytes.
+            max_latency: Maximum seconds an entry waits before being written.
+            max_queue_size: Maximum number of queued entries.
+            severity: Severity of the written entries.
+        """
+        self.logger = logger
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_latency = max_latency
+        self.severity = severity
+        self.dropped = 0
+        self.failed = 0
+        self.written = 0
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_queue_size)
+        # The entry that did not fit in the previous batch, written first next.
+        self._carry: dict | None = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_drop_warning = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="log-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, entry: dict) -> bool:
+        """Queue an entry, returning False if it was dropped."""
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._last_drop_warning >= DROP_WARNING_INTERVAL:
+                self._last_drop_warning = now
+                logging.warning(
+                    "Log batch queue full, %d entries dropped so far", self.dropped
+                )
+            return False
+
+    def commit(self, entries: list[dict]) -> None:
+        """Write entries in one batch now, raising the error of a failed write."""
+        if not entries:
+            return
+        batch = self.logger.batch()
+        for entry in entries:
+            batch.log_struct(entry, severity=self.severity)
+        batch.commit(partial_success=True)
+        self.written += len(entries)
+
+    def write(self, entries: list[dict]) -> bool:
+        """Write entries in one batch now, returning False if the write failed."""
+        try:
+            self.commit(entries)
+        except Exception as e:
+            self.failed += len(entries)
+            logging.warning("Failed to write %d log entries: %s", len(entries), e)
+            return False
+        return True
+
+    def _next(self, deadline: float | None) -> dict | None:
+        # Returns the next entry to batch, or None once the batch is complete:
+        # right away when `deadline` is None, else when it passes.
+        if self._carry is not None:
+            entry, self._carry = self._carry, None
+            return entry
+        while True:
+            try:
+                if deadline is None:
+                    entry = self._queue.get_nowait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if entry is not _WAKE:
+                return entry
+            if deadline is not None:
+                return None
+
+    def _batch(self, first: dict | None, deadline: float | None) -> list[dict]:
+        # Called with the write lock held.
+        entries: list[dict] = []
+        size = 0
+        entry = first if first is not None else self._next(deadline)
+        while entry is not None:
+            entry_size = json_size(entry)
+            if entries and size + entry_size > self.max_batch_bytes:
+                self._carry = entry
+                break
+            entries.append(entry)
+            size += entry_size
+            if len(entries) >= self.max_batch_size:
+                break
+            entry = self._next(deadline)
+        return entries
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            first = None
+            if self._carry is None:
+                first = self._queue.get()
+                if first is _WAKE:
+                    continue
+            with self._write_lock:
+                deadline = time.monotonic() + self.max_latency
+                self.write(self._batch(first, deadline))
+
+    def force_flush(self) -> bool:
+        """Write all queued entries now, returning False if a write failed."""
+        ok = True
+        with self._write_lock:
+            while entries := self._batch(None, None):
+                ok = self.write(entries) and ok
+        return ok
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """Stop the flusher thread and write the remaining entries."""
+        self._stop.set()
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # The flusher is busy and will see the stop flag.
+        self._thread.join(timeout)
+        self.force_flush()
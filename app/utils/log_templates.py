@@ -0,0 +1,222 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+WILDCARD = "<*>"
+
+# Tokens that are almost always variables are masked before clustering so that
+# they never split a template.
+_MASKS = [
+    re.compile(
+        r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+    ),
+    re.compile(r"^\d{1,3}(\.\d{1,3}){3}(:\d+)?$"),
+    re.compile(r"^(0x)?[0-9a-fA-F]{16,}$"),
+    re.compile(r"^[-+]?\d+(\.\d+)?(ms|s|us|ns|%)?$"),
+]
+_PUNCTUATION = ",;:()[]{}\"'"
+
+
+def _mask(token: str) -> str:
+    core = token.strip(_PUNCTUATION)
+    if core and any(mask.match(core) for mask in _MASKS):
+        return WILDCARD
+    return token
+
+
+def tokenize(message: str) -> list[str]:
+    """Split a log message into tokens and mask obvious variables."""
+    return [_mask(token) for token in message.split()]
+
+
+@dataclass
+class LogTemplate:
+    """A cluster of log messages sharing the same template."""
+
+    tokens: list[str]
+    count: int = 0
+    first_seen: str | None = None
+    last_seen: str | None = None
+    exemplars: list[str] = field(default_factory=list)
+    severities: Counter = field(default_factory=Counter)
+
+    @property
+    def template(self) -> str:
+        """The template text, with variable positions replaced by `<*>`."""
+        return " ".join(self.tokens)
+
+    def similarity(self, tokens: list[str]) -> float:
+        """Fraction of positions where `tokens` equals a constant template token."""
+        matches = sum(
+            1
+            for own, other in zip(self.tokens, tokens, strict=True)
+            if own != WILDCARD and own == other
+        )
+        return matches / len(tokens) if tokens else 1.0
+
+    def merge(self, tokens: list[str]) -> None:
+        """Generalize the template to also cover `tokens`."""
+        self.tokens = [
+            own if own == other else WILDCARD
+            for own, other in zip(self.tokens, tokens, strict=True)
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the template summary."""
+        summary: dict[str, Any] = {
+            "template": self.template,
+            "count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "exemplars": self.exemplars,
+        }
+        if self.severities:
+            summary["severities"] = dict(self.severities)
+        return {key: value for key, value in summary.items() if value is not None}
+
+
+class TemplateMiner:
+    """Online log template miner based on the Drain algorithm.
+
+    Messages are routed through a fixed-depth prefix tree (token count, then the
+    first few tokens) to a small list of candidate templates, and either merged
+    into the most similar one or start a new template. Each message is processed
+    in time proportional to its length, so large log volumes can be summarized
+    in a single streaming pass.
+
+    See He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree".
+    """
+
+    def __init__(
+        self,
+        depth: int = 4,
+        similarity_threshold: float = 0.4,
+        max_children: int = 100,
+        max_exemplars: int = 3,
+    ) -> None:
+        """Initialize the miner.
+
+        Args:
+            depth: Depth of the prefix tree, including the token-count level.
+            similarity_threshold: Minimum similarity to merge into a template.
+            max_children: Maximum number of children per tree node.
+            max_exemplars: Number of raw messages kept per template.
+        """
+        self.prefix_depth = max(depth - 2, 1)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_exemplars = max_exemplars
+        self.templates: list[LogTemplate] = []
+        self._root: dict[Any, Any] = {}
+
+    def _leaf(self, tokens: list[str]) -> list[LogTemplate]:
+        node = self._root.setdefault(len(tokens), {})
+        for token in tokens[: self.prefix_depth]:
+            if any(char.isdigit() for char in token):
+                token = WILDCARD
+            if token not in node:
+                token = token if len(node) < self.max_children else WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    def add(
+        self,
+        message: str,
+        timestamp: str | None = None,
+        severity: str | None = None,
+    ) -> LogTemplate:
+        """Add a log message and return the template it was assigned to.
+
+        Args:
+            message: The raw log message.
+            timestamp: ISO timestamp of the message, used for first/last seen.
+            severity: Severity of the message.
+
+        Returns:
+            The matching template.
+        """
+        tokens = tokenize(message)
+        candidates = self._leaf(tokens)
+
+        best: LogTemplate | None = None
+        best_similarity = -1.0
+        for candidate in candidates:
+            similarity = candidate.similarity(tokens)
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+
+        if best is not None and best_similarity >= self.similarity_threshold:
+            best.merge(tokens)
+        else:
+            best = LogTemplate(tokens=tokens)
+            candidates.append(best)
+            self.templates.append(best)
+
+        best.count += 1
+        if timestamp:
+            if best.first_seen is None or timestamp < best.first_seen:
+                best.first_seen = timestamp
+            if best.last_seen is None or timestamp > best.last_seen:
+                best.last_seen = timestamp
+        if severity:
+            best.severities[severity] += 1
+        if len(best.exemplars) < self.max_exemplars and message not in best.exemplars:
+            best.exemplars.append(message)
+        return best
+
+    def summary(self, top_n: int | None = None) -> list[dict[str, Any]]:
+        """Summarize the mined templates, most frequent first.
+
+        Args:
+            top_n: Maximum number of templates to return.
+
+        Returns:
+            A list of template summaries.
+        """
+        ranked = sorted(self.templates, key=lambda template: -template.count)
+        return [template.to_dict() for template in ranked[:top_n]]
+
+
+def mine_templates(
+    records: Iterable[dict[str, Any]],
+    top_n: int | None = None,
+    message_key: str = "message",
+    **miner_kwargs: Any,
+) -> list[dict[str, Any]]:
+    """Group records into message templates with counts and exemplars.
+
+    Args:
+        records: Records with a message, and optionally timestamp and severity.
+        top_n: Maximum number of templates to return.
+        message_key: The record key holding the message.
+        **miner_kwargs: Additional arguments for `TemplateMiner`.
+
+    Returns:
+        Template summaries, most frequent first.
+    """
+    miner = TemplateMiner(**miner_kwargs)
+    for record in records:
+        message = record.get(message_key)
+        if message:
+            miner.add(
+                str(message),
+                timestamp=record.get("timestamp"),
+                severity=record.get("severity"),
+            )
+    return miner.summary(top_n)
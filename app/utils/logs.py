@@ -0,0 +1,362 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import functools
+import hashlib
+import json
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import google.auth
+from google.cloud.logging_v2.entries import LogEntry
+from google.cloud.logging_v2.types import ListLogEntriesRequest
+from google.cloud.logging_v2.types import LogEntry as GapicLogEntry
+from google.protobuf.json_format import MessageToDict
+
+DEFAULT_PAGE_SIZE = 200
+DEFAULT_MAX_ENTRIES = 100
+DEFAULT_MAX_BYTES = 64 * 1024
+MAX_MESSAGE_CHARS = 2000
+
+SEVERITIES = (
+    "DEFAULT",
+    "DEBUG",
+    "INFO",
+    "NOTICE",
+    "WARNING",
+    "ERROR",
+    "CRITICAL",
+    "ALERT",
+    "EMERGENCY",
+)
+DEFAULT_FIELDS = ("timestamp", "severity", "message", "trace", "source_location")
+
+
+class InvalidPageToken(ValueError):
+    """Raised when a continuation token is malformed or belongs to another query."""
+
+
+@dataclass
+class LogPage:
+    """A bounded slice of log records plus the token to resume after it."""
+
+    entries: list[dict[str, Any]] = field(default_factory=list)
+    next_page_token: str | None = None
+    size_bytes: int = 0
+
+    def to_json(self) -> str:
+        """Serialize the page into the compact JSON handed back to the agent."""
+        return json.dumps(
+            {
+                "entries": self.entries,
+                "count": len(self.entries),
+                "truncated": self.next_page_token is not None,
+                "next_page_token": self.next_page_token,
+            },
+            default=str,
+        )
+
+
+def _filter_digest(filter_str: str) -> str:
+    return hashlib.sha256(filter_str.encode()).hexdigest()[:12]
+
+
+def encode_page_token(filter_str: str, page_token: str | None, offset: int) -> str:
+    """Encode a continuation cursor for the given query.
+
+    The cursor pins the Cloud Logging page token of the page being read, the
+    number of entries of that page already returned, and a digest of the
+    filter so that a token cannot be replayed against a different query.
+    """
+    cursor = {"f": _filter_digest(filter_str), "p": page_token, "o": offset}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_page_token(filter_str: str, token: str) -> tuple[str | None, int]:
+    """Decode a continuation cursor produced by `encode_page_token`.
+
+    Returns:
+        The Cloud Logging page token and the offset within that page.
+
+    Raises:
+        InvalidPageToken: If the token is malformed or was issued for another filter.
+    """
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(token.encode()))
+        digest, page_token, offset = cursor["f"], cursor["p"], int(cursor["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidPageToken(f"Malformed page token: {e}") from e
+    if digest != _filter_digest(filter_str):
+        raise InvalidPageToken("Page token was issued for a different query.")
+    return page_token, offset
+
+
+def _quote(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def build_log_filter(
+    service_name: str | None,
+    start_time: str,
+    end_time: str,
+    min_severity: str | None = None,
+    text: str | None = None,
+    regex: str | None = None,
+    status_min: int | None = None,
+    status_max: int | None = None,
+    trace_id: str | None = None,
+) -> str:
+    """Build a Cloud Logging filter expression evaluated server-side.
+
+    Every constraint is pushed into the filter so that non-matching entries
+    are never transferred.
+
+    Args:
+        service_name: The Cloud Run service name.
+        start_time: The start time (inclusive) in RFC 3339 format.
+        end_time: The end time (exclusive) in RFC 3339 format.
+        min_severity: Minimum severity, e.g. "WARNING".
+        text: Substring to match in the text payload or `jsonPayload.message`.
+        regex: RE2 regular expression to match in the same fields.
+        status_min: Minimum HTTP response status (inclusive).
+        status_max: Maximum HTTP response status (inclusive).
+        trace_id: A trace id or full `projects/.../traces/...` resource name.
+
+    Returns:
+        The filter expression.
+
+    Raises:
+        ValueError: If `min_severity` is not a Cloud Logging severity.
+    """
+    clauses = []
+    if service_name:
+        clauses.append(f"resource.labels.service_name={_quote(service_name)}")
+    clauses.append(f"timestamp >= {_quote(start_time)}")
+    clauses.append(f"timestamp < {_quote(end_time)}")
+    if min_severity:
+        severity = min_severity.upper()
+        if severity not in SEVERITIES:
+            raise ValueError(
+                f"Unknown severity {min_severity!r}, expected one of {SEVERITIES}"
+            )
+        clauses.append(f"severity >= {severity}")
+    if text:
+        clauses.append(
+            f"(textPayload:{_quote(text)} OR jsonPayload.message:{_quote(text)})"
+        )
+    if regex:
+        clauses.append(
+            f"(textPayload=~{_quote(regex)} OR jsonPayload.message=~{_quote(regex)})"
+        )
+    if status_min is not None:
+        clauses.append(f"httpRequest.status >= {int(status_min)}")
+    if status_max is not None:
+        clauses.append(f"httpRequest.status <= {int(status_max)}")
+    if trace_id:
+        operator = "=" if trace_id.startswith("projects/") else ":"
+        clauses.append(f"trace{operator}{_quote(trace_id)}")
+    return " AND ".join(clauses)
+
+
+def _entry_message(entry: Any) -> str:
+    payload = getattr(entry, "payload", None)
+    if isinstance(payload, str):
+        message = payload
+    elif isinstance(payload, dict):
+        text = payload.get("message") or payload.get("msg")
+        if isinstance(text, str):
+            message = text
+        else:
+            message = json.dumps(payload, default=str, separators=(",", ":"))
+    elif payload is not None:
+        message = str(payload)
+    else:
+        http_request = getattr(entry, "http_request", None) or {}
+        message = " ".join(
+            str(http_request[key])
+            for key in ("requestMethod", "requestUrl", "status", "latency")
+            if http_request.get(key) is not None
+        )
+    if len(message) > MAX_MESSAGE_CHARS:
+        message = message[:MAX_MESSAGE_CHARS] + "...[truncated]"
+    return message
+
+
+def _entry_field(entry: Any, name: str) -> Any:
+    if name == "timestamp":
+        timestamp = getattr(entry, "timestamp", None)
+        return timestamp.isoformat() if timestamp is not None else None
+    if name == "message":
+        return _entry_message(entry)
+    if name.startswith("payload."):
+        value = getattr(entry, "payload", None)
+        for key in name.split(".")[1:]:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+    return getattr(entry, name, None)
+
+
+def project_entry(entry: Any, fields: Sequence[str] | None = None) -> dict[str, Any]:
+    """Project a Cloud Logging entry down to a compact record.
+
+    By default only the fields useful for incident analysis are kept:
+    timestamp, severity, message, trace and source location. Empty fields are
+    dropped. Cloud Logging `entries.list` has no field mask, so the whole entry
+    is still downloaded: the projection only trims what is handed to the model.
+
+    Args:
+        entry: A `google.cloud.logging` log entry.
+        fields: Entry attributes to keep instead of the defaults, e.g.
+            `http_request`, `labels`, `span_id`, or `payload.<key>` to pick a
+            nested key of a JSON payload.
+
+    Returns:
+        A JSON-serializable dictionary.
+    """
+    record = {name: _entry_field(entry, name) for name in fields or DEFAULT_FIELDS}
+    return {key: value for key, value in record.items() if value}
+
+
+@functools.cache
+def _default_project() -> str | None:
+    return google.auth.default()[1]
+
+
+def entry_from_pb(entry: Any) -> Any:
+    """Convert an entry of the GAPIC `list_log_entries` API into a `LogEntry`."""
+    entry_pb = GapicLogEntry.pb(entry)
+    try:
+        resource = MessageToDict(entry_pb)
+    except TypeError:
+        # Proto payloads whose type is not in the protobuf registry.
+        stripped = type(entry_pb)()
+        stripped.CopyFrom(entry_pb)
+        stripped.ClearField("proto_payload")
+        resource = MessageToDict(stripped)
+    payload = resource.get("textPayload", resource.get("jsonPayload"))
+    source_location = resource.get("sourceLocation")
+    if source_location is not None and "line" in source_location:
+        source_location["line"] = int(source_location["line"])
+    # `LogEntry` is a namedtuple built at runtime, hence untyped.
+    fields: dict[str, Any] = {
+        "log_name": resource.get("logName"),
+        "labels": resource.get("labels"),
+        "insert_id": resource.get("insertId"),
+        "severity": resource.get("severity"),
+        "http_request": resource.get("httpRequest"),
+        "timestamp": entry.timestamp if "timestamp" in entry else None,
+        "trace": resource.get("trace"),
+        "span_id": resource.get("spanId"),
+        "trace_sampled": resource.get("traceSampled"),
+        "source_location": source_location,
+        "operation": resource.get("operation"),
+        "payload": payload if payload is not None else resource.get("protoPayload"),
+    }
+    return LogEntry(**fields)
+
+
+def read_log_page(
+    client: Any,
+    project: str | None,
+    filter_str: str,
+    page_token: str | None = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    fields: Sequence[str] | None = None,
+) -> LogPage:
+    """Stream log entries page by page until an entry or byte budget is hit.
+
+    Entries are projected as they are read, so memory stays bounded by one
+    API page regardless of the size of the queried window. The GAPIC client
+    is used because its pager exposes the page tokens, which the generator
+    returned by `google.cloud.logging.Client.list_entries` does not.
+
+    Args:
+        client: A `LoggingServiceV2Client`.
+        project: The project whose logs are read, the default project of the
+            credentials if None.
+        filter_str: The Cloud Logging filter expression.
+        page_token: A continuation token returned by a previous call.
+        page_size: Number of entries requested per API page.
+        max_entries: Maximum number of records to return.
+        max_bytes: Approximate maximum serialized size of the returned records.
+        fields: Record fields to keep, see `project_entry`.
+
+    Returns:
+        The page of records, with `next_page_token` set if more entries remain.
+    """
+    current_token, skip = (
+        decode_page_token(filter_str, page_token) if page_token else (None, 0)
+    )
+    pager = client.list_log_entries(
+        request=ListLogEntriesRequest(
+            resource_names=[f"projects/{project or _default_project()}"],
+            filter=filter_str,
+            page_size=page_size,
+            page_token=current_token or "",
+        )
+    )
+
+    page = LogPage()
+    for api_page in pager.pages:
+        for offset, entry in enumerate(api_page.entries):
+            if offset < skip:
+                continue
+            record = project_entry(entry_from_pb(entry), fields)
+            size = len(json.dumps(record, default=str))
+            if page.entries and (
+                len(page.entries) >= max_entries or page.size_bytes + size > max_bytes
+            ):
+                page.next_page_token = encode_page_token(
+                    filter_str, current_token, offset
+                )
+                return page
+            page.entries.append(record)
+            page.size_bytes += size
+        skip = 0
+        # The last page has an empty token.
+        current_token = api_page.next_page_token or None
+        if current_token is None:
+            break
+    return page
+
+
+def iter_log_records(
+    client: Any,
+    filter_str: str,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    limit: int | None = None,
+    fields: Sequence[str] | None = None,
+) -> Iterator[dict[str, Any]]:
+    """Lazily yield projected records for every entry matching the filter.
+
+    Args:
+        client: A `google.cloud.logging.Client`.
+        filter_str: The Cloud Logging filter expression.
+        page_size: Number of entries requested per API page.
+        limit: Stop after this many records.
+        fields: Record fields to keep, see `project_entry`.
+
+    Yields:
+        Projected log records, oldest first.
+    """
+    entries = client.list_entries(
+        filter_=filter_str, page_size=page_size, max_results=limit
+    )
+    for entry in entries:
+        yield project_entry(entry, fields)
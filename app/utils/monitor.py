@@ -0,0 +1,350 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from app.utils.log_templates import mine_templates
+from app.utils.traces import percentile
+
+DEFAULT_INTERVAL = 60.0
+# Traces and logs are ingested with a delay; the newest seconds are left for
+# the next poll.
+DEFAULT_INGESTION_LAG = 60.0
+# After a long downtime only the most recent data is scanned.
+DEFAULT_MAX_CATCHUP = 3600.0
+DEFAULT_ALPHA = 0.1
+DEFAULT_THRESHOLD = 4.0
+DEFAULT_WARMUP = 10
+DEFAULT_MIN_REQUESTS = 5
+
+# Smallest standard deviations assumed per metric, so that a perfectly stable
+# baseline does not turn every small change into a huge z-score.
+_MIN_STD = {"error_rate": 0.02, "p95_ms": 10.0, "errors_per_minute": 1.0}
+
+
+class Ewma:
+    """Exponentially weighted moving mean and variance of a metric."""
+
+    def __init__(
+        self, alpha: float = DEFAULT_ALPHA, mean: float = 0.0, var: float = 0.0
+    ) -> None:
+        """Initialize the baseline.
+
+        Args:
+            alpha: Weight of a new observation.
+            mean: Initial mean.
+            var: Initial variance.
+        """
+        self.alpha = alpha
+        self.mean = mean
+        self.var = var
+        self.count = 0
+
+    def update(self, value: float) -> None:
+        """Fold an observation into the baseline."""
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += self.alpha * delta
+            self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+        self.count += 1
+
+    def zscore(self, value: float, min_std: float = 0.0) -> float:
+        """Number of standard deviations between `value` and the mean."""
+        std = max(math.sqrt(self.var), 0.1 * abs(self.mean), min_std, 1e-9)
+        return (value - self.mean) / std
+
+
+@dataclass
+class Anomaly:
+    """A significant upward deviation of a metric from its baseline."""
+
+    source: str
+    metric: str
+    value: float
+    baseline: float
+    zscore: float
+    details: Any = None
+    # An example trace of the anomaly: the slowest or latest erroring one.
+    trace_id: str | None = None
+    # The polled window the anomaly was found in.
+    start: datetime | None = None
+    end: datetime | None = None
+
+    def describe(self) -> str:
+        """Render the anomaly as an alert text."""
+        text = (
+            f"Anomaly on {self.source}: {self.metric} is {self.value:.4g} "
+            f"(baseline {self.baseline:.4g}, z={self.zscore:.1f})"
+        )
+        if self.details:
+            text += "\n" + json.dumps(self.details, indent=2)
+        return text
+
+    @property
+    def signature(self) -> str:
+        """What is deduplicated across polls: the source and metric."""
+        return f"anomaly {self.source} {self.metric}"
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class AnomalyMonitor:
+    """Polls traces and error logs in the background and alerts on anomalies.
+
+    Each poll only reads the data ingested since the persisted high-water mark.
+    Per root span, the error rate and the p95 latency of the polled window are
+    compared to exponentially weighted baselines, and so is the rate of error
+    logs; a value more than `threshold` standard deviations above its baseline
+    raises an alert. Baselines need `warmup` observations before alerting, and
+    they are persisted with the high-water mark so a restart keeps them.
+    """
+
+    def __init__(
+        self,
+        fetch_traces: Callable[[datetime, datetime], Iterable[dict[str, Any]]],
+        fetch_error_logs: Callable[[datetime, datetime], Iterable[dict[str, Any]]],
+        alert: Callable[[Anomaly], Any],
+        state_path: str | None = None,
+        interval: float = DEFAULT_INTERVAL,
+        ingestion_lag: float = DEFAULT_INGESTION_LAG,
+        max_catchup: float = DEFAULT_MAX_CATCHUP,
+        alpha: float = DEFAULT_ALPHA,
+        threshold: float = DEFAULT_THRESHOLD,
+        warmup: int = DEFAULT_WARMUP,
+        min_requests: int = DEFAULT_MIN_REQUESTS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize the monitor, restoring its state if persisted.
+
+        Args:
+            fetch_traces: Returns the trace records started in a time range.
+            fetch_error_logs: Returns the error log records of a time range.
+            alert: Called with each detected anomaly.
+            state_path: File persisting the high-water mark and the baselines.
+            interval: Seconds between polls.
+            ingestion_lag: Seconds of most recent data left for the next poll.
+            max_catchup: Maximum seconds of data read by one poll.
+            alpha: Weight of a new observation in the baselines.
+            threshold: Z-score above which a value is anomalous.
+            warmup: Observations needed before a baseline raises alerts.
+            min_requests: Traces needed in a window to judge a root span.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        self.fetch_traces = fetch_traces
+        self.fetch_error_logs = fetch_error_logs
+        self.alert = alert
+        self.state_path = state_path
+        self.interval = interval
+        self.ingestion_lag = ingestion_lag
+        self.max_catchup = max_catchup
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_requests = min_requests
+        self.clock = clock
+        self.high_water_mark: float | None = None
+        self.baselines: dict[str, Ewma] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Unable to read anomaly monitor state: %s", e)
+            return
+        self.high_water_mark = state.get("high_water_mark")
+        for key, (mean, var, count) in state.get("baselines", {}).items():
+            baseline = self.baselines[key] = Ewma(self.alpha, mean, var)
+            baseline.count = count
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        state = {
+            "high_water_mark": self.high_water_mark,
+            "baselines": {
+                key: [b.mean, b.var, b.count] for key, b in self.baselines.items()
+            },
+        }
+        try:
+            with open(f"{self.state_path}.tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(f"{self.state_path}.tmp", self.state_path)
+        except OSError as e:
+            logging.warning("Unable to write anomaly monitor state: %s", e)
+
+    def _check(
+        self, source: str, metric: str, value: float, details: Any = None
+    ) -> Anomaly | None:
+        """Compare a value to its baseline, then fold it into the baseline."""
+        baseline = self.baselines.setdefault(f"{source}|{metric}", Ewma(self.alpha))
+        anomaly = None
+        if baseline.count >= self.warmup:
+            zscore = baseline.zscore(value, _MIN_STD.get(metric, 0.0))
+            if zscore >= self.threshold:
+                anomaly = Anomaly(source, metric, value, baseline.mean, zscore, details)
+        baseline.update(value)
+        return anomaly
+
+    def observe(
+        self,
+        traces: Iterable[dict[str, Any]],
+        error_logs: Iterable[dict[str, Any]],
+        seconds: float,
+    ) -> list[Anomaly]:
+        """Update the baselines with one polled window and return its anomalies.
+
+        Args:
+            traces: Trace records of the window, see `trace_record`.
+            error_logs: Error log records of the window.
+            seconds: Duration of the window.
+
+        Returns:
+            The anomalies of the window.
+        """
+        latencies: dict[str, list[float]] = defaultdict(list)
+        error_counts: dict[str, int] = defaultdict(int)
+        errors: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        slowest: dict[str, dict[str, Any]] = {}
+        latest_error: dict[str, dict[str, Any]] = {}
+        for record in traces:
+            name = record.get("root_span") or "<unknown>"
+            latencies[name].append(record["latency_ms"])
+            if (
+                name not in slowest
+                or record["latency_ms"] > slowest[name]["latency_ms"]
+            ):
+                slowest[name] = record
+            if record.get("error"):
+                error_counts[name] += 1
+                if (record.get("start_time") or "") >= (
+                    latest_error.get(name, {}).get("start_time") or ""
+                ):
+                    latest_error[name] = record
+                errors[name].extend(
+                    {"message": message, "timestamp": record.get("start_time")}
+                    for message in record.get("error_messages", [])
+                )
+
+        anomalies: list[Anomaly] = []
+        for name, values in latencies.items():
+            if len(values) < self.min_requests:
+                continue
+            values.sort()
+            error_rate = self._check(
+                name,
+                "error_rate",
+                error_counts[name] / len(values),
+                {"error_templates": mine_templates(errors[name], top_n=5)},
+            )
+            if error_rate is not None:
+                error_rate.trace_id = latest_error.get(name, {}).get("trace_id")
+                anomalies.append(error_rate)
+            p95 = self._check(name, "p95_ms", percentile(values, 95) or 0.0)
+            if p95 is not None:
+                p95.trace_id = slowest[name].get("trace_id")
+                anomalies.append(p95)
+
+        error_logs = list(error_logs)
+        anomaly = self._check(
+            "logs",
+            "errors_per_minute",
+            len(error_logs) * 60 / max(seconds, 1.0),
+            {
+                "error_templates": mine_templates(
+                    (
+                        {
+                            "message": r.get("message", ""),
+                            "timestamp": r.get("timestamp"),
+                        }
+                        for r in error_logs
+                    ),
+                    top_n=5,
+                )
+            },
+        )
+        if anomaly is not None:
+            anomalies.append(anomaly)
+        return anomalies
+
+    def poll(self) -> list[Anomaly]:
+        """Read the data ingested since the high-water mark and alert on it.
+
+        Returns:
+            The detected anomalies.
+        """
+        with self._lock:
+            end = self.clock() - self.ingestion_lag
+            start = self.high_water_mark or end - self.interval
+            start = max(start, end - self.max_catchup)
+            if end <= start:
+                return []
+            start_time = datetime.fromtimestamp(start, tz=timezone.utc)
+            end_time = datetime.fromtimestamp(end, tz=timezone.utc)
+            traces = self.fetch_traces(start_time, end_time)
+            error_logs = self.fetch_error_logs(start_time, end_time)
+            anomalies = self.observe(traces, error_logs, end - start)
+            self.high_water_mark = end
+            self._save()
+        for anomaly in anomalies:
+            anomaly.start, anomaly.end = start_time, end_time
+            logging.warning(
+                "%s between %s and %s", anomaly.describe(), _iso(start), _iso(end)
+            )
+            self.alert(anomaly)
+        return anomalies
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logging.warning("Anomaly monitor poll failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        """Start the background polling thread if it is not running yet."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="anomaly-monitor", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background polling thread."""
+        self._stop.set()
@@ -0,0 +1,141 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from collections.abc import Callable, Sequence
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+DEFAULT_TIMEZONE = "Europe/Paris"
+DEFAULT_CACHE_TTL = 3600.0
+# A cache is recreated this many seconds before it expires on the server.
+CACHE_REFRESH_MARGIN = 300.0
+# Seconds to wait before retrying a failed cache creation.
+CACHE_RETRY_INTERVAL = 600.0
+
+
+class SystemPrompt:
+    """Assembles the messages sent to the model on each call.
+
+    The static instructions are built once into a single message object that
+    every call reuses. Only the current-time line is rendered per call, and it
+    is memoized for the current minute, so prompt assembly costs one list
+    allocation per call.
+    """
+
+    def __init__(
+        self,
+        instructions: str,
+        timezone: str = DEFAULT_TIMEZONE,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize the prompt.
+
+        Args:
+            instructions: The static system instructions.
+            timezone: Timezone of the rendered current time.
+            clock: Returns the current Unix time.
+        """
+        self.instructions = instructions.strip()
+        self.static = SystemMessage(self.instructions)
+        self.timezone = ZoneInfo(timezone)
+        self.clock = clock
+        self._minute: int | None = None
+        self._time_line = ""
+
+    def time_line(self) -> str:
+        """Return the current-time line, rendered at most once per minute."""
+        now = self.clock()
+        minute = int(now // 60)
+        if minute != self._minute:
+            rendered = datetime.fromtimestamp(now, self.timezone).strftime(
+                "%Y-%m-%d %H:%M"
+            )
+            self._time_line = f"Current date and time ({self.timezone.key}): {rendered}"
+            self._minute = minute
+        return self._time_line
+
+    def messages(
+        self, conversation: Sequence[BaseMessage], cached: bool = False
+    ) -> list[BaseMessage]:
+        """Return the messages of one model call.
+
+        Args:
+            conversation: The conversation so far.
+            cached: Whether the static instructions are served from a context
+                cache. System instructions cannot be sent alongside a cache, so
+                the current time is then sent as a user turn instead.
+
+        Returns:
+            The system prompt followed by the conversation.
+        """
+        if cached:
+            return [HumanMessage(self.time_line()), *conversation]
+        return [self.static, SystemMessage(self.time_line()), *conversation]
+
+
+class PromptCache:
+    """Keeps a server-side context cache of the static prompt alive.
+
+    The cache is created lazily by `create`, which returns its name, and is
+    recreated shortly before it expires. When creation fails, for instance
+    because the prompt is below the minimum cacheable size, calls proceed
+    uncached and creation is retried later.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[float], str],
+        ttl: float = DEFAULT_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initialize the cache holder.
+
+        Args:
+            create: Creates the context cache with the given TTL in seconds
+                and returns its name.
+            ttl: Lifetime of each context cache, in seconds.
+            clock: Returns a monotonic time in seconds.
+        """
+        self.create = create
+        self.ttl = ttl
+        self.clock = clock
+        self._name: str | None = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def name(self) -> str | None:
+        """Return the name of a live context cache, or None if unavailable."""
+        now = self.clock()
+        if self._name is not None and now < self._expires_at - CACHE_REFRESH_MARGIN:
+            return self._name
+        with self._lock:
+            now = self.clock()
+            if self._name is not None and now < self._expires_at - CACHE_REFRESH_MARGIN:
+                return self._name
+            if now < self._retry_at:
+                return None
+            try:
+                self._name = self.create(self.ttl)
+                self._expires_at = now + self.ttl
+            except Exception as e:
+                logging.warning("Unable to create the prompt context cache: %s", e)
+                self._name = None
+                self._retry_at = now + CACHE_RETRY_INTERVAL
+            return self._name
@@ -0,0 +1,277 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import tarfile
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+import requests
+
+from app.utils.clients import get_http_session
+from app.utils.github_contents import GITHUB_API_URL, GitHubContents
+
+DEFAULT_REFRESH_INTERVAL = 300.0
+DEFAULT_MAX_FILE_BYTES = 512 * 1024
+DEFAULT_CONTEXT_LINES = 2
+# The compare API lists at most 300 files; beyond that a full rebuild is needed.
+COMPARE_FILE_LIMIT = 300
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the set of lowercase character trigrams of `text`."""
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _decode(data: bytes, max_bytes: int) -> str | None:
+    if len(data) > max_bytes or b"\x00" in data[:8192]:
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+class RepoIndex:
+    """An in-memory mirror of a GitHub repository with path and content indexes.
+
+    The mirror is bootstrapped from a tarball snapshot of the branch head, then
+    kept up to date in the background: when the head moves, only the files
+    listed by the compare API are re-downloaded and re-indexed. Content search
+    narrows candidate files with a trigram inverted index before scanning their
+    lines, so both path and code searches are answered from memory.
+    """
+
+    def __init__(
+        self,
+        repo: str,
+        token: str | None,
+        ref: str = "main",
+        contents: GitHubContents | None = None,
+        session: Callable[[], requests.Session] = get_http_session,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        timeout: float = 60.0,
+    ) -> None:
+        """Initialize an empty mirror.
+
+        Args:
+            repo: The repository, as "owner/name".
+            token: GitHub access token.
+            ref: The branch to mirror.
+            contents: Reader used to resolve the ref and fetch changed files.
+            session: Returns the HTTP session used for requests.
+            refresh_interval: Seconds between background syncs.
+            max_file_bytes: Files larger than this are listed but not indexed.
+            timeout: Request timeout in seconds.
+        """
+        self.repo = repo
+        self.token = token
+        self.ref = ref
+        self.contents = contents or GitHubContents(repo, token, session=session)
+        self.session = session
+        self.refresh_interval = refresh_interval
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self.sha: str | None = None
+        self.ready = threading.Event()
+        self._files: dict[str, str | None] = {}
+        self._trigrams: dict[str, set[str]] = {}
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _headers(self) -> dict[str, str]:
+        return {"Authorization": f"token {self.token}"} if self.token else {}
+
+    def _index(self, path: str, content: str | None) -> None:
+        self._unindex(path)
+        self._files[path] = content
+        if content is not None:
+            for trigram in trigrams(content):
+                self._trigrams.setdefault(trigram, set()).add(path)
+
+    def _unindex(self, path: str) -> None:
+        content = self._files.pop(path, None)
+        if content is None:
+            return
+        for trigram in trigrams(content):
+            paths = self._trigrams.get(trigram)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._trigrams[trigram]
+
+    def _iter_tarball(self, sha: str) -> Iterator[tuple[str, str | None]]:
+        url = f"{GITHUB_API_URL}/repos/{self.repo}/tarball/{sha}"
+        with self.session().get(
+            url, headers=self._headers(), stream=True, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    # Strip the "<owner>-<repo>-<sha>/" prefix of the archive.
+                    path = member.name.split("/", 1)[-1]
+                    content = None
+                    if member.size <= self.max_file_bytes:
+                        file = archive.extractfile(member)
+                        if file is not None:
+                            content = _decode(file.read(), self.max_file_bytes)
+                    yield path, content
+
+    def _rebuild(self, sha: str) -> None:
+        files: dict[str, str | None] = {}
+        index: dict[str, set[str]] = {}
+        for path, content in self._iter_tarball(sha):
+            files[path] = content
+            if content is not None:
+                for trigram in trigrams(content):
+                    index.setdefault(trigram, set()).add(path)
+        with self._lock:
+            self._files, self._trigrams, self.sha = files, index, sha
+
+    def _changed_files(self, base: str, head: str) -> list[dict[str, Any]] | None:
+        url = f"{GITHUB_API_URL}/repos/{self.repo}/compare/{base}...{head}"
+        response = self.session().get(
+            url, headers=self._headers(), timeout=self.timeout
+        )
+        if response.status_code == 404:
+            return None  # The base commit is gone, e.g. after a force-push.
+        response.raise_for_status()
+        comparison = response.json()
+        # After a force-push the head does not descend from the base, and the
+        # listed files are relative to their merge-base.
+        if comparison.get("status") not in ("ahead", "identical"):
+            return None
+        files = comparison.get("files", [])
+        return None if len(files) >= COMPARE_FILE_LIMIT else files
+
+    def _apply(self, head: str, changes: Iterable[dict[str, Any]]) -> None:
+        updates: dict[str, str | None] = {}
+        removed = []
+        for change in changes:
+            if change.get("previous_filename"):
+                removed.append(change["previous_filename"])
+            if change["status"] == "removed":
+                removed.append(change["filename"])
+            else:
+                try:
+                    data = self.contents.read(change["filename"], head).encode()
+                except UnicodeDecodeError:
+                    data = b"\x00"
+                except requests.RequestException as e:
+                    # E.g. a submodule or symlink entry: list it without content
+                    # rather than blocking the sync on it forever.
+                    logging.warning(
+                        "Unable to read %s at %s: %s", change["filename"], head, e
+                    )
+                    data = b"\x00"
+                updates[change["filename"]] = _decode(data, self.max_file_bytes)
+        with self._lock:
+            for path in removed:
+                self._unindex(path)
+            for path, content in updates.items():
+                self._index(path, content)
+            self.sha = head
+
+    def sync(self) -> None:
+        """Bring the mirror up to date with the head of the mirrored branch."""
+        head = self.contents.resolve_ref(self.ref)
+        if head == self.sha:
+            return
+        changes = self._changed_files(self.sha, head) if self.sha else None
+        if changes is None:
+            logging.info("Rebuilding mirror of %s at %s", self.repo, head)
+            self._rebuild(head)
+        else:
+            logging.info("Updating mirror of %s to %s", self.repo, head)
+            self._apply(head, changes)
+        self.ready.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logging.warning("Failed to sync mirror of %s: %s", self.repo, e)
+            self._stop.wait(self.refresh_interval)
+
+    def start(self) -> None:
+        """Start the background sync thread if it is not running yet."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="repo-index-sync", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background sync thread."""
+        self._stop.set()
+
+    def search_paths(self, query: str, limit: int = 100) -> list[str]:
+        """Return the paths containing `query`, case-insensitively."""
+        query = query.lower()
+        with self._lock:
+            matches = [path for path in self._files if query in path.lower()]
+        return sorted(matches)[:limit]
+
+    def search_code(
+        self, query: str, limit: int = 20, context_lines: int = DEFAULT_CONTEXT_LINES
+    ) -> list[dict[str, Any]]:
+        """Find lines containing `query`, case-insensitively.
+
+        Args:
+            query: The text to search for.
+            limit: Maximum number of matches to return.
+            context_lines: Number of lines of context around each match.
+
+        Returns:
+            Matches with the path, the 1-based line number and a line-numbered
+            snippet.
+        """
+        needle = query.lower()
+        with self._lock:
+            if len(needle) >= 3:
+                candidates: set[str] | None = None
+                for trigram in trigrams(needle):
+                    found = self._trigrams.get(trigram, set())
+                    candidates = found if candidates is None else candidates & found
+                    if not candidates:
+                        break
+                paths = sorted(candidates or ())
+            else:
+                paths = sorted(p for p, c in self._files.items() if c is not None)
+            contents = [(path, self._files[path]) for path in paths]
+
+        matches: list[dict[str, Any]] = []
+        for path, content in contents:
+            lines = (content or "").splitlines()
+            for number, line in enumerate(lines, start=1):
+                if needle not in line.lower():
+                    continue
+                first = max(number - context_lines, 1)
+                last = min(number + context_lines, len(lines))
+                snippet = "\n".join(
+                    f"{n}: {lines[n - 1]}" for n in range(first, last + 1)
+                )
+                matches.append({"path": path, "line": number, "snippet": snippet})
+                if len(matches) >= limit:
+                    return matches
+        return matches
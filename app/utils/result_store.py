@@ -0,0 +1,287 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from typing import Any
+
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+DEFAULT_INLINE_LIMIT = 8 * 1024
+DEFAULT_PREVIEW_CHARS = 1000
+DEFAULT_READ_LIMIT = 100
+DEFAULT_TOP_N = 20
+MAX_LINE_CHARS = 2000
+
+
+class UnknownHandle(KeyError):
+    """Raised when a handle does not reference a stored result."""
+
+
+def _resolve(value: Any, path: list[str]) -> Any:
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _records(data: Any) -> list[Any]:
+    # Tool results are either a list of records or an object holding one,
+    # like the "entries" of a log page or the "slowest_traces" of a summary.
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        lists = [v for v in data.values() if isinstance(v, list)]
+        if lists:
+            return max(lists, key=len)
+        return [data]
+    return []
+
+
+def _lines(content: str) -> list[str]:
+    # Tool results are mostly single-line JSON: pretty-print them so that each
+    # field is a line, and split long lines, so every part of a result can be
+    # paged to and grepped.
+    try:
+        content = json.dumps(json.loads(content), indent=1, ensure_ascii=False)
+    except ValueError:
+        pass
+    return [
+        line[start : start + MAX_LINE_CHARS]
+        for line in content.splitlines()
+        for start in range(0, max(len(line), 1), MAX_LINE_CHARS)
+    ]
+
+
+class ResultStore:
+    """Keeps large tool results out of the conversation.
+
+    A result above the inline limit is stored once and replaced in the
+    conversation by a short handle with a preview; the model reads it on
+    demand through `read` and `aggregate`. Results are kept in memory up to a
+    byte budget, and least recently used results are spilled to local disk.
+    Spilled results are kept up to a second byte budget, beyond which the
+    oldest ones are deleted and their handles expire. Handles are content
+    hashes, so an identical result is stored once.
+
+    Each store spills to its own directory, removed when the store is closed
+    or garbage collected, so processes sharing a disk never read or delete
+    each other's results.
+    """
+
+    def __init__(
+        self,
+        spill_dir: str | None = None,
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        inline_limit: int = DEFAULT_INLINE_LIMIT,
+        preview_chars: int = DEFAULT_PREVIEW_CHARS,
+    ) -> None:
+        """Initialize the store.
+
+        Args:
+            spill_dir: Parent directory of the spill directory, the system
+                temporary directory by default.
+            max_memory_bytes: Memory budget of the stored results.
+            max_disk_bytes: Disk budget of the spilled results.
+            inline_limit: Results up to this many characters stay inline.
+            preview_chars: Number of characters of the preview of a stored result.
+        """
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = tempfile.mkdtemp(prefix="tool-results-", dir=spill_dir)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.inline_limit = inline_limit
+        self.preview_chars = preview_chars
+        self._results: OrderedDict[str, str] = OrderedDict()
+        self._memory_bytes = 0
+        self._spilled: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._cleanup = weakref.finalize(
+            self, shutil.rmtree, self.spill_dir, ignore_errors=True
+        )
+
+    def close(self) -> None:
+        """Delete the spilled results."""
+        self._cleanup()
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.spill_dir, f"{handle}.txt")
+
+    def put(self, content: str) -> str:
+        """Store a result and return its handle."""
+        handle = "res_" + hashlib.sha256(content.encode()).hexdigest()[:16]
+        with self._lock:
+            if handle in self._results:
+                self._results.move_to_end(handle)
+                return handle
+            self._results[handle] = content
+            self._memory_bytes += len(content)
+            spilled = []
+            while self._memory_bytes > self.max_memory_bytes and len(self._results) > 1:
+                old_handle, old_content = self._results.popitem(last=False)
+                self._memory_bytes -= len(old_content)
+                spilled.append((old_handle, old_content))
+        for old_handle, old_content in spilled:
+            self._spill(old_handle, old_content)
+        return handle
+
+    def _spill(self, handle: str, content: str) -> None:
+        with self._lock:
+            if handle in self._spilled:
+                self._spilled.move_to_end(handle)
+                return
+        path = self._path(handle)
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logging.warning("Unable to spill tool result %s: %s", handle, e)
+            return
+        expired = []
+        with self._lock:
+            if handle not in self._spilled:
+                self._spilled[handle] = len(content)
+                self._disk_bytes += len(content)
+            while self._disk_bytes > self.max_disk_bytes and len(self._spilled) > 1:
+                old_handle, size = self._spilled.popitem(last=False)
+                self._disk_bytes -= size
+                expired.append(old_handle)
+        for old_handle in expired:
+            try:
+                os.remove(self._path(old_handle))
+            except OSError as e:
+                logging.warning("Unable to delete tool result %s: %s", old_handle, e)
+
+    def get(self, handle: str) -> str:
+        """Return a stored result.
+
+        Raises:
+            UnknownHandle: If the handle does not reference a stored result.
+        """
+        with self._lock:
+            content = self._results.get(handle)
+            if content is not None:
+                self._results.move_to_end(handle)
+                return content
+            if handle in self._spilled:
+                self._spilled.move_to_end(handle)
+        if not re.fullmatch(r"res_[0-9a-f]{16}", handle):
+            raise UnknownHandle(handle)
+        try:
+            with open(self._path(handle), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            raise UnknownHandle(handle) from None
+
+    def wrap(self, content: str, tool_name: str) -> str:
+        """Return `content` itself if small, else a reference to its stored copy."""
+        if len(content) <= self.inline_limit:
+            return content
+        handle = self.put(content)
+        return json.dumps(
+            {
+                "result_handle": handle,
+                "tool": tool_name,
+                "chars": len(content),
+                "lines": content.count("\n") + 1,
+                "preview": content[: self.preview_chars],
+                "note": "The full result is stored out of band. Use "
+                "read_tool_result to page through or grep it, and "
+                "aggregate_tool_result to count the values of a field.",
+            }
+        )
+
+    def read(
+        self,
+        handle: str,
+        offset: int = 0,
+        limit: int = DEFAULT_READ_LIMIT,
+        pattern: str | None = None,
+    ) -> dict[str, Any]:
+        """Page through the lines of a stored result, optionally grepping them.
+
+        JSON results are pretty-printed, one field per line, and lines longer
+        than `MAX_LINE_CHARS` are split, so single-line results are paged too.
+
+        Args:
+            handle: The result handle.
+            offset: Index of the first line (or match) to return.
+            limit: Maximum number of lines to return.
+            pattern: Case-insensitive regular expression that lines must match.
+
+        Returns:
+            The numbered lines and the offset of the next page, if any.
+        """
+        lines = _lines(self.get(handle))
+        numbered = list(enumerate(lines, start=1))
+        if pattern:
+            regex = re.compile(pattern, re.IGNORECASE)
+            numbered = [(n, line) for n, line in numbered if regex.search(line)]
+        page = numbered[offset : offset + limit]
+        next_offset = offset + limit if offset + limit < len(numbered) else None
+        return {
+            "handle": handle,
+            "total": len(numbered),
+            "lines": [f"{n}: {line}" for n, line in page],
+            "next_offset": next_offset,
+        }
+
+    def aggregate(
+        self, handle: str, field: str, top_n: int = DEFAULT_TOP_N
+    ) -> dict[str, Any]:
+        """Count the values of a field across the records of a JSON result.
+
+        Args:
+            handle: The result handle.
+            field: Dotted path of the field, e.g. "severity" or "payload.status".
+            top_n: Number of most common values to return.
+
+        Returns:
+            The number of records and the most common values with their counts.
+        """
+        try:
+            data = json.loads(self.get(handle))
+        except ValueError:
+            raise ValueError(f"Result {handle} is not JSON") from None
+        records = _records(data)
+        path = field.split(".")
+        counts = Counter(
+            json.dumps(value, sort_keys=True, default=str)
+            if isinstance(value, dict | list)
+            else value
+            for value in (_resolve(record, path) for record in records)
+        )
+        return {
+            "handle": handle,
+            "field": field,
+            "records": len(records),
+            "distinct": len(counts),
+            "top_values": [
+                {"value": value, "count": count}
+                for value, count in counts.most_common(top_n)
+            ],
+        }
@@ -0,0 +1,412 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from typing import Any
+
+from app.utils.time_buckets import (
+    DEFAULT_BUCKET_SECONDS,
+    bucket_ceil,
+    bucket_floor,
+    to_timestamp,
+)
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_RETENTION = 7 * 24 * 3600
+# Number of trace ids remembered so that re-fetched traces are not counted twice.
+SEEN_TRACES_SIZE = 200_000
+# Upper bounds of the latency histogram bands, in milliseconds.
+HISTOGRAM_BOUNDS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf)
+QUANTILES = {"p50_ms": 0.5, "p95_ms": 0.95, "p99_ms": 0.99}
+
+
+class DDSketch:
+    """A mergeable quantile sketch with a bounded relative error.
+
+    Positive values are counted in logarithmically sized bins, so any quantile
+    is estimated within `relative_accuracy` of the true value whatever the
+    distribution, and two sketches with the same accuracy merge exactly by
+    adding their bin counts.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> None:
+        """Initialize an empty sketch.
+
+        Args:
+            relative_accuracy: Maximum relative error of the quantiles.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        """Count a value; zero and negative values share the lowest bin."""
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += 1
+        self.count += 1
+
+    def merge(self, other: "DDSketch") -> None:
+        """Add the counts of a sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches of different accuracies")
+        for key, count in other.bins.items():
+            self.bins[key] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _value(self, key: int) -> float:
+        # The estimate in the middle of the bin, in relative terms.
+        return 2 * self.gamma**key / (1 + self.gamma)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate the `q` quantile (between 0 and 1), None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return self._value(key)
+        return self._value(max(self.bins))
+
+    def histogram(self, bounds: Iterable[float] = HISTOGRAM_BOUNDS_MS) -> list[int]:
+        """Count the values up to each upper bound and above the previous one.
+
+        Values within the relative accuracy of a bound may be counted in the
+        neighbouring band.
+        """
+        bounds = list(bounds)
+        counts = [0] * len(bounds)
+        if self.zero_count:
+            counts[0] += self.zero_count
+        for key, count in self.bins.items():
+            # A bin holds the values above gamma**(key - 1), up to gamma**key.
+            value = self.gamma ** (key - 1)
+            index = next(i for i, bound in enumerate(bounds) if value <= bound)
+            counts[index] += count
+        return counts
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the sketch, e.g. to merge it in another process."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "DDSketch":
+        """Restore a sketch serialized with `to_dict`."""
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        for key, count in data["bins"].items():
+            sketch.bins[int(key)] = count
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+class LatencySketches:
+    """Latency sketches per (service, span name, time bucket).
+
+    Any window is answered by merging the sketches of the buckets it covers,
+    so answers cost O(buckets) and have a constant size whatever the number of
+    traces. Windows are aligned to `bucket_seconds`. The store also remembers
+    which time ranges were fed, so callers only fetch the missing ones, and
+    which of them were fed incompletely, so answers can say they undercount.
+    Stores of several processes can be merged through `to_dict`.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+        retention: float = DEFAULT_RETENTION,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    ) -> None:
+        """Initialize an empty store.
+
+        Args:
+            bucket_seconds: Duration of a time bucket.
+            retention: Seconds of buckets kept before the newest one.
+            relative_accuracy: Maximum relative error of the quantiles.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.retention = retention
+        self.relative_accuracy = relative_accuracy
+        self._sketches: dict[tuple[str, str, int], DDSketch] = {}
+        self._covered: list[tuple[float, float]] = []
+        self._truncated: list[tuple[float, float]] = []
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, timestamp: float) -> int:
+        return bucket_floor(timestamp, self.bucket_seconds)
+
+    def _sketch(self, key: tuple[str, str, int]) -> DDSketch:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = DDSketch(self.relative_accuracy)
+        return sketch
+
+    def add(
+        self, service: str, span: str, timestamp: str | datetime | float, value: float
+    ) -> None:
+        """Count a latency, in milliseconds."""
+        key = (service, span, self._bucket(to_timestamp(timestamp)))
+        with self._lock:
+            self._sketch(key).add(value)
+
+    def add_trace_records(self, records: Iterable[dict[str, Any]], service: str) -> int:
+        """Count the root span latency of trace records not seen yet.
+
+        Args:
+            records: Records produced by `trace_record`.
+            service: The service the traces belong to.
+
+        Returns:
+            The number of records counted.
+        """
+        added = 0
+        with self._lock:
+            for record in records:
+                trace_id = record.get("trace_id")
+                if not record.get("start_time") or (
+                    trace_id is not None and trace_id in self._seen
+                ):
+                    continue
+                if trace_id is not None:
+                    self._seen[trace_id] = None
+                    if len(self._seen) > SEEN_TRACES_SIZE:
+                        self._seen.popitem(last=False)
+                span = record.get("root_span") or "<unknown>"
+                bucket = self._bucket(to_timestamp(record["start_time"]))
+                self._sketch((service, span, bucket)).add(record["latency_ms"])
+                added += 1
+            self._expire()
+        return added
+
+    def _expire(self) -> None:
+        if not self._sketches:
+            return
+        oldest = max(key[2] for key in self._sketches) - self.retention
+        for key in [key for key in self._sketches if key[2] < oldest]:
+            del self._sketches[key]
+        self._covered = [(s, e) for s, e in self._covered if e > oldest]
+        self._truncated = [(s, e) for s, e in self._truncated if e > oldest]
+
+    def mark_covered(
+        self,
+        start: str | datetime | float,
+        end: str | datetime | float,
+        complete: bool = True,
+    ) -> None:
+        """Record that the traces of a time range were fed.
+
+        Args:
+            start: Start of the range.
+            end: End of the range.
+            complete: Whether all the traces of the range were fed, rather than
+                the first ones up to a fetch limit.
+        """
+        fed = (to_timestamp(start), to_timestamp(end))
+        with self._lock:
+            self._covered = _merge_ranges([*self._covered, fed])
+            if not complete:
+                self._truncated = _merge_ranges([*self._truncated, fed])
+
+    def truncated(
+        self, start: str | datetime | float, end: str | datetime | float
+    ) -> bool:
+        """Return whether part of a time range was fed incompletely."""
+        begin, finish = to_timestamp(start), to_timestamp(end)
+        with self._lock:
+            return any(s < finish and e > begin for s, e in self._truncated)
+
+    def missing(
+        self, start: str | datetime | float, end: str | datetime | float
+    ) -> list[tuple[datetime, datetime]]:
+        """Return the parts of a time range that were not fed yet.
+
+        The range and the gaps are widened to whole buckets, as `window` counts
+        whole buckets: a bucket that was only partly fed is missing. Traces fed
+        twice are only counted once.
+        """
+        size = self.bucket_seconds
+        begin: float = bucket_floor(to_timestamp(start), size)
+        finish = bucket_ceil(to_timestamp(end), size)
+        gaps: list[tuple[float, float]] = []
+        with self._lock:
+            for range_start, range_end in self._covered:
+                if range_end <= begin or range_start >= finish:
+                    continue
+                if range_start > begin:
+                    gaps.append((begin, range_start))
+                begin = max(begin, range_end)
+        if begin < finish:
+            gaps.append((begin, finish))
+        aligned = _merge_ranges(
+            [(bucket_floor(s, size), bucket_ceil(e, size)) for s, e in gaps]
+        )
+        return [
+            (
+                datetime.fromtimestamp(s, tz=timezone.utc),
+                datetime.fromtimestamp(e, tz=timezone.utc),
+            )
+            for s, e in aligned
+        ]
+
+    def window(
+        self,
+        start: str | datetime | float,
+        end: str | datetime | float,
+        service: str | None = None,
+        span: str | None = None,
+    ) -> dict[str, DDSketch]:
+        """Merge the sketches of a time window per span name.
+
+        Args:
+            start: Start of the window (inclusive, rounded down to a bucket).
+            end: End of the window (exclusive).
+            service: Only count this service, all services if None.
+            span: Only count this span name, all span names if None.
+
+        Returns:
+            A merged sketch per span name.
+        """
+        first, last = self._bucket(to_timestamp(start)), to_timestamp(end)
+        merged: dict[str, DDSketch] = {}
+        with self._lock:
+            for (key_service, key_span, bucket), sketch in self._sketches.items():
+                if not first <= bucket < last:
+                    continue
+                if service is not None and key_service != service:
+                    continue
+                if span is not None and key_span != span:
+                    continue
+                if key_span not in merged:
+                    merged[key_span] = DDSketch(self.relative_accuracy)
+                merged[key_span].merge(sketch)
+        return merged
+
+    def compare(
+        self,
+        baseline: tuple[str | datetime | float, str | datetime | float],
+        current: tuple[str | datetime | float, str | datetime | float],
+        service: str | None = None,
+        span: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Compare the latency of two windows per span name.
+
+        Returns:
+            Per span name, the count and quantiles of both windows and the
+            change of the share of traces in each latency band.
+        """
+        before = self.window(*baseline, service=service, span=span)
+        after = self.window(*current, service=service, span=span)
+        rows = []
+        for name in sorted(set(before) | set(after), key=lambda n: -_count(after, n)):
+            old = before.get(name, DDSketch(self.relative_accuracy))
+            new = after.get(name, DDSketch(self.relative_accuracy))
+            old_shares, new_shares = _shares(old), _shares(new)
+            rows.append(
+                {
+                    "span": name,
+                    "baseline": _summary(old),
+                    "current": _summary(new),
+                    "histogram_delta": {
+                        _band(i): round(new_shares[i] - old_shares[i], 4)
+                        for i in range(len(HISTOGRAM_BOUNDS_MS))
+                        if new_shares[i] or old_shares[i]
+                    },
+                }
+            )
+        return rows
+
+    def merge(self, other: "LatencySketches") -> None:
+        """Add the sketches and covered ranges of another store."""
+        with self._lock:
+            for key, sketch in other._sketches.items():
+                self._sketch(key).merge(sketch)
+        for start, end in other._covered:
+            self.mark_covered(start, end)
+        for start, end in other._truncated:
+            self.mark_covered(start, end, complete=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the store, e.g. to merge it in another process."""
+        with self._lock:
+            return {
+                "sketches": [
+                    [service, span, bucket, sketch.to_dict()]
+                    for (service, span, bucket), sketch in self._sketches.items()
+                ],
+                "covered": self._covered,
+                "truncated": self._truncated,
+            }
+
+    def load(self, data: dict[str, Any]) -> None:
+        """Merge a store serialized with `to_dict` into this one."""
+        other = LatencySketches(
+            self.bucket_seconds, self.retention, self.relative_accuracy
+        )
+        for service, span, bucket, sketch in data["sketches"]:
+            other._sketches[(service, span, bucket)] = DDSketch.from_dict(sketch)
+        other._covered = [tuple(r) for r in data["covered"]]
+        other._truncated = [tuple(r) for r in data.get("truncated", [])]
+        self.merge(other)
+
+
+def _merge_ranges(ranges: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    merged: list[tuple[float, float]] = []
+    for range_start, range_end in sorted(ranges):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+
+def _count(sketches: dict[str, DDSketch], name: str) -> int:
+    sketch = sketches.get(name)
+    return sketch.count if sketch is not None else 0
+
+
+def _summary(sketch: DDSketch) -> dict[str, Any]:
+    summary: dict[str, Any] = {"count": sketch.count}
+    for label, q in QUANTILES.items():
+        value = sketch.quantile(q)
+        summary[label] = round(value, 1) if value is not None else None
+    return summary
+
+
+def _shares(sketch: DDSketch) -> list[float]:
+    counts = sketch.histogram()
+    return [count / sketch.count if sketch.count else 0.0 for count in counts]
+
+
+def _band(index: int) -> str:
+    upper = HISTOGRAM_BOUNDS_MS[index]
+    lower = HISTOGRAM_BOUNDS_MS[index - 1] if index else 0
+    return f">{lower}ms" if math.isinf(upper) else f"{lower}-{upper}ms"
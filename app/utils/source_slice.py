@@ -0,0 +1,127 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import re
+from dataclasses import dataclass
+
+DEFAULT_WINDOW = 20
+MAX_BLOCK_LINES = 200
+
+# Lines that open a function, method or class in common non-Python languages.
+_DEFINITION = re.compile(
+    r"^\s*(export\s+)?(default\s+)?(async\s+)?"
+    r"(def|class|function|func|fn|interface|struct|impl|module|sub)\b"
+    r"|^\s*((public|private|protected|static|final|abstract|override|"
+    r"internal|virtual)\s+)+[\w<>\[\],\s]+\("
+    r"|^\s*(const|let|var)\s+\w+\s*=\s*(async\s+)?(\(|function)"
+)
+
+
+@dataclass
+class Block:
+    """A named range of 1-based, inclusive line numbers."""
+
+    name: str | None
+    start: int
+    end: int
+
+
+def number_lines(lines: list[str], first: int) -> str:
+    """Prefix each line with its 1-based line number."""
+    return "\n".join(f"{first + i}: {line}" for i, line in enumerate(lines))
+
+
+def slice_lines(text: str, start: int | None = None, end: int | None = None) -> str:
+    """Return the line-numbered lines `start` to `end` (1-based, inclusive)."""
+    lines = text.splitlines()
+    start = max(start or 1, 1)
+    end = min(end or len(lines), len(lines))
+    return number_lines(lines[start - 1 : end], start)
+
+
+def _python_block(text: str, line: int) -> Block | None:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    best: Block | None = None
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        end = node.end_lineno or node.lineno
+        if start <= line <= end and (best is None or start >= best.start):
+            best = Block(node.name, start, end)
+    return best
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _heuristic_block(lines: list[str], line: int) -> Block | None:
+    target = lines[line - 1]
+    target_indent = _indent(target) if target.strip() else None
+    for number in range(line, 0, -1):
+        header = lines[number - 1]
+        if not _DEFINITION.match(header):
+            continue
+        indent = _indent(header)
+        if number != line and target_indent is not None and indent >= target_indent:
+            continue
+        end = number
+        for following in range(number + 1, len(lines) + 1):
+            text = lines[following - 1]
+            if not text.strip():
+                continue
+            if _indent(text) <= indent:
+                # Include a closing brace or `end` aligned with the header.
+                if text.strip()[0] in "})]" or text.strip() == "end":
+                    end = following
+                break
+            end = following
+        if end >= line:
+            return Block(header.strip(), number, end)
+    return None
+
+
+def enclosing_block(text: str, line: int, path: str = "") -> Block:
+    """Find the function or class enclosing a line.
+
+    Python sources are parsed with `ast`; other files use an indentation and
+    keyword heuristic. When no enclosing definition is found, or the definition
+    is very long, a window of lines around `line` is returned instead.
+
+    Args:
+        text: The source code.
+        line: The 1-based line number.
+        path: The file path, used to detect Python sources.
+
+    Returns:
+        The enclosing block.
+    """
+    lines = text.splitlines()
+    line = min(max(line, 1), max(len(lines), 1))
+    block = _python_block(text, line) if path.endswith(".py") else None
+    if block is None and lines:
+        block = _heuristic_block(lines, line)
+    if block is None or block.end - block.start + 1 > MAX_BLOCK_LINES:
+        name = block.name if block is not None else None
+        return Block(
+            name,
+            max(line - DEFAULT_WINDOW, 1),
+            min(line + DEFAULT_WINDOW, len(lines)),
+        )
+    return block
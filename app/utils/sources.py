@@ -0,0 +1,243 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import heapq
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable, Collection, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SOURCE_TIMEOUT = 60.0
+ALL_SOURCES = "all"
+
+
+@dataclass(frozen=True)
+class Source:
+    """A monitored environment: a Cloud Run service in a GCP project.
+
+    `trace_label` is the span label holding the service name, used to select
+    the traces of the service among the others of its project.
+    """
+
+    name: str
+    project: str | None
+    service: str | None
+    trace_label: str | None = None
+
+
+def load_sources(config: str | None) -> list[Source]:
+    """Parse a source configuration.
+
+    Args:
+        config: JSON, or the path of a JSON file, holding either a list of
+            `{"name", "project", "service", "trace_label"}` objects or an
+            object mapping each name to its `{"project", "service",
+            "trace_label"}`. Only `name` is required.
+
+    Returns:
+        The configured sources, none if `config` is empty.
+
+    Raises:
+        ValueError: If the configuration is malformed.
+    """
+    if not config or not config.strip():
+        return []
+    text = config
+    if not config.lstrip().startswith(("[", "{")):
+        with open(config) as f:
+            text = f.read()
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = [{"name": name, **value} for name, value in data.items()]
+        return [
+            Source(
+                item["name"],
+                item.get("project"),
+                item.get("service"),
+                item.get("trace_label"),
+            )
+            for item in data
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid source configuration: {e}") from e
+
+
+class SourceRegistry:
+    """The monitored sources, and a bounded pool to query them concurrently."""
+
+    def __init__(
+        self,
+        sources: Iterable[Source],
+        default: Source,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float = DEFAULT_SOURCE_TIMEOUT,
+    ) -> None:
+        """Initialize the registry.
+
+        Args:
+            sources: The configured sources.
+            default: The source queried when none is requested.
+            max_workers: Maximum number of sources queried at once.
+            timeout: Timeout of the query of one source, in seconds.
+        """
+        self.sources = {source.name: source for source in sources}
+        self.sources.setdefault(default.name, default)
+        self.default = default
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="source"
+        )
+
+    def resolve(self, names: Sequence[str] | None) -> list[Source]:
+        """Return the requested sources, the default one if None.
+
+        Raises:
+            ValueError: If a name is not a configured source.
+        """
+        if not names:
+            return [self.default]
+        if ALL_SOURCES in names:
+            return list(self.sources.values())
+        unknown = [name for name in names if name not in self.sources]
+        if unknown:
+            raise ValueError(
+                f"Unknown sources {unknown}, expected some of "
+                f"{[ALL_SOURCES, *self.sources]}"
+            )
+        return [self.sources[name] for name in dict.fromkeys(names)]
+
+    def trace_label(self, source: Source, label: str) -> str:
+        """Return the span label telling the traces of a source apart.
+
+        The default source and sources alone in their project select every
+        trace of the project, so spans without the label are not missed.
+
+        Args:
+            source: The queried source.
+            label: The label used for other sources sharing a project.
+
+        Returns:
+            The configured `trace_label` of the source, else `label` if
+            another source shares its project, else an empty string.
+        """
+        if source.trace_label:
+            return source.trace_label
+        if source == self.default:
+            return ""
+        project = source.project or self.default.project
+        shared = any(
+            (other.project or self.default.project) == project
+            for other in self.sources.values()
+            if other != source
+        )
+        return label if shared else ""
+
+    def fan_out(
+        self, sources: Sequence[Source], fn: Callable[[Source], T]
+    ) -> tuple[dict[str, T], dict[str, str]]:
+        """Call `fn` for each source concurrently.
+
+        Each source has its own timeout, counted from when its call starts
+        running, and waits at most as long for a free worker. A source that
+        fails or times out is reported in the errors while the results of the
+        others are returned. Timed out calls keep running in the pool until
+        they return.
+
+        Returns:
+            The results and the errors, by source name.
+        """
+        started = {source.name: threading.Event() for source in sources}
+        started_at: dict[str, float] = {}
+
+        def run(source: Source) -> T:
+            started_at[source.name] = time.monotonic()
+            started[source.name].set()
+            return fn(source)
+
+        futures = [(source, self._pool.submit(run, source)) for source in sources]
+        results: dict[str, T] = {}
+        errors: dict[str, str] = {}
+        for source, future in futures:
+            if not started[source.name].wait(self.timeout) and future.cancel():
+                errors[source.name] = f"did not start within {self.timeout:g} seconds"
+                continue
+            started[source.name].wait()
+            deadline = started_at[source.name] + self.timeout
+            try:
+                results[source.name] = future.result(
+                    timeout=max(deadline - time.monotonic(), 0)
+                )
+            except FutureTimeoutError:
+                future.cancel()
+                errors[source.name] = f"timed out after {self.timeout:g} seconds"
+            except Exception as e:
+                logging.warning("Query of source %s failed: %s", source.name, e)
+                errors[source.name] = repr(e)
+        return results, errors
+
+
+def merge_by_timestamp(
+    records_by_source: dict[str, list[dict[str, Any]]], key: str = "timestamp"
+) -> list[dict[str, Any]]:
+    """Merge per-source records in `key` order, tagging each with its source."""
+
+    def order(record: dict[str, Any]) -> str:
+        return record.get(key) or ""
+
+    # Records are usually already sorted, which makes the sorts linear.
+    streams = [
+        sorted(({**record, "source": name} for record in records), key=order)
+        for name, records in records_by_source.items()
+    ]
+    return list(heapq.merge(*streams, key=order))
+
+
+def encode_cursor(tokens: dict[str, str]) -> str:
+    """Encode the continuation tokens of several sources into one token."""
+    return base64.urlsafe_b64encode(json.dumps(tokens).encode()).decode()
+
+
+def decode_cursor(token: str, sources: Collection[str]) -> dict[str, str]:
+    """Decode a token produced by `encode_cursor`.
+
+    Args:
+        token: The encoded token.
+        sources: Names of the sources of the query the token must belong to.
+
+    Raises:
+        ValueError: If the token is malformed, e.g. the token of a single
+            source, or names sources outside `sources`.
+    """
+    try:
+        tokens = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError as e:
+        raise ValueError(f"Malformed page token: {e}") from e
+    if not isinstance(tokens, dict) or not all(
+        isinstance(value, str) for value in tokens.values()
+    ):
+        raise ValueError("Malformed page token: expected an object of tokens")
+    unknown = [name for name in tokens if name not in sources]
+    if unknown:
+        raise ValueError(f"Page token of another query, with sources {unknown}")
+    return tokens
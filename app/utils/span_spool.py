@@ -0,0 +1,302 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import logging
+import os
+import random
+import threading
+from collections.abc import Callable
+
+from app.utils.log_batcher import DEFAULT_MAX_BATCH_BYTES
+
+DEFAULT_SEGMENT_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+_SEGMENT_SUFFIX = ".jsonl"
+_CURSOR_FILE = "cursor.json"
+
+
+class SpanSpool:
+    """An append-only, segmented on-disk queue of log entries.
+
+    Entries are appended as JSON lines to the active segment, and synced to
+    disk before `append` returns. The active segment is rotated once it
+    reaches `segment_bytes`. A reader consumes entries in order and
+    commits its position to a cursor file, so entries that were not shipped
+    before a crash or restart are replayed. Fully consumed segments are
+    deleted, and when the spool exceeds `max_bytes` the oldest segments are
+    dropped and counted.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """Open or create the spool.
+
+        Args:
+            directory: Directory of the segments and the cursor file.
+            segment_bytes: Size at which the active segment is rotated.
+            max_bytes: Maximum total size of the segments.
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.dropped_segments = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[: -len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(_SEGMENT_SUFFIX)
+            and name[: -len(_SEGMENT_SUFFIX)].isdigit()
+        )
+        self._cursor = self._load_cursor()
+        # Appends always go to a new segment, so a line torn by a crash is
+        # never followed by valid entries in the same segment.
+        self._active = (self._segments[-1] + 1) if self._segments else 0
+        self._segments.append(self._active)
+        self._file = open(self._path(self._active), "ab")
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:012d}{_SEGMENT_SUFFIX}")
+
+    def _load_cursor(self) -> tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, _CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return int(cursor["segment"]), int(cursor["offset"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return (self._segments[0] if self._segments else 0), 0
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self.directory, _CURSOR_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"segment": self._cursor[0], "offset": self._cursor[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def _size(self) -> int:
+        total = 0
+        for segment in self._segments:
+            try:
+                total += os.path.getsize(self._path(segment))
+            except OSError:
+                pass
+        return total
+
+    def append(self, entries: list[dict]) -> None:
+        """Append entries to the spool."""
+        data = b"".join(
+            json.dumps(entry, default=str).encode() + b"\n" for entry in entries
+        )
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if self._file.tell() >= self.segment_bytes:
+                self._rotate()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._active += 1
+        self._segments.append(self._active)
+        self._file = open(self._path(self._active), "ab")
+        while len(self._segments) > 1 and self._size() > self.max_bytes:
+            oldest = self._segments.pop(0)
+            self.dropped_segments += 1
+            logging.warning("Span spool full, dropping segment %d", oldest)
+            self._remove(oldest)
+            if self._cursor[0] <= oldest:
+                self._cursor = (self._segments[0], 0)
+                self._save_cursor()
+
+    def _remove(self, segment: int) -> None:
+        try:
+            os.remove(self._path(segment))
+        except OSError:
+            pass
+
+    def read(
+        self, max_entries: int, max_bytes: int | None = None
+    ) -> tuple[list[dict], tuple[int, int]]:
+        """Read the next entries after the committed position.
+
+        Args:
+            max_entries: Maximum number of entries to read.
+            max_bytes: Maximum encoded size of the entries, unbounded if None.
+                At least one entry is read, however large.
+
+        Returns:
+            The entries and the position to commit once they are shipped.
+        """
+        with self._lock:
+            segment, offset = self._cursor
+            entries: list[dict] = []
+            size = 0
+            for current in [s for s in self._segments if s >= segment]:
+                if current != segment:
+                    segment, offset = current, 0
+                try:
+                    with open(self._path(segment), "rb") as f:
+                        f.seek(offset)
+                        for line in f:
+                            if not line.endswith(b"\n"):
+                                break  # Partially written line.
+                            if (
+                                max_bytes is not None
+                                and entries
+                                and size + len(line) > max_bytes
+                            ):
+                                return entries, (segment, offset)
+                            size += len(line)
+                            offset += len(line)
+                            try:
+                                entries.append(json.loads(line))
+                            except ValueError:
+                                logging.warning("Skipping corrupt span spool entry")
+                            if len(entries) >= max_entries:
+                                return entries, (segment, offset)
+                except OSError:
+                    continue
+            return entries, (segment, offset)
+
+    def commit(self, position: tuple[int, int]) -> None:
+        """Mark the entries before `position` as shipped and compact the spool."""
+        with self._lock:
+            if position == self._cursor:
+                return
+            self._cursor = position
+            while self._segments[0] < position[0]:
+                self._remove(self._segments.pop(0))
+            self._save_cursor()
+
+    def close(self) -> None:
+        """Close the active segment."""
+        with self._lock:
+            self._file.close()
+
+
+class SpoolShipper:
+    """Ships the entries of a spool from a background thread.
+
+    Failed writes are retried with exponential backoff and jitter, without
+    advancing the spool cursor, so nothing is lost while the backend is down.
+    A batch whose write fails with a permanent error, one that retrying cannot
+    fix, is skipped and counted instead, so it does not block the spool.
+    """
+
+    def __init__(
+        self,
+        spool: SpanSpool,
+        write: Callable[[list[dict]], bool | None],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_bytes: int = DEFAULT_MAX_BATCH_BYTES,
+        is_permanent: Callable[[Exception], bool] = lambda e: False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+    ) -> None:
+        """Initialize the shipper and start its thread.
+
+        Args:
+            spool: The spool to drain.
+            write: Writes a batch of entries, returning False or raising on
+                failure.
+            batch_size: Maximum number of entries per write.
+            batch_bytes: Maximum encoded size of the entries of a write.
+            is_permanent: Whether an error raised by `write` is permanent.
+            poll_interval: Seconds to wait when the spool is empty.
+            max_backoff: Maximum seconds between retries of a failed write.
+        """
+        self.spool = spool
+        self.write = write
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.is_permanent = is_permanent
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.shipped = 0
+        self.skipped = 0
+        self._ship_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="span-spool-shipper", daemon=True
+        )
+        self._thread.start()
+
+    def ship(self) -> bool:
+        """Ship the next batch, returning False if the write failed."""
+        with self._ship_lock:
+            entries, position = self.spool.read(self.batch_size, self.batch_bytes)
+            if not entries:
+                return True
+            try:
+                if self.write(entries) is False:
+                    return False
+                self.shipped += len(entries)
+            except Exception as e:
+                if not self.is_permanent(e):
+                    logging.warning("Failed to ship span spool entries: %s", e)
+                    return False
+                self.skipped += len(entries)
+                logging.warning(
+                    "Skipping %d span spool entries rejected by the backend: %s",
+                    len(entries),
+                    e,
+                )
+            self.spool.commit(position)
+            return True
+
+    def _run(self) -> None:
+        backoff = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                ok = self.ship()
+            except Exception as e:
+                logging.warning("Failed to ship span spool entries: %s", e)
+                ok = False
+            if not ok:
+                self._stop.wait(random.uniform(backoff / 2, backoff))
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.poll_interval
+            if self.spool.read(1)[0]:
+                continue
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def notify(self) -> None:
+        """Wake the shipper up after new entries were appended."""
+        self._wake.set()
+
+    def flush(self) -> bool:
+        """Ship all spooled entries now, returning False if a write failed."""
+        while self.spool.read(1)[0]:
+            if not self.ship():
+                return False
+        return True
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        """Stop the shipper thread."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
@@ -0,0 +1,208 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncGenerator
+
+DEFAULT_COALESCE_WINDOW = 0.05
+DEFAULT_COALESCE_BYTES = 16 * 1024
+DEFAULT_HEARTBEAT_INTERVAL = 15.0
+DEFAULT_MAX_RUNS = 100
+DEFAULT_MAX_EVENTS = 10_000
+
+HEARTBEAT = ": heartbeat\n\n"
+
+
+def format_event(data: str, event: str = "message", event_id: str | None = None) -> str:
+    """Frame a payload as a Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_event_id(event_id: str) -> tuple[str, int] | None:
+    """Split an event id of the form "<run_id>:<seq>", or return None."""
+    run_id, _, seq = event_id.rpartition(":")
+    if not run_id or not seq.isdigit():
+        return None
+    return run_id, int(seq)
+
+
+class RunLog:
+    """The framed events of one agent run, retained for replay.
+
+    The run appends events as they are produced, independently of the
+    clients, and any number of clients follow the log from a given position.
+    A client that reconnects with `Last-Event-ID` resumes right after the last
+    event it received, as long as the events that follow it are still retained.
+    A client that falls further behind gets a `reset` event instead of a
+    stream with a silent gap.
+    """
+
+    def __init__(self, run_id: str, max_events: int = DEFAULT_MAX_EVENTS) -> None:
+        """Initialize an empty log.
+
+        Args:
+            run_id: The run identifier, used as the prefix of event ids.
+            max_events: Maximum number of retained events; older ones are dropped.
+        """
+        self.run_id = run_id
+        self.done = False
+        self.finished_at: float | None = None
+        self._events: deque[tuple[int, str]] = deque(maxlen=max_events)
+        self._next_seq = 0
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, data: str, event: str = "message") -> None:
+        """Frame and append an event."""
+        seq = self._next_seq
+        self._next_seq += 1
+        self._events.append(
+            (seq, format_event(data, event, event_id=f"{self.run_id}:{seq}"))
+        )
+        self._notify()
+
+    def finish(self, error: str | None = None) -> None:
+        """Append the terminal event and mark the run as done."""
+        if error is None:
+            self.append("{}", event="end")
+        else:
+            self.append(error, event="error")
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def retains(self, after: int) -> bool:
+        """Return whether all the events after position `after` are retained."""
+        first = self._events[0][0] if self._events else self._next_seq
+        return after + 1 >= first
+
+    def _since(self, seq: int) -> list[tuple[int, str]]:
+        if not self._events:
+            return []
+        start = max(seq - self._events[0][0], 0)
+        return [self._events[i] for i in range(start, len(self._events))]
+
+    async def follow(
+        self,
+        after: int = -1,
+        window: float = DEFAULT_COALESCE_WINDOW,
+        max_bytes: int = DEFAULT_COALESCE_BYTES,
+        heartbeat: float = DEFAULT_HEARTBEAT_INTERVAL,
+    ) -> AsyncGenerator[str, None]:
+        """Yield the events after position `after`, coalesced into batches.
+
+        Once an event is available, more events are collected for up to
+        `window` seconds or `max_bytes` bytes and written at once, so a token
+        stream costs one write per window instead of one per token. While no
+        event arrives for `heartbeat` seconds, an SSE comment is written to
+        keep proxies and load balancers from closing the idle connection.
+
+        Args:
+            after: Sequence number of the last event already received.
+            window: Coalescing window, in seconds.
+            max_bytes: Batch size that triggers an early flush.
+            heartbeat: Seconds of inactivity between heartbeats.
+
+        Yields:
+            Batches of framed events, or heartbeats. If events the client has
+            not received yet were dropped, a `reset` event is yielded and the
+            stream ends, so the client restarts the run instead of missing
+            part of it.
+        """
+        seq = after + 1
+        while True:
+            if not self.retains(seq - 1):
+                yield format_event(
+                    f"Events after {self.run_id}:{seq - 1} are no longer retained.",
+                    event="reset",
+                )
+                return
+            changed = self._changed
+            batch = self._since(seq)
+            if not batch:
+                if self.done:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                continue
+            size = sum(len(frame) for _, frame in batch)
+            deadline = time.monotonic() + window
+            while size < max_bytes and not self.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if not self.retains(batch[-1][0]):
+                    break
+                more = self._since(batch[-1][0] + 1)
+                batch.extend(more)
+                size += sum(len(frame) for _, frame in more)
+            seq = batch[-1][0] + 1
+            yield "".join(frame for _, frame in batch)
+
+
+class ReplayBuffer:
+    """The logs of recent runs, by run id.
+
+    Finished runs are evicted first, least recently started first, once more
+    than `max_runs` logs are kept.
+    """
+
+    def __init__(
+        self, max_runs: int = DEFAULT_MAX_RUNS, max_events: int = DEFAULT_MAX_EVENTS
+    ) -> None:
+        """Initialize the buffer.
+
+        Args:
+            max_runs: Maximum number of retained run logs.
+            max_events: Maximum number of retained events per run.
+        """
+        self.max_runs = max_runs
+        self.max_events = max_events
+        self._runs: OrderedDict[str, RunLog] = OrderedDict()
+
+    def create(self, run_id: str) -> RunLog:
+        """Create the log of a new run.
+
+        Raises:
+            ValueError: If a log of the same run is already retained.
+        """
+        if run_id in self._runs:
+            raise ValueError(f"Run {run_id} already exists.")
+        log = RunLog(run_id, self.max_events)
+        self._runs[run_id] = log
+        while len(self._runs) > self.max_runs:
+            finished = next((k for k, v in self._runs.items() if v.done), None)
+            self._runs.pop(finished if finished is not None else next(iter(self._runs)))
+        return log
+
+    def get(self, run_id: str) -> RunLog | None:
+        """Return the log of a run, or None if unknown or evicted."""
+        return self._runs.get(run_id)
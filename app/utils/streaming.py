@@ -0,0 +1,182 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CONCURRENT_STREAMS = 200
+DEFAULT_BUFFER_SIZE = 256
+DEFAULT_STALL_TIMEOUT = 30.0
+
+
+class StreamStalled(Exception):
+    """Raised when a consumer stops reading for longer than the stall timeout."""
+
+
+class ConcurrencyLimiter:
+    """Caps the number of concurrently active streams.
+
+    Unlike a semaphore, acquiring never waits: callers over the limit are
+    rejected immediately so that they can be told to retry later.
+    """
+
+    def __init__(self, limit: int = DEFAULT_MAX_CONCURRENT_STREAMS) -> None:
+        """Initialize the limiter.
+
+        Args:
+            limit: Maximum number of concurrently active streams.
+        """
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        """Reserve a slot, returning False when the limit is reached."""
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        """Free a slot reserved with `try_acquire`."""
+        self.active = max(self.active - 1, 0)
+
+
+async def bounded_stream(
+    source: AsyncIterator[T],
+    maxsize: int = DEFAULT_BUFFER_SIZE,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> AsyncIterator[T]:
+    """Relay items from `source` through a bounded buffer.
+
+    The source is consumed by a background task that stops pulling once the
+    buffer is full. If the consumer does not make room within `stall_timeout`
+    seconds, the source is closed, which cancels the underlying agent run, and
+    `StreamStalled` is raised, so a slow or stuck client cannot pin an
+    unbounded backlog in memory.
+
+    Args:
+        source: The async iterator to relay.
+        maxsize: Maximum number of buffered items.
+        stall_timeout: Seconds to wait for the consumer when the buffer is full.
+
+    Yields:
+        The items of `source`, in order.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    done = object()
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await asyncio.wait_for(queue.put(item), timeout=stall_timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                "Stream consumer stalled for %ss, cancelling the run", stall_timeout
+            )
+            await _drain_and_put(queue, StreamStalled())
+        except Exception as e:
+            await _drain_and_put(queue, e)
+        else:
+            await queue.put(done)
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                with contextlib.suppress(Exception):
+                    await aclose()
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
+
+
+async def coalesce(
+    source: AsyncIterator[str], window: float, max_bytes: int
+) -> AsyncIterator[str]:
+    """Join the chunks of `source` into larger writes.
+
+    Once a chunk is available, more chunks are collected for up to `window`
+    seconds or `max_bytes` characters and yielded at once, so a compressed
+    token stream costs one flush per window instead of one per token.
+
+    Args:
+        source: The chunks to join.
+        window: Coalescing window, in seconds.
+        max_bytes: Batch size that triggers an early write.
+
+    Yields:
+        The joined chunks, in order.
+    """
+    iterator = aiter(source)
+    pending: asyncio.Future[str] | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            try:
+                chunk = await pending
+            except StopAsyncIteration:
+                return
+            pending = None
+            batch = [chunk]
+            size = len(chunk)
+            deadline = time.monotonic() + window
+            while size < max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                pending = asyncio.ensure_future(anext(iterator))
+                done, _ = await asyncio.wait({pending}, timeout=remaining)
+                if not done:
+                    break
+                pending = None
+                try:
+                    chunk = done.pop().result()
+                except StopAsyncIteration:
+                    yield "".join(batch)
+                    return
+                batch.append(chunk)
+                size += len(chunk)
+            yield "".join(batch)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+        aclose = getattr(source, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def _drain_and_put(queue: asyncio.Queue, item: object) -> None:
+    # Buffered items are dropped so that the terminal item always fits.
+    while queue.full():
+        queue.get_nowait()
+    await queue.put(item)
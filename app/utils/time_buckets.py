@@ -0,0 +1,44 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import math
+from datetime import datetime, timezone
+
+# Duration of the time buckets that traces and logs are aggregated and cached in.
+DEFAULT_BUCKET_SECONDS = 300
+
+
+def to_timestamp(value: str | datetime | float) -> float:
+    """Convert an ISO 8601 string, a datetime or a timestamp to a timestamp.
+
+    Naive datetimes and strings without an offset are taken as UTC.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def bucket_floor(timestamp: float, bucket_seconds: int) -> int:
+    """Return the start of the bucket holding a timestamp."""
+    return math.floor(timestamp / bucket_seconds) * bucket_seconds
+
+
+def bucket_ceil(timestamp: float, bucket_seconds: int) -> int:
+    """Return the first bucket boundary at or after a timestamp."""
+    return math.ceil(timestamp / bucket_seconds) * bucket_seconds
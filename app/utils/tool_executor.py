@@ -0,0 +1,261 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any
+
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+from langgraph.graph import MessagesState
+
+from app.utils.result_store import ResultStore
+
+DEFAULT_MAX_WORKERS = 32
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_QUEUE_TIMEOUT = 60.0
+
+
+class ParallelToolExecutor:
+    """Run the tool calls of one agent step concurrently.
+
+    All tool calls emitted in a single model message are submitted to a shared,
+    bounded thread pool, so a step costs the latency of its slowest tool rather
+    than the sum of all of them. The pool is shared by all concurrent streams,
+    so it should be sized for the expected number of concurrent steps times the
+    number of tool calls per step.
+
+    Each call has its own timeout, measured from the moment the call starts
+    running, so time spent waiting for a free worker does not count against it.
+    A call that fails or times out produces an error `ToolMessage` while the
+    results of the other calls are still returned to the model.
+
+    Timed out calls cannot be interrupted and keep running in the pool until
+    they return; their result is discarded. Since hung calls hold their
+    workers, waiting for a worker is bounded too: a call that does not start
+    within `queue_timeout` is dropped with a timeout `ToolMessage`, so a step
+    never takes longer than `queue_timeout` plus the timeout of its calls.
+
+    When a result store is given, large results are stored out of band and
+    replaced by a handle in the conversation.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        timeouts: dict[str, float] | None = None,
+        queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+        result_store: ResultStore | None = None,
+        inline_tools: Sequence[str] = (),
+    ) -> None:
+        """Initialize the executor.
+
+        Args:
+            tools: The tools that can be called.
+            max_workers: Maximum number of tool calls running at once, across
+                all concurrent streams.
+            timeout: Default timeout of a tool call, in seconds.
+            timeouts: Per-tool timeouts overriding the default, by tool name.
+            queue_timeout: Maximum time a call waits for a free worker, in
+                seconds.
+            result_store: Store of large results, results stay inline if None.
+            inline_tools: Names of tools whose results always stay inline.
+        """
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.queue_timeout = queue_timeout
+        self.result_store = result_store
+        self.inline_tools = set(inline_tools)
+        self._pool = ContextThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="tool"
+        )
+
+    def timeout_for(self, name: str) -> float:
+        """Return the timeout of a tool, in seconds."""
+        return self.timeouts.get(name, self.timeout)
+
+    def _run_one(self, call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return error_message(
+                call,
+                f"Error: {call['name']} is not a valid tool, try one of "
+                f"[{', '.join(self.tools_by_name)}].",
+            )
+        try:
+            message = tool.invoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            logging.warning("Tool %s failed: %s", call["name"], e)
+            return error_message(call, f"Error: {e!r}\n Please fix your mistakes.")
+        if (
+            self.result_store is not None
+            and call["name"] not in self.inline_tools
+            and isinstance(message, ToolMessage)
+            and isinstance(message.content, str)
+        ):
+            message.content = self.result_store.wrap(message.content, call["name"])
+        return message
+
+    def _timed_out(self, call: ToolCall) -> ToolMessage:
+        timeout = self.timeout_for(call["name"])
+        logging.warning("Tool %s timed out after %ss", call["name"], timeout)
+        return error_message(
+            call,
+            f"Error: {call['name']} timed out after {timeout:g} seconds. "
+            "Try again with a narrower query.",
+        )
+
+    def _not_started(self, call: ToolCall) -> ToolMessage:
+        logging.warning(
+            "Tool %s did not start within %ss", call["name"], self.queue_timeout
+        )
+        return error_message(
+            call,
+            f"Error: {call['name']} could not start within "
+            f"{self.queue_timeout:g} seconds because all tool workers are busy. "
+            "Try again later.",
+        )
+
+    def _submit(
+        self, call: ToolCall, config: RunnableConfig
+    ) -> tuple[Future, "_Started"]:
+        started = _Started()
+
+        def run() -> ToolMessage:
+            started.set()
+            return self._run_one(call, config)
+
+        return self._pool.submit(run), started
+
+    def _result(
+        self, call: ToolCall, future: Future, started: "_Started"
+    ) -> ToolMessage:
+        if not started.wait(self.queue_timeout) and future.cancel():
+            return self._not_started(call)
+        # The call may have begun running just as the queue timeout expired.
+        started.wait()
+        deadline = started.at + self.timeout_for(call["name"])
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            return self._timed_out(call)
+
+    async def _arun_one(self, call: ToolCall, config: RunnableConfig) -> ToolMessage:
+        loop = asyncio.get_running_loop()
+        started: asyncio.Future[float] = loop.create_future()
+
+        def run() -> ToolMessage:
+            loop.call_soon_threadsafe(_set_started, started, time.monotonic())
+            return self._run_one(call, config)
+
+        future = loop.run_in_executor(self._pool, run)
+        waiting: list[asyncio.Future[Any]] = [started, future]
+        await asyncio.wait(
+            waiting, timeout=self.queue_timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if future.done():
+            return future.result()
+        if not started.done():
+            # Cancelling the asyncio future cancels the queued pool task; a
+            # call that began running meanwhile still runs but is discarded.
+            future.cancel()
+            return self._not_started(call)
+        deadline = started.result() + self.timeout_for(call["name"])
+        try:
+            return await asyncio.wait_for(
+                future, timeout=max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.TimeoutError:
+            return self._timed_out(call)
+
+    def __call__(
+        self, state: MessagesState, config: RunnableConfig
+    ) -> dict[str, list[ToolMessage]]:
+        """Run the tool calls of the last message and return their results.
+
+        Args:
+            state: The graph state, whose last message holds the tool calls.
+            config: The runnable configuration, forwarded to each tool.
+
+        Returns:
+            The tool messages, in the order of the tool calls.
+        """
+        submitted = [(call, *self._submit(call, config)) for call in tool_calls(state)]
+        return {
+            "messages": [
+                self._result(call, future, started)
+                for call, future, started in submitted
+            ]
+        }
+
+    async def arun(
+        self, state: MessagesState, config: RunnableConfig
+    ) -> dict[str, list[ToolMessage]]:
+        """Async variant of `__call__`, used by `astream`.
+
+        The blocking tool implementations run on the same bounded pool, so the
+        event loop is never blocked and tool concurrency stays capped across
+        all concurrent requests.
+        """
+        messages = await asyncio.gather(
+            *(self._arun_one(call, config) for call in tool_calls(state))
+        )
+        return {"messages": list(messages)}
+
+
+class _Started:
+    """Records when a submitted tool call starts running."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self.at = 0.0
+
+    def set(self) -> None:
+        self.at = time.monotonic()
+        self._event.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until the call starts, return whether it started in time.
+
+        Once it returns True, `at` holds the monotonic start time.
+        """
+        return self._event.wait(timeout)
+
+
+def _set_started(started: "asyncio.Future[float]", at: float) -> None:
+    if not started.done():
+        started.set_result(at)
+
+
+def tool_calls(state: MessagesState) -> list[ToolCall]:
+    """Return the tool calls of the last message of the state."""
+    message = state["messages"][-1]
+    return list(message.tool_calls) if isinstance(message, AIMessage) else []
+
+
+def error_message(call: ToolCall, content: Any) -> ToolMessage:
+    """Build the error result of a tool call."""
+    return ToolMessage(
+        content=content, name=call["name"], tool_call_id=call["id"], status="error"
+    )
@@ -0,0 +1,209 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime
+from itertools import islice
+from typing import Any
+
+from app.utils.log_templates import mine_templates
+
+DEFAULT_TOP_N = 10
+SLOWEST_SPANS_PER_TRACE = 3
+ERROR_MESSAGES_PER_TRACE = 3
+# Span label naming the service that emitted a span.
+DEFAULT_SERVICE_LABEL = "service.name"
+
+_ERROR_MESSAGE_LABELS = (
+    "/error/message",
+    "exception.message",
+    "otel.status_description",
+    "error.message",
+)
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _duration_ms(start: datetime | None, end: datetime | None) -> float:
+    if start is None or end is None:
+        return 0.0
+    return round((end - start).total_seconds() * 1000, 3)
+
+
+def _is_error_span(labels: dict[str, str]) -> bool:
+    status = labels.get("/http/status_code") or labels.get("http.status_code")
+    if status and status.isdigit() and int(status) >= 500:
+        return True
+    if labels.get("otel.status_code", "").upper() == "ERROR":
+        return True
+    return any(
+        ("error" in key.lower() or "exception" in key.lower())
+        and value
+        and value.lower() != "false"
+        for key, value in labels.items()
+    )
+
+
+def _error_message(name: str, labels: dict[str, str]) -> str:
+    for key in _ERROR_MESSAGE_LABELS:
+        if labels.get(key):
+            return f"{name}: {labels[key]}"
+    status = labels.get("/http/status_code") or labels.get("http.status_code")
+    return f"{name}: HTTP {status}" if status else name
+
+
+def trace_record(trace: Any) -> dict[str, Any]:
+    """Reduce a Cloud Trace `Trace` to a compact record.
+
+    Args:
+        trace: A `google.cloud.trace_v1.Trace`, listed with the COMPLETE view.
+
+    Returns:
+        The trace id, root span name, start time, latency, span count, error
+        flag and messages, and the slowest spans of the trace.
+    """
+    spans = list(trace.spans)
+    root = next((span for span in spans if not span.parent_span_id), None)
+    if root is None and spans:
+        root = min(
+            spans,
+            key=lambda span: (
+                span.start_time.timestamp() if span.start_time else math.inf
+            ),
+        )
+
+    durations = []
+    error_messages = []
+    for span in spans:
+        labels = dict(span.labels)
+        durations.append((_duration_ms(span.start_time, span.end_time), span.name))
+        if _is_error_span(labels):
+            error_messages.append(_error_message(span.name, labels))
+    durations.sort(reverse=True)
+
+    start = root.start_time if root is not None else None
+    latency = (
+        _duration_ms(root.start_time, root.end_time)
+        if root is not None
+        else (durations[0][0] if durations else 0.0)
+    )
+    return {
+        "trace_id": trace.trace_id,
+        "root_span": root.name if root is not None else None,
+        "start_time": start.isoformat() if start is not None else None,
+        "latency_ms": latency,
+        "span_count": len(spans),
+        "error": bool(error_messages),
+        "error_messages": error_messages[:ERROR_MESSAGES_PER_TRACE],
+        "slowest_spans": [
+            {"name": name, "duration_ms": duration}
+            for duration, name in durations[:SLOWEST_SPANS_PER_TRACE]
+        ],
+    }
+
+
+def summarize_trace_records(
+    records: Iterable[dict[str, Any]], top_n: int = DEFAULT_TOP_N
+) -> dict[str, Any]:
+    """Aggregate trace records into a bounded-size ranked summary.
+
+    Args:
+        records: Records produced by `trace_record`.
+        top_n: Number of slowest and erroring traces to list.
+
+    Returns:
+        Latency percentiles per root span name, the slowest traces, the
+        erroring traces and the error messages grouped into templates.
+    """
+    records = list(records)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    error_messages: list[dict[str, Any]] = []
+    for record in records:
+        name = record["root_span"] or "<unknown>"
+        latencies[name].append(record["latency_ms"])
+        if record["error"]:
+            errors[name] += 1
+            error_messages.extend(
+                {"message": message, "timestamp": record["start_time"]}
+                for message in record["error_messages"]
+            )
+
+    by_root_span: list[dict[str, Any]] = []
+    for name, values in latencies.items():
+        values.sort()
+        by_root_span.append(
+            {
+                "root_span": name,
+                "count": len(values),
+                "errors": errors[name],
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1],
+            }
+        )
+    by_root_span.sort(key=lambda row: -row["count"])
+
+    error_traces = [record for record in records if record["error"]]
+    error_traces.sort(key=lambda record: record["start_time"] or "", reverse=True)
+    slowest = sorted(records, key=lambda record: -record["latency_ms"])
+    return {
+        "trace_count": len(records),
+        "error_trace_count": len(error_traces),
+        "by_root_span": by_root_span[:top_n],
+        "slowest_traces": slowest[:top_n],
+        "error_traces": error_traces[:top_n],
+        "error_templates": mine_templates(error_messages, top_n=top_n),
+    }
+
+
+def trace_filter(service: str | None, label: str = DEFAULT_SERVICE_LABEL) -> str:
+    """Build a Cloud Trace filter selecting the traces of one service.
+
+    Args:
+        service: The service name; all the traces of the project if None.
+        label: The span label holding the service name; no filter if empty.
+
+    Returns:
+        The filter, empty to select every trace.
+    """
+    if not service or not label:
+        return ""
+    # A leading "+" requires an exact match instead of a prefix match.
+    return f"+{label}:{service}"
+
+
+def iter_trace_records(
+    traces: Iterable[Any], limit: int | None = None
+) -> Iterable[dict[str, Any]]:
+    """Lazily reduce traces from a (paged) iterable to compact records.
+
+    Args:
+        traces: Traces, typically the pager returned by `list_traces`.
+        limit: Stop after this many traces, so later pages are never fetched.
+
+    Yields:
+        Records produced by `trace_record`.
+    """
+    for trace in islice(traces, limit):
+        yield trace_record(trace)
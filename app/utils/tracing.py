@@ -12,17 +12,127 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import json
 import logging
+import threading
+import time
+from collections import OrderedDict
 from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
+from google.api_core import exceptions as api_exceptions
 from google.cloud import logging as google_cloud_logging
 from google.cloud import storage
+from opentelemetry import trace as trace_api
 from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+from opentelemetry.sdk import util
+from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import ReadableSpan
 from opentelemetry.sdk.trace.export import SpanExportResult
 
+from app.utils.clients import get_logging_client, get_storage_client
+from app.utils.log_batcher import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_LATENCY,
+    DEFAULT_MAX_QUEUE_SIZE,
+    LogBatcher,
+    json_size,
+)
+from app.utils.span_spool import SpanSpool, SpoolShipper
+
+# Cloud Logging entries are limited to 256 KB; keep a margin for the envelope.
+MAX_ATTRIBUTES_BYTES = 255 * 1024
+DEFAULT_BUCKET_CHECK_INTERVAL = 300.0
+DEFAULT_UPLOAD_WORKERS = 4
+# Seconds an export waits for the upload of oversized attributes.
+DEFAULT_UPLOAD_TIMEOUT = 10.0
+# Number of content hashes remembered to skip uploading identical payloads.
+UPLOADED_CACHE_SIZE = 10_000
+# Characters kept from an oversized attribute that cannot be offloaded.
+TRUNCATED_PREVIEW_CHARS = 1024
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    # Requests rejected as invalid fail the same way when retried.
+    return isinstance(error, api_exceptions.BadRequest)
+
+
+def _attributes(attributes: Any) -> dict[str, Any]:
+    # Sequence values are immutable tuples in spans; log entries need lists.
+    return {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in (attributes or {}).items()
+    }
+
+
+def _context(context: trace_api.SpanContext) -> dict[str, str]:
+    return {
+        "trace_id": f"0x{trace_api.format_trace_id(context.trace_id)}",
+        "span_id": f"0x{trace_api.format_span_id(context.span_id)}",
+        "trace_state": repr(context.trace_state),
+    }
+
+
+def _resource(resource: Resource) -> dict[str, Any]:
+    return {
+        "attributes": _attributes(resource.attributes),
+        "schema_url": resource.schema_url,
+    }
+
+
+def span_to_dict(
+    span: ReadableSpan, resource: dict[str, Any] | None = None
+) -> tuple[dict[str, Any], dict[str, int]]:
+    """
+    Build the log payload of a span directly from its fields.
+
+    The payload has the same shape as `json.loads(span.to_json())`, without
+    encoding and decoding the span. The estimated size of each attribute is
+    computed along the way.
+
+    :param span: The span to convert
+    :param resource: The converted span resource, to reuse it across spans
+    :return: The span payload and the estimated size of each attribute
+    """
+    status = {"status_code": span.status.status_code.name}
+    if span.status.description:
+        status["description"] = span.status.description
+    attributes = _attributes(span.attributes)
+    sizes = {key: len(key) + 4 + json_size(value) for key, value in attributes.items()}
+    span_dict = {
+        "name": span.name,
+        "context": _context(span.context) if span.context else None,
+        "kind": str(span.kind),
+        "parent_id": (
+            f"0x{trace_api.format_span_id(span.parent.span_id)}"
+            if span.parent is not None
+            else None
+        ),
+        "start_time": util.ns_to_iso_str(span.start_time) if span.start_time else None,
+        "end_time": util.ns_to_iso_str(span.end_time) if span.end_time else None,
+        "status": status,
+        "attributes": attributes,
+        "events": [
+            {
+                "name": event.name,
+                "timestamp": util.ns_to_iso_str(event.timestamp),
+                "attributes": _attributes(event.attributes),
+            }
+            for event in span.events
+        ],
+        "links": [
+            {
+                "context": _context(link.context),
+                "attributes": _attributes(link.attributes),
+            }
+            for link in span.links
+        ],
+        "resource": resource if resource is not None else _resource(span.resource),
+    }
+    return span_dict, sizes
+
 
 class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
     """
@@ -31,6 +141,17 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
 
     This class helps bypass the 256 character limit of Cloud Trace for attribute values
     by leveraging Cloud Logging (which has a 256KB limit) and Cloud Storage for larger payloads.
+
+    Span log entries are queued and written in batches by a background thread, so
+    exporting never waits on a Cloud Logging round-trip per span. Oversized
+    attributes are uploaded to GCS by a thread pool, under a name derived from their
+    content, so identical payloads (e.g. a repeated system prompt) are uploaded once.
+    Exporting does not wait for these uploads either: the log entry of such a span is
+    queued by the upload thread once the upload finished.
+
+    When a spool directory is given, span log entries are first appended to an
+    on-disk spool and shipped from it with retries, so entries survive a Cloud
+    Logging outage or a restart of the process instead of being dropped.
     """
 
     def __init__(
@@ -39,26 +160,66 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         storage_client: storage.Client | None = None,
         bucket_name: str | None = None,
         debug: bool = False,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_batch_latency: float = DEFAULT_MAX_LATENCY,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        bucket_check_interval: float = DEFAULT_BUCKET_CHECK_INTERVAL,
+        upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+        upload_timeout: float = DEFAULT_UPLOAD_TIMEOUT,
+        spool_dir: str | None = None,
         **kwargs: Any,
     ) -> None:
         """
         Initialize the exporter with Google Cloud clients and configuration.
 
-        :param logging_client: Google Cloud Logging client
-        :param storage_client: Google Cloud Storage client
+        :param logging_client: Google Cloud Logging client, defaults to the shared client
+        :param storage_client: Google Cloud Storage client, defaults to the shared client
         :param bucket_name: Name of the GCS bucket to store large payloads
         :param debug: Enable debug mode for additional logging
+        :param max_batch_size: Maximum number of span log entries per write
+        :param max_batch_latency: Maximum seconds a span log entry waits to be written
+        :param max_queue_size: Maximum number of queued entries, more are dropped
+        :param bucket_check_interval: Seconds during which the bucket check is trusted
+        :param upload_workers: Number of threads uploading attributes to GCS
+        :param upload_timeout: Timeout of an upload, after which attributes are truncated
+        :param spool_dir: Directory of the on-disk span spool, disabled when None
         :param kwargs: Additional arguments to pass to the parent class
         """
         super().__init__(**kwargs)
         self.debug = debug
-        self.logging_client = logging_client or google_cloud_logging.Client(
-            project=self.project_id
-        )
+        self.logging_client = logging_client or get_logging_client(self.project_id)
         self.logger = self.logging_client.logger(__name__)
-        self.storage_client = storage_client or storage.Client(project=self.project_id)
+        self.storage_client = storage_client or get_storage_client(self.project_id)
         self.bucket_name = bucket_name or f"{self.project_id}-logs-data"
         self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.batcher = LogBatcher(
+            self.logger,
+            max_batch_size=max_batch_size,
+            max_latency=max_batch_latency,
+            max_queue_size=max_queue_size,
+        )
+        self.spool: SpanSpool | None = None
+        self.shipper: SpoolShipper | None = None
+        if spool_dir:
+            self.spool = SpanSpool(spool_dir)
+            self.shipper = SpoolShipper(
+                self.spool,
+                self.batcher.commit,
+                batch_size=max_batch_size,
+                is_permanent=_is_permanent_error,
+            )
+        self.bucket_check_interval = bucket_check_interval
+        self._bucket_exists: bool | None = None
+        self._bucket_checked_at = 0.0
+        self.upload_timeout = upload_timeout
+        self._uploads = ThreadPoolExecutor(
+            max_workers=upload_workers, thread_name_prefix="span-upload"
+        )
+        self._uploaded: OrderedDict[str, Future] = OrderedDict()
+        self._uploads_lock = threading.Lock()
+        # Spans whose log entry waits for an upload, to let force_flush wait on them.
+        self._waiting_spans = 0
+        self._waiting_spans_done = threading.Condition()
 
     def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
         """
@@ -67,77 +228,246 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         :param spans: A sequence of spans to export
         :return: The result of the export operation
         """
+        resources: dict[int, dict[str, Any]] = {}
+        span_dicts = []
         for span in spans:
             span_context = span.get_span_context()
+            if span_context is None:
+                # Without a context, the span cannot be attached to a trace.
+                logging.debug("Skipping span %s without a context", span.name)
+                continue
             trace_id = format(span_context.trace_id, "x")
             span_id = format(span_context.span_id, "x")
-            span_dict = json.loads(span.to_json())
+            # Spans of a process share their resource; convert it once per batch.
+            resource = resources.get(id(span.resource))
+            if resource is None:
+                resource = resources[id(span.resource)] = _resource(span.resource)
+            span_dict, attribute_sizes = span_to_dict(span, resource)
 
             span_dict["trace"] = f"projects/{self.project_id}/traces/{trace_id}"
             span_dict["span_id"] = span_id
 
-            span_dict = self._process_large_attributes(
-                span_dict=span_dict, span_id=span_id
+            processed = self._process_large_attributes(
+                span_dict=span_dict, span_id=span_id, attribute_sizes=attribute_sizes
             )
+            if processed.done():
+                span_dicts.append(processed.result())
+            else:
+                # Queued by the upload thread, so that export never waits on GCS.
+                with self._waiting_spans_done:
+                    self._waiting_spans += 1
+                processed.add_done_callback(self._emit_uploaded)
 
-            if self.debug:
-                print(span_dict)
-
-            # Log the span data to Google Cloud Logging
-            self.logger.log_struct(span_dict, severity="INFO")
+        self._emit(span_dicts)
 
         # Export spans to Google Cloud Trace using the parent class method
         return super().export(spans)
 
-    def store_in_gcs(self, content: str, span_id: str) -> str:
+    def _emit(self, span_dicts: list[dict]) -> None:
+        """
+        Queue span data for a batched write to Google Cloud Logging.
+
+        :param span_dicts: The span data dictionaries
+        """
+        if self.debug:
+            for span_dict in span_dicts:
+                print(span_dict)
+        if self.spool is not None and self.shipper is not None:
+            self.spool.append(span_dicts)
+            self.shipper.notify()
+        else:
+            for span_dict in span_dicts:
+                self.batcher.submit(span_dict)
+
+    def _emit_uploaded(self, processed: Future) -> None:
+        try:
+            self._emit([processed.result()])
+        except Exception as e:
+            logging.warning(f"Unable to queue span log entry: {e}")
+        finally:
+            with self._waiting_spans_done:
+                self._waiting_spans -= 1
+                self._waiting_spans_done.notify_all()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """
+        Finish the pending attribute uploads and write the queued span log entries.
+
+        :param timeout_millis: Maximum time to wait for the pending uploads
+        :return: Whether all uploads finished and all queued entries were written
+        """
+        with self._waiting_spans_done:
+            uploaded = self._waiting_spans_done.wait_for(
+                lambda: self._waiting_spans == 0, timeout=timeout_millis / 1000
+            )
+        shipped = self.shipper.flush() if self.shipper is not None else True
+        return self.batcher.force_flush() and shipped and uploaded
+
+    def shutdown(self) -> None:
+        """Finish the pending uploads, write the queued entries and stop."""
+        self._uploads.shutdown(wait=True)
+        if self.shipper is not None and self.spool is not None:
+            # Unshipped entries stay in the spool and are replayed on restart.
+            self.shipper.shutdown()
+            self.shipper.flush()
+            self.spool.close()
+        self.batcher.shutdown()
+        super().shutdown()
+
+    def _bucket_available(self) -> bool:
+        """Check that the bucket exists, trusting the result for a while."""
+        now = time.monotonic()
+        if (
+            self._bucket_exists is None
+            or now - self._bucket_checked_at >= self.bucket_check_interval
+        ):
+            try:
+                self._bucket_exists = bool(self.bucket.exists())
+            except Exception as e:
+                logging.warning(f"Unable to check bucket {self.bucket_name}: {e}")
+                self._bucket_exists = False
+            self._bucket_checked_at = now
+            if not self._bucket_exists:
+                logging.warning(
+                    f"Bucket {self.bucket_name} not found. "
+                    "Unable to store span attributes in GCS."
+                )
+        return self._bucket_exists
+
+    def store_in_gcs(self, content: str, blob_name: str) -> str:
         """
-        Initiate storing large content in Google Cloud Storage/
+        Store content in Google Cloud Storage.
+
+        Blobs are named after their content, so an existing blob is never
+        overwritten.
 
         :param content: The content to store
-        :param span_id: The ID of the span
-        :return: The  GCS URI of the stored content
+        :param blob_name: The name of the blob
+        :return: The GCS URI of the stored content
         """
-        if not self.storage_client.bucket(self.bucket_name).exists():
+        blob = self.bucket.blob(blob_name)
+        try:
+            blob.upload_from_string(
+                content,
+                "application/json",
+                if_generation_match=0,
+                timeout=self.upload_timeout,
+            )
+        except api_exceptions.PreconditionFailed:
+            pass  # Already uploaded by a previous process.
+        return f"gs://{self.bucket_name}/{blob_name}"
+
+    def _upload_done(self, digest: str, future: Future) -> None:
+        if future.exception() is not None:
             logging.warning(
-                f"Bucket {self.bucket_name} not found. "
-                "Unable to store span attributes in GCS."
+                f"Failed to store span attribute {digest} in GCS: {future.exception()}"
             )
-            return "GCS bucket not found"
+            with self._uploads_lock:
+                self._uploaded.pop(digest, None)
 
-        blob_name = f"spans/{span_id}.json"
-        blob = self.bucket.blob(blob_name)
+    def _offload(self, value: Any) -> tuple[str, str, Future]:
+        """
+        Upload attribute values to GCS, unless identical content was uploaded before.
 
-        blob.upload_from_string(content, "application/json")
-        return f"gs://{self.bucket_name}/{blob_name}"
+        :param value: The attribute values, by key
+        :return: The GCS URI and the browser URL the values are stored at, and the
+            upload
+        """
+        content = json.dumps(value)
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        blob_name = f"spans/attributes/{digest}.json"
+        with self._uploads_lock:
+            future = self._uploaded.get(digest)
+            if future is not None:
+                self._uploaded.move_to_end(digest)
+                submitted = False
+            else:
+                future = self._uploads.submit(self.store_in_gcs, content, blob_name)
+                self._uploaded[digest] = future
+                while len(self._uploaded) > UPLOADED_CACHE_SIZE:
+                    self._uploaded.popitem(last=False)
+                submitted = True
+        if submitted:
+            future.add_done_callback(lambda f: self._upload_done(digest, f))
+        return (
+            f"gs://{self.bucket_name}/{blob_name}",
+            f"https://storage.mtls.cloud.google.com/{self.bucket_name}/{blob_name}",
+            future,
+        )
 
-    def _process_large_attributes(self, span_dict: dict, span_id: str) -> dict:
+    def _process_large_attributes(
+        self,
+        span_dict: dict,
+        span_id: str,
+        attribute_sizes: dict[str, int] | None = None,
+    ) -> Future:
         """
         Process large attribute values by storing them in GCS if they exceed the size
         limit of Google Cloud Logging.
 
+        Only the largest attributes are offloaded, until the remaining ones fit. They
+        are stored together as one JSON object, whose location is recorded in the
+        `uri_payload` and `url_payload` attributes once the upload succeeded. When the
+        bucket is unavailable or the upload fails, they are truncated instead.
+
         :param span_dict: The span data dictionary
-        :param trace_id: The trace ID
         :param span_id: The span ID
-        :return: The updated span dictionary
+        :param attribute_sizes: Estimated size of each attribute, computed if None
+        :return: The updated span dictionary, resolved once the upload finished
         """
+        processed: Future = Future()
         attributes = span_dict["attributes"]
-        if len(json.dumps(attributes).encode()) > 255 * 1024:  # 250 KB
-            # Separate large payload from other attributes
-            attributes_payload = dict(attributes.items())
-            attributes_retain = dict(attributes.items())
-
-            # Store large payload in GCS
-            gcs_uri = self.store_in_gcs(json.dumps(attributes_payload), span_id)
-            attributes_retain["uri_payload"] = gcs_uri
-            attributes_retain["url_payload"] = (
-                f"https://storage.mtls.cloud.google.com/"
-                f"{self.bucket_name}/spans/{span_id}.json"
-            )
+        if attribute_sizes is None:
+            attribute_sizes = {
+                key: len(key) + 4 + json_size(value)
+                for key, value in attributes.items()
+            }
+        total = sum(attribute_sizes.values())
+        if total <= MAX_ATTRIBUTES_BYTES:
+            processed.set_result(span_dict)
+            return processed
+
+        attributes_retain = dict(attributes)
+        offloaded: dict[str, Any] = {}
+        for key in sorted(
+            attribute_sizes, key=attribute_sizes.__getitem__, reverse=True
+        ):
+            if total <= MAX_ATTRIBUTES_BYTES:
+                break
+            offloaded[key] = attributes_retain.pop(key)
+            total -= attribute_sizes[key]
 
+        def finish(uri: str | None = None, url: str | None = None) -> None:
+            if uri is not None and url is not None:
+                attributes_retain["uri_payload"] = uri
+                attributes_retain["url_payload"] = url
+            else:
+                for key, value in offloaded.items():
+                    preview = str(value)[:TRUNCATED_PREVIEW_CHARS] + "... [truncated]"
+                    attributes_retain[key] = preview
             span_dict["attributes"] = attributes_retain
             logging.info(
-                "Length of payload span above 250 KB, storing attributes in GCS "
+                f"Length of span {span_id} payload above 250 KB, "
+                f"{'moved' if uri else 'truncated'} attributes {sorted(offloaded)} "
                 "to avoid large log entry errors"
             )
+            processed.set_result(span_dict)
+
+        if not self._bucket_available():
+            finish()
+            return processed
+
+        uri, url, upload = self._offload(offloaded)
+
+        def uploaded(upload: Future) -> None:
+            if upload.exception() is not None:
+                logging.warning(
+                    f"Unable to store attributes of span {span_id}: "
+                    f"{upload.exception()}"
+                )
+                finish()
+            else:
+                finish(uri, url)
 
-        return span_dict
+        upload.add_done_callback(uploaded)
+        return processed
@@ -23,6 +23,7 @@ from typing import (
 from langchain_core.load.serializable import Serializable
 from langchain_core.messages import (
     AIMessage,
+    BaseMessage,
     HumanMessage,
     ToolMessage,
 )
@@ -32,6 +33,18 @@ from pydantic import (
     Field,
 )
 
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    HAS_ORJSON = False
+
+WireFormat = Literal["legacy", "compact"]
+StreamFormat = Literal["ndjson", "sse"]
+# Stream metadata keys kept by the compact wire format.
+COMPACT_METADATA_KEYS = {"langgraph_node": "node", "langgraph_step": "step"}
+
 
 class InputChat(BaseModel):
     """Represents the input for a chat session."""
@@ -84,17 +97,77 @@ def default_serialization(obj: Any) -> Any:
         return obj.to_json()
 
 
-def dumps(obj: Any) -> str:
+def message_to_wire(message: BaseMessage) -> dict[str, Any]:
+    """
+    Convert a message to the compact wire schema.
+
+    Only the fields a client renders are kept, and empty ones are omitted:
+    `type`, `id`, `content`, `tool_calls`, `tool_call_id`, `name` and `status`.
+    """
+    wire: dict[str, Any] = {"type": message.type, "content": message.content}
+    if message.id:
+        wire["id"] = message.id
+    if isinstance(message, AIMessage) and message.tool_calls:
+        wire["tool_calls"] = message.tool_calls
+    if isinstance(message, ToolMessage):
+        wire["tool_call_id"] = message.tool_call_id
+        wire["status"] = message.status
+    if message.name:
+        wire["name"] = message.name
+    return wire
+
+
+def _compact(obj: Any) -> Any:
+    if isinstance(obj, BaseMessage):
+        return message_to_wire(obj)
+    return default_serialization(obj)
+
+
+def _json_dumps(obj: Any, default: Any) -> str:
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(
+                obj, default=default, option=orjson.OPT_NON_STR_KEYS
+            ).decode()
+        except TypeError:
+            # Values orjson rejects, like integers over 64 bits, take the slow path.
+            pass
+    return json.dumps(obj, default=default)
+
+
+def dumps(obj: Any, wire_format: WireFormat = "legacy") -> str:
     """
     Serialize an object to a JSON string.
 
     For LangChain objects (BaseModel instances), it converts them to
     dictionaries before serialization.
 
+    With the "compact" wire format, streamed `(message, metadata)` tuples are
+    encoded as `[message, {"node", "step"}]`, with the message in the compact
+    schema of `message_to_wire`, instead of the verbose constructor envelope.
+
     Args:
         obj: The object to serialize
+        wire_format: "legacy" (constructor envelopes) or "compact"
 
     Returns:
         JSON string representation of the object
     """
-    return json.dumps(obj, default=default_serialization)
+    if wire_format == "legacy":
+        return json.dumps(obj, default=default_serialization)
+    if (
+        isinstance(obj, tuple)
+        and len(obj) == 2
+        and isinstance(obj[0], BaseMessage)
+        and isinstance(obj[1], dict)
+    ):
+        message, metadata = obj
+        obj = (
+            message_to_wire(message),
+            {
+                short: metadata[key]
+                for key, short in COMPACT_METADATA_KEYS.items()
+                if key in metadata
+            },
+        )
+    return _json_dumps(obj, default=_compact)
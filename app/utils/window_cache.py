@@ -0,0 +1,200 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Generic, TypeVar
+
+from app.utils.time_buckets import (
+    DEFAULT_BUCKET_SECONDS,
+    bucket_ceil,
+    bucket_floor,
+    to_timestamp,
+)
+
+T = TypeVar("T")
+
+DEFAULT_OPEN_TTL = 60.0
+# Data of a bucket may still be ingested for a while after the bucket ends.
+DEFAULT_SETTLE_TIME = 120.0
+# Items are compact trace records or log entries. The budget holds several
+# full-size fetches (e.g. a 20k entry log summary), so that storing one fetch
+# does not evict the buckets another query is about to reuse.
+DEFAULT_MAX_ITEMS = 100_000
+
+
+@dataclass
+class _Bucket(Generic[T]):
+    items: list[T]
+    fetched_at: float
+    final: bool
+
+
+class WindowCache:
+    """Caches the items of time windows in fixed, aligned time buckets.
+
+    A query is split into buckets; cached buckets are served from memory and
+    each contiguous run of missing buckets is fetched with a single call, so
+    overlapping or narrower windows only fetch what was never fetched. A bucket
+    fetched before it settled (the open, most recent buckets) expires after
+    `open_ttl` seconds; settled buckets never expire. Each item belongs to the
+    bucket of its timestamp only, so an item a fetch returns for a neighbouring
+    range is left to that range's bucket and never returned twice. Fetches
+    that were truncated are returned but not cached, so they are fetched again
+    on the next query. The least recently used buckets are evicted beyond
+    `max_items` cached items; a fetch holding more items than that is returned
+    but not cached, rather than evicting its own first buckets.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: int = DEFAULT_BUCKET_SECONDS,
+        open_ttl: float = DEFAULT_OPEN_TTL,
+        settle_time: float = DEFAULT_SETTLE_TIME,
+        max_items: int = DEFAULT_MAX_ITEMS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            bucket_seconds: Duration of a time bucket.
+            open_ttl: Seconds during which an unsettled bucket is reused.
+            settle_time: Seconds after its end after which a bucket is final.
+            max_items: Maximum number of cached items.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.open_ttl = open_ttl
+        self.settle_time = settle_time
+        self.max_items = max_items
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._buckets: OrderedDict[tuple[Hashable, int], _Bucket] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable, bucket: int, now: float) -> _Bucket | None:
+        entry = self._buckets.get((key, bucket))
+        if entry is None:
+            return None
+        if not entry.final and now - entry.fetched_at >= self.open_ttl:
+            self._size -= len(entry.items)
+            del self._buckets[(key, bucket)]
+            return None
+        self._buckets.move_to_end((key, bucket))
+        return entry
+
+    def _store(self, key: Hashable, bucket: int, entry: _Bucket) -> None:
+        previous = self._buckets.pop((key, bucket), None)
+        if previous is not None:
+            self._size -= len(previous.items)
+        self._buckets[(key, bucket)] = entry
+        self._size += len(entry.items)
+
+    def _evict(self) -> None:
+        while self._size > self.max_items and self._buckets:
+            _, evicted = self._buckets.popitem(last=False)
+            self._size -= len(evicted.items)
+
+    def get(
+        self,
+        key: Hashable,
+        start: str | datetime | float,
+        end: str | datetime | float,
+        fetch: Callable[[datetime, datetime], tuple[list[T], bool]],
+        timestamp: Callable[[T], Any],
+    ) -> tuple[list[T], bool]:
+        """Return the items of a time window, fetching only the missing buckets.
+
+        Args:
+            key: Identifies the query, e.g. the service and the filter.
+            start: Start of the window (inclusive).
+            end: End of the window (exclusive).
+            fetch: Returns the items of a time range and whether they are all
+                there (False when the fetch was truncated).
+            timestamp: Returns the time of an item, or None if unknown.
+
+        Returns:
+            The items of the window, bucket by bucket, and whether they are
+            complete. When a fetch was truncated, the window holds the cached
+            buckets plus the items that fetch did return.
+        """
+        begin, finish = to_timestamp(start), to_timestamp(end)
+        size = self.bucket_seconds
+        buckets = range(bucket_floor(begin, size), bucket_ceil(finish, size), size)
+        now = self.clock()
+        with self._lock:
+            cached = {
+                bucket: entry.items
+                for bucket in buckets
+                if (entry := self._lookup(key, bucket, now)) is not None
+            }
+            self.hits += len(cached)
+
+        items_by_bucket: dict[int, list[T]] = dict(cached)
+        complete = True
+        for run_start, run_end in _runs([b for b in buckets if b not in cached], size):
+            with self._lock:
+                self.misses += (run_end - run_start) // size
+            items, run_complete = fetch(
+                datetime.fromtimestamp(run_start, tz=timezone.utc),
+                datetime.fromtimestamp(run_end, tz=timezone.utc),
+            )
+            complete = complete and run_complete
+            fetched: dict[int, list[T]] = {
+                bucket: [] for bucket in range(run_start, run_end, size)
+            }
+            for item in items:
+                value = timestamp(item)
+                bucket = run_start
+                if value is not None:
+                    bucket = bucket_floor(to_timestamp(value), size)
+                # Items of other buckets, e.g. traces that start before the
+                # run but overlap it, are cached with their own bucket.
+                if bucket in fetched:
+                    fetched[bucket].append(item)
+            items_by_bucket.update(fetched)
+            # The run is stored before evicting, so the least recently used
+            # buckets of other queries go first.
+            stored = sum(len(bucket_items) for bucket_items in fetched.values())
+            if run_complete and stored <= self.max_items:
+                with self._lock:
+                    for bucket, bucket_items in fetched.items():
+                        final = now >= bucket + size + self.settle_time
+                        self._store(key, bucket, _Bucket(bucket_items, now, final))
+                    self._evict()
+
+        result = []
+        for bucket in buckets:
+            for item in items_by_bucket[bucket]:
+                value = timestamp(item)
+                if value is None or begin <= to_timestamp(value) < finish:
+                    result.append(item)
+        return result, complete
+
+
+def _runs(buckets: list[int], size: int) -> list[tuple[int, int]]:
+    """Group sorted bucket starts into contiguous (start, end) ranges."""
+    runs: list[tuple[int, int]] = []
+    for bucket in buckets:
+        if runs and runs[-1][1] == bucket:
+            runs[-1] = (runs[-1][0], bucket + size)
+        else:
+            runs.append((bucket, bucket + size))
+    return runs
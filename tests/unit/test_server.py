@@ -16,14 +16,15 @@ import importlib.util
 import json
 import logging
 import os
-from collections.abc import Generator
+from collections.abc import AsyncIterator, Generator
+from typing import Any
 from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 from google.auth import exceptions as google_auth_exceptions
 from google.auth.credentials import Credentials
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage
 
 from app.utils.typing import InputChat
 
@@ -124,8 +125,12 @@ async def test_stream_chat_events() -> None:
 
     mock_events = [{"content": "Mocked response"}, {"content": "Additional response"}]
 
+    async def mock_astream(*args: Any, **kwargs: Any) -> AsyncIterator[dict]:
+        for event in mock_events:
+            yield event
+
     with patch("app.server.agent") as mock_agent:
-        mock_agent.stream.return_value = mock_events
+        mock_agent.astream.side_effect = mock_astream
 
         client = TestClient(app)
         response = client.post("stream_messages", json=input_data)
@@ -140,3 +145,94 @@ async def test_stream_chat_events() -> None:
         assert len(events) == 2
         assert events[0]["content"] == "Mocked response"
         assert events[1]["content"] == "Additional response"
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_events_compact_format() -> None:
+    """
+    Test that the compact wire format is used when requested.
+    """
+    from app.server import app
+
+    input_data = {"input": {"messages": [{"type": "human", "content": "Hello"}]}}
+
+    async def mock_astream(*args: Any, **kwargs: Any) -> AsyncIterator[tuple]:
+        yield AIMessageChunk(content="Hi", id="run-1"), {"langgraph_node": "agent"}
+
+    with (
+        patch("app.server.agent") as mock_agent,
+        patch("app.server.STREAM_COMPRESSION_ENABLED", True),
+    ):
+        mock_agent.astream.side_effect = mock_astream
+
+        client = TestClient(app)
+        response = client.post(
+            "stream_messages",
+            params={"wire_format": "compact"},
+            headers={"Accept-Encoding": "gzip"},
+            json=input_data,
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        events = [json.loads(line) for line in response.iter_lines() if line]
+        assert events == [
+            [
+                {"type": "AIMessageChunk", "content": "Hi", "id": "run-1"},
+                {"node": "agent"},
+            ]
+        ]
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_events_sse() -> None:
+    """
+    Test the SSE mode, including resuming a stream with Last-Event-ID.
+    """
+    from app.server import app
+
+    run_id = "3f2b8a6e-2f1d-4c3b-9a57-0d4f5e6a7b8c"
+
+    input_data = {
+        "input": {"messages": [{"type": "human", "content": "Hello"}]},
+        "config": {"run_id": run_id, "metadata": {}},
+    }
+    mock_events = [{"content": "first"}, {"content": "second"}]
+
+    async def mock_astream(*args: Any, **kwargs: Any) -> AsyncIterator[dict]:
+        for event in mock_events:
+            yield event
+
+    with patch("app.server.agent") as mock_agent:
+        mock_agent.astream.side_effect = mock_astream
+
+        client = TestClient(app)
+        response = client.post(
+            "stream_messages", params={"stream_format": "sse"}, json=input_data
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        ids = [line[4:] for line in response.iter_lines() if line.startswith("id: ")]
+        data = [line[6:] for line in response.iter_lines() if line.startswith("data")]
+        assert ids == [f"{run_id}:0", f"{run_id}:1", f"{run_id}:2"]
+        assert json.loads(data[1]) == {"content": "second"}
+
+        resumed = client.post(
+            "stream_messages",
+            params={"stream_format": "sse"},
+            headers={"Last-Event-ID": f"{run_id}:0"},
+            json=input_data,
+        )
+        assert [line for line in resumed.iter_lines() if line.startswith("id: ")] == [
+            f"id: {run_id}:1",
+            f"id: {run_id}:2",
+        ]
+
+        expired = client.post(
+            "stream_messages",
+            params={"stream_format": "sse"},
+            headers={"Last-Event-ID": "unknown:3"},
+            json=input_data,
+        )
+        assert expired.status_code == 404
@@ -0,0 +1,125 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any
+from unittest.mock import Mock
+
+import pytest
+import requests
+from conftest import FakeClock
+
+from app.utils.alerts import (
+    AlertPipeline,
+    TokenBucket,
+    fingerprint,
+    logs_console_url,
+    trace_console_url,
+    truncate,
+)
+
+
+def _pipeline(session: Mock, clock: FakeClock, **kwargs: Any) -> AlertPipeline:
+    return AlertPipeline(
+        "https://hooks.example/a", session=lambda: session, clock=clock, **kwargs
+    )
+
+
+def test_fingerprint_ignores_variable_parts() -> None:
+    """Test that alerts differing only by ids and numbers share a fingerprint."""
+    assert fingerprint("Timeout after 30s on 10.0.0.1:80") == fingerprint(
+        "Timeout after 45s on 10.0.0.7:80"
+    )
+    assert fingerprint("Timeout on db") != fingerprint("Connection refused on db")
+
+
+def test_truncate_links_to_full_data() -> None:
+    """Test that long texts are cut to max_chars and point to the full data."""
+    text = truncate("x" * 100, 50, link="https://example.com/full")
+    assert len(text) == 50
+    assert text.endswith("full data: https://example.com/full")
+    assert truncate("short", 50) == "short"
+    assert truncate("short", 50, link="https://e.co") == (
+        "short\nDetails: https://e.co"
+    )
+
+
+def test_console_urls_point_to_the_alerted_data() -> None:
+    """Test that alerts can link a specific trace or log query."""
+    assert trace_console_url("p", "abc") == (
+        "https://console.cloud.google.com/traces/list?project=p&tid=abc"
+    )
+    assert logs_console_url("p", 'severity>="ERROR"') == (
+        "https://console.cloud.google.com/logs/query;"
+        "query=severity%3E%3D%22ERROR%22?project=p"
+    )
+
+
+def test_token_bucket_refills(clock: FakeClock) -> None:
+    """Test that the bucket allows a burst and then refills at its rate."""
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock)
+    assert [bucket.try_take() for _ in range(3)] == [True, True, False]
+    clock.now = 2.0
+    assert bucket.try_take()
+    assert not bucket.try_take()
+
+
+def test_duplicates_are_suppressed_and_reported(clock: FakeClock) -> None:
+    """Test deduplication within the window and the suppressed count."""
+    session = Mock()
+    session.post.return_value.status_code = 200
+    pipeline = _pipeline(session, clock, dedup_window=60)
+
+    assert pipeline.submit("Error in request 123")
+    assert not pipeline.submit("Error in request 456")
+    clock.now = 61.0
+    assert pipeline.submit("Error in request 789")
+    pipeline.join()
+
+    assert pipeline.suppressed == 1
+    assert session.post.call_count == 2
+    last = session.post.call_args.kwargs["json"]["attachments"][0]["text"]
+    assert "1 similar alerts suppressed" in last
+
+
+def test_alerts_are_rate_limited_per_webhook(clock: FakeClock) -> None:
+    """Test that distinct alerts beyond the burst are rejected per webhook."""
+    session = Mock()
+    session.post.return_value.status_code = 200
+    pipeline = _pipeline(session, clock, rate=0, burst=2)
+
+    results = [pipeline.submit(f"alert {name}") for name in "abc"]
+    assert results == [True, True, False]
+    assert pipeline.submit("alert d", webhook_url="https://hooks.example/b")
+    pipeline.join()
+    assert pipeline.rate_limited == 1
+    assert pipeline.sent == 3
+
+
+def test_transient_failures_are_retried(
+    monkeypatch: pytest.MonkeyPatch, clock: FakeClock
+) -> None:
+    """Test that errors and retryable statuses are retried, others are not."""
+    monkeypatch.setattr("app.utils.alerts.time.sleep", lambda _: None)
+    ok = Mock(status_code=200)
+    busy = Mock(status_code=503, headers={}, text="busy")
+    session = Mock()
+    session.post.side_effect = [requests.ConnectionError(), busy, ok]
+    pipeline = _pipeline(session, clock)
+    assert pipeline.post("https://hooks.example/a", {})
+    assert session.post.call_count == 3
+
+    session.post.side_effect = None
+    session.post.return_value = Mock(status_code=404, headers={}, text="no")
+    assert not pipeline.post("https://hooks.example/a", {})
+    assert pipeline.failed == 1
@@ -0,0 +1,106 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from typing import Any
+from unittest.mock import Mock
+
+import pytest
+
+from app.utils.clients import ClientRegistry, ClientSpec
+
+
+@pytest.fixture
+def registry() -> ClientRegistry:
+    """Create a registry whose clients are checked on every access."""
+    return ClientRegistry(health_check_interval=0, retire_grace=0)
+
+
+def test_get_shares_client_per_key(registry: ClientRegistry) -> None:
+    """Test that clients are created once per key and shared across threads."""
+    factory = Mock(side_effect=lambda project: object())
+    registry.register("logging", ClientSpec(factory=factory))
+
+    results: list[Any] = []
+    threads = [
+        threading.Thread(target=lambda: results.append(registry.get("logging", "p")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in results}) == 1
+    assert registry.get("logging", "other") is not results[0]
+    assert factory.call_count == 2
+
+
+def test_failed_health_check_rebuilds_client(registry: ClientRegistry) -> None:
+    """Test that an unhealthy client is closed and replaced."""
+    close = Mock()
+    healthy = {"value": True}
+    registry.register(
+        "github",
+        ClientSpec(
+            factory=object,
+            health_check=lambda client: healthy["value"],
+            close=close,
+        ),
+    )
+    first = registry.get("github")
+    assert registry.get("github") is first
+
+    healthy["value"] = False
+    second = registry.get("github")
+    assert second is not first
+    close.assert_called_once_with(first)
+
+
+def test_call_reconnects_once_on_transport_error(registry: ClientRegistry) -> None:
+    """Test that `call` rebuilds the client and retries after a transport error."""
+    registry.register(
+        "trace", ClientSpec(factory=object, reconnect_on=(ConnectionError,))
+    )
+    seen: list[Any] = []
+
+    def flaky(client: Any) -> str:
+        seen.append(client)
+        if len(seen) == 1:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    assert registry.call("trace", flaky) == "ok"
+    assert seen[0] is not seen[1]
+
+    with pytest.raises(ValueError):
+        registry.call("trace", Mock(side_effect=ValueError("bad request")))
+
+
+def test_replaced_client_is_closed_after_in_flight_calls() -> None:
+    """Test that a client replaced mid-call is closed only once the call ends."""
+    registry = ClientRegistry(retire_grace=0)
+    close = Mock()
+    registry.register("http", ClientSpec(factory=object, close=close))
+    closed_during_call = []
+
+    def use(client: Any) -> Any:
+        registry.invalidate("http")
+        assert registry.get("http") is not client
+        closed_during_call.append(close.called)
+        return client
+
+    client = registry.call("http", use)
+    assert closed_during_call == [False]
+    close.assert_called_once_with(client)
@@ -0,0 +1,63 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import zlib
+from collections.abc import AsyncIterator
+
+import pytest
+import zstandard
+
+from app.utils.compression import compress_stream, negotiate
+
+
+def test_negotiate_prefers_highest_quality() -> None:
+    """Test encoding negotiation from Accept-Encoding headers."""
+    assert negotiate(None) is None
+    assert negotiate("identity") is None
+    assert negotiate("gzip") == "gzip"
+    assert negotiate("gzip, zstd") == "zstd"
+    assert negotiate("gzip;q=1.0, zstd;q=0.5") == "gzip"
+    assert negotiate("gzip;q=0, zstd;q=0") is None
+    assert negotiate("*") == "zstd"
+
+
+async def chunks(*items: str) -> AsyncIterator[str]:
+    """Yield the given chunks."""
+    for item in items:
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_gzip_chunks_are_decodable_immediately() -> None:
+    """Test that each compressed chunk decodes without waiting for the end."""
+    decoder = zlib.decompressobj(31)
+    decoded = []
+    async for data in compress_stream(chunks("first\n", "second\n"), "gzip"):
+        decoded.append(decoder.decompress(data))
+
+    assert decoded[:2] == [b"first\n", b"second\n"]
+    assert b"".join(decoded) == b"first\nsecond\n"
+    assert decoder.eof
+
+
+@pytest.mark.asyncio
+async def test_zstd_stream_round_trips() -> None:
+    """Test that a zstd stream decodes chunk by chunk."""
+    decoder = zstandard.ZstdDecompressor().decompressobj()
+    decoded = [
+        decoder.decompress(data)
+        async for data in compress_stream(chunks("a" * 1000, "b"), "zstd")
+    ]
+    assert decoded[0] == b"a" * 1000
+    assert b"".join(decoded) == b"a" * 1000 + b"b"
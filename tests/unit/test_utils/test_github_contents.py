@@ -0,0 +1,106 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from typing import Any, cast
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from app.utils.github_contents import CachedContent, ContentCache, GitHubContents
+
+SHA_1 = "1" * 40
+SHA_2 = "2" * 40
+
+
+class FakeGitHub:
+    """Serves commit SHAs and raw file contents, honoring If-None-Match."""
+
+    def __init__(self) -> None:
+        self.head = SHA_1
+        self.files = {"app/main.py": "print('hello')\n"}
+        self.requests: list[tuple[str, int]] = []
+
+    def get(self, url: str, headers: dict[str, str], timeout: float) -> Mock:
+        if "/commits/" in url:
+            body, etag = self.head, f'"{self.head}"'
+        else:
+            path = url.split("/contents/")[1].split("?")[0]
+            body = self.files[path]
+            etag = f'"{hash(body)}"'
+        status = 304 if headers.get("If-None-Match") == etag else 200
+        self.requests.append((url, status))
+        response = Mock(status_code=status, headers={"ETag": etag})
+        response.content = b"" if status == 304 else body.encode()
+        return response
+
+
+@pytest.fixture
+def github() -> FakeGitHub:
+    """Create a fake GitHub API."""
+    return FakeGitHub()
+
+
+def make_reader(github: FakeGitHub, **kwargs: Any) -> GitHubContents:
+    """Create a reader backed by the fake API."""
+    session = cast(requests.Session, github)
+    return GitHubContents("org/repo", "token", session=lambda: session, **kwargs)
+
+
+def test_read_is_cached_per_commit(github: FakeGitHub) -> None:
+    """Test that repeated reads at the same commit hit the cache."""
+    reader = make_reader(github)
+    assert reader.read("app/main.py", "dev") == "print('hello')\n"
+    assert reader.read("/app/main.py", "dev") == "print('hello')\n"
+    assert len(github.requests) == 2  # One ref resolution, one file download.
+
+
+def test_unchanged_file_at_new_commit_costs_a_304(github: FakeGitHub) -> None:
+    """Test that a moved branch revalidates the file with its previous ETag."""
+    reader = make_reader(github, ref_ttl=0)
+    reader.read("app/main.py", "dev")
+
+    github.head = SHA_2
+    assert reader.read("app/main.py", "dev") == "print('hello')\n"
+    assert [status for _, status in github.requests] == [200, 200, 200, 304]
+
+    assert reader.read("app/main.py", "dev") == "print('hello')\n"
+    assert github.requests[-1][1] == 304  # Only the ref was revalidated.
+
+
+def test_commit_sha_refs_skip_resolution(github: FakeGitHub) -> None:
+    """Test that a full commit SHA is used as is."""
+    make_reader(github).read("app/main.py", SHA_1)
+    assert len(github.requests) == 1
+
+
+def test_content_at_a_commit_never_expires(github: FakeGitHub) -> None:
+    """Test that content pinned to a commit SHA is not revalidated."""
+    reader = make_reader(github, cache=ContentCache(ttl=0))
+    reader.read("app/main.py", SHA_1)
+    reader.read("app/main.py", SHA_1)
+    assert len(github.requests) == 1
+
+
+def test_content_cache_lru_and_disk_tier(tmp_path: Path) -> None:
+    """Test LRU eviction in memory and reload from the disk tier."""
+    cache = ContentCache(max_entries=1, disk_dir=str(tmp_path))
+    cache.put("a", CachedContent("A", '"a"', 0.0))
+    cache.put("b", CachedContent("B", '"b"', 0.0))
+
+    reloaded = ContentCache(max_entries=1, disk_dir=str(tmp_path))
+    entry, fresh = reloaded.get("a")
+    assert entry == CachedContent("A", '"a"', 0.0)
+    assert fresh is False
@@ -0,0 +1,107 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from app.utils.history import compact_history, estimate_tokens, stub_tool_message
+from app.utils.result_store import ResultStore
+
+
+def text(message: BaseMessage) -> str:
+    """Return the content of a message holding plain text."""
+    assert isinstance(message.content, str)
+    return message.content
+
+
+def turn(index: int, output_chars: int) -> list[BaseMessage]:
+    """Create a user turn with one tool step and a final answer."""
+    call = {"name": "get_gcp_logs", "args": {"n": index}, "id": f"call-{index}"}
+    return [
+        HumanMessage(f"question {index}"),
+        AIMessage("", tool_calls=[call]),
+        ToolMessage(
+            "x" * output_chars, name="get_gcp_logs", tool_call_id=f"call-{index}"
+        ),
+        AIMessage(f"answer {index}"),
+    ]
+
+
+def test_estimate_tokens_counts_content_and_tool_calls() -> None:
+    """Test that the estimate grows with the content and the tool call args."""
+    small = estimate_tokens(HumanMessage("x" * 40))
+    large = estimate_tokens(HumanMessage("x" * 4000))
+    assert large - small == 990
+    call = {"name": "tool", "args": {"query": "y" * 400}, "id": "1"}
+    assert estimate_tokens(AIMessage("", tool_calls=[call])) > 100
+
+
+def test_old_tool_outputs_are_stubbed() -> None:
+    """Test that only tool outputs older than the kept turns are compacted."""
+    messages = turn(0, 10_000) + turn(1, 10_000) + turn(2, 10_000)
+    compacted = compact_history(messages, keep_turns=2)
+
+    assert len(compacted) == len(messages)
+    assert isinstance(compacted[2], ToolMessage)
+    assert compacted[2].tool_call_id == "call-0"
+    assert text(compacted[2]).startswith("[Earlier get_gcp_logs output")
+    assert len(text(compacted[2])) < 400
+    assert compacted[6] is messages[6]
+    assert compacted[10] is messages[10]
+    assert messages[2].content == "x" * 10_000
+
+
+def test_oldest_turns_are_dropped_over_budget() -> None:
+    """Test that whole turns are dropped so tool calls keep their results."""
+    messages = turn(0, 4_000) + turn(1, 4_000) + turn(2, 4_000)
+    compacted = compact_history(messages, max_tokens=2_100, keep_turns=3)
+
+    assert compacted == messages[4:]
+
+
+def test_latest_tool_step_is_kept_verbatim() -> None:
+    """Test that the results of the latest tool step survive a tight budget."""
+    call = {"name": "get_gcp_logs", "args": {}, "id": "old"}
+    new_call = {"name": "get_gcp_logs", "args": {}, "id": "new"}
+    messages = [
+        HumanMessage("question"),
+        AIMessage("", tool_calls=[call]),
+        ToolMessage("a" * 8_000, name="get_gcp_logs", tool_call_id="old"),
+        AIMessage("", tool_calls=[new_call]),
+        ToolMessage("b" * 8_000, name="get_gcp_logs", tool_call_id="new"),
+    ]
+    compacted = compact_history(messages, max_tokens=2_500)
+
+    assert text(compacted[2]).startswith("[Earlier")
+    assert compacted[4] is messages[4]
+
+
+def test_stubs_name_the_stored_result(tmp_path: Path) -> None:
+    """Test that a compacted result can be read back through its handle."""
+    store = ResultStore(spill_dir=str(tmp_path), inline_limit=1_000)
+    inline = ToolMessage("x" * 500, name="get_gcp_logs", tool_call_id="a")
+    stored = ToolMessage(
+        store.wrap("y" * 5_000, "get_gcp_logs"), name="get_gcp_logs", tool_call_id="b"
+    )
+
+    stub = stub_tool_message(inline, store=store)
+    handle = text(stub).split("stored as ")[1].split(",")[0]
+    assert store.get(handle) == "x" * 500
+    assert "read_tool_result" in stub.content
+
+    stub = stub_tool_message(stored, store=store)
+    assert text(stub).startswith("[Earlier get_gcp_logs output of 5000 characters")
+    handle = text(stub).split("stored as ")[1].split(",")[0]
+    assert store.get(handle) == "y" * 5_000
@@ -0,0 +1,73 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from unittest.mock import Mock
+
+from app.utils.log_batcher import LogBatcher
+
+
+def test_entries_are_written_in_batches() -> None:
+    """Test that entries are grouped into batches of at most max_batch_size."""
+    logger = Mock()
+    batcher = LogBatcher(logger, max_batch_size=10, max_latency=5)
+    for i in range(25):
+        assert batcher.submit({"i": i})
+    batcher.shutdown()
+
+    batch = logger.batch.return_value
+    assert batch.log_struct.call_count == 25
+    assert batch.commit.call_count == 3
+    assert batcher.written == 25
+
+
+def test_batches_are_written_after_max_latency() -> None:
+    """Test that a partial batch is written once max_latency has elapsed."""
+    logger = Mock()
+    batcher = LogBatcher(logger, max_batch_size=100, max_latency=0.05)
+    batcher.submit({"i": 0})
+    time.sleep(0.3)
+
+    logger.batch.return_value.commit.assert_called_once()
+    batcher.shutdown()
+
+
+def test_overflow_and_failures_are_counted() -> None:
+    """Test drop-on-overflow accounting and failed writes."""
+    logger = Mock()
+    logger.batch.return_value.commit.side_effect = RuntimeError("unavailable")
+    batcher = LogBatcher(logger, max_latency=60, max_queue_size=2)
+    batcher.shutdown()
+
+    results = [batcher.submit({"i": i}) for i in range(4)]
+    assert results == [True, True, False, False]
+    assert batcher.dropped == 2
+    assert batcher.force_flush() is False
+    assert batcher.failed == 2
+
+
+def test_batches_are_capped_in_bytes() -> None:
+    """Test that a batch is split before it exceeds max_batch_bytes."""
+    logger = Mock()
+    batcher = LogBatcher(logger, max_batch_bytes=2500, max_latency=60)
+    batcher.shutdown()
+
+    for i in range(5):
+        batcher.submit({"i": i, "payload": "x" * 1000})
+    assert batcher.force_flush()
+
+    batch = logger.batch.return_value
+    assert batch.commit.call_count == 3
+    batch.commit.assert_called_with(partial_success=True)
+    assert batcher.written == 5
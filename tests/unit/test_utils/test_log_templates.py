@@ -0,0 +1,58 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.log_templates import TemplateMiner, mine_templates, tokenize
+
+
+def test_tokenize_masks_variables() -> None:
+    """Test that ids, numbers and addresses are masked before clustering."""
+    tokens = tokenize(
+        "user 42 from 10.0.0.1:8080 req 3f2b8c1e-1111-2222-3333-444455556666 took 12ms"
+    )
+    assert tokens == ["user", "<*>", "from", "<*>", "req", "<*>", "took", "<*>"]
+
+
+def test_miner_groups_messages_into_templates() -> None:
+    """Test that near-identical messages are merged into one template."""
+    miner = TemplateMiner()
+    for order_id in ("A1", "B2", "C3"):
+        miner.add(f"Failed to load order {order_id} from db", severity="ERROR")
+    miner.add("Connection pool exhausted", severity="ERROR")
+
+    summary = miner.summary()
+    assert len(summary) == 2
+    assert summary[0]["template"] == "Failed to load order <*> from db"
+    assert summary[0]["count"] == 3
+    assert summary[0]["severities"] == {"ERROR": 3}
+    assert len(summary[0]["exemplars"]) == 3
+
+
+def test_mine_templates_tracks_first_and_last_seen() -> None:
+    """Test the record-level helper and the first/last seen timestamps."""
+    records = [
+        {"message": "timeout calling svc", "timestamp": "2025-01-01T00:00:02Z"},
+        {"message": "timeout calling svc", "timestamp": "2025-01-01T00:00:01Z"},
+        {"message": "timeout calling svc", "timestamp": "2025-01-01T00:00:03Z"},
+        {"timestamp": "2025-01-01T00:00:04Z"},
+    ]
+    summary = mine_templates(records, top_n=1, max_exemplars=1)
+    assert summary == [
+        {
+            "template": "timeout calling svc",
+            "count": 3,
+            "first_seen": "2025-01-01T00:00:01Z",
+            "last_seen": "2025-01-01T00:00:03Z",
+            "exemplars": ["timeout calling svc"],
+        }
+    ]
@@ -0,0 +1,201 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from datetime import datetime, timezone
+from typing import Any
+from unittest.mock import Mock
+
+import pytest
+from google.cloud.logging_v2.services.logging_service_v2.pagers import (
+    ListLogEntriesPager,
+)
+from google.cloud.logging_v2.types import (
+    ListLogEntriesRequest,
+    ListLogEntriesResponse,
+)
+from google.cloud.logging_v2.types import LogEntry as GapicLogEntry
+from google.logging.type.log_severity_pb2 import LogSeverity
+
+from app.utils.logs import (
+    InvalidPageToken,
+    build_log_filter,
+    decode_page_token,
+    encode_page_token,
+    entry_from_pb,
+    project_entry,
+    read_log_page,
+)
+
+FILTER = 'resource.labels.service_name="svc"'
+
+
+def make_entry(index: int, payload: Any = None) -> Mock:
+    """Create a fake log entry."""
+    entry = Mock()
+    entry.timestamp = datetime(2025, 1, 1, 0, 0, index, tzinfo=timezone.utc)
+    entry.severity = "ERROR"
+    entry.payload = payload if payload is not None else f"message {index}"
+    entry.trace = None
+    entry.source_location = None
+    return entry
+
+
+def make_pb_entry(index: int, payload: Any = None) -> GapicLogEntry:
+    """Create a log entry as returned by the GAPIC API."""
+    entry = GapicLogEntry(
+        log_name="projects/p/logs/run",
+        severity=LogSeverity.ERROR,
+        timestamp=datetime(2025, 1, 1, 0, 0, index, tzinfo=timezone.utc),
+    )
+    if isinstance(payload, dict):
+        entry.json_payload = payload
+    else:
+        entry.text_payload = payload if payload is not None else f"message {index}"
+    return entry
+
+
+class FakeLoggingApi:
+    """Serves pages through the real `ListLogEntriesPager`, recording requests."""
+
+    def __init__(self, pages: list[list[GapicLogEntry]]) -> None:
+        self.pages = pages
+        self.requests: list[ListLogEntriesRequest] = []
+
+    def _fetch(
+        self, request: ListLogEntriesRequest, **kwargs: Any
+    ) -> ListLogEntriesResponse:
+        self.requests.append(ListLogEntriesRequest(request))
+        index = int(request.page_token.split("-")[1]) if request.page_token else 0
+        has_next = index + 1 < len(self.pages)
+        return ListLogEntriesResponse(
+            entries=self.pages[index],
+            next_page_token=f"page-{index + 1}" if has_next else "",
+        )
+
+    def list_log_entries(self, request: ListLogEntriesRequest) -> ListLogEntriesPager:
+        return ListLogEntriesPager(self._fetch, request, self._fetch(request))
+
+
+def test_project_entry_keeps_compact_fields() -> None:
+    """Test that entries are projected to compact records."""
+    record = project_entry(make_entry(1, payload={"message": "boom", "extra": "x"}))
+    assert record == {
+        "timestamp": "2025-01-01T00:00:01+00:00",
+        "severity": "ERROR",
+        "message": "boom",
+    }
+
+
+def test_read_log_page_stops_at_entry_budget_and_resumes() -> None:
+    """Test that paging stops at the budget and the token resumes mid-page."""
+    pages = [
+        [make_pb_entry(i) for i in range(3)],
+        [make_pb_entry(i) for i in range(3, 6)],
+    ]
+    client = FakeLoggingApi(pages)
+
+    first = read_log_page(client, "p", FILTER, page_size=3, max_entries=4)
+    assert [e["message"] for e in first.entries] == [f"message {i}" for i in range(4)]
+    assert first.next_page_token is not None
+
+    second = read_log_page(
+        client, "p", FILTER, page_token=first.next_page_token, max_entries=4
+    )
+    assert [e["message"] for e in second.entries] == ["message 4", "message 5"]
+    assert second.next_page_token is None
+    assert json.loads(second.to_json())["truncated"] is False
+    assert [r.page_token for r in client.requests] == ["", "page-1", "page-1"]
+    assert client.requests[0].resource_names == ["projects/p"]
+
+
+def test_read_log_page_does_not_fetch_past_budget() -> None:
+    """Test that pages after the budget is reached are never requested."""
+    pages = [[make_pb_entry(i) for i in range(3)] for _ in range(5)]
+    client = FakeLoggingApi(pages)
+
+    read_log_page(client, "p", FILTER, page_size=3, max_entries=2)
+    assert len(client.requests) == 1
+
+
+def test_read_log_page_byte_budget() -> None:
+    """Test that the byte budget bounds the returned records."""
+    pages = [[make_pb_entry(i, payload="x" * 500) for i in range(10)]]
+    page = read_log_page(FakeLoggingApi(pages), "p", FILTER, max_bytes=1200)
+    assert len(page.entries) == 2
+    assert page.next_page_token is not None
+
+
+def test_page_token_rejects_other_filter() -> None:
+    """Test that a token cannot be replayed against another query."""
+    token = encode_page_token(FILTER, "abc", 2)
+    assert decode_page_token(FILTER, token) == ("abc", 2)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token("other", token)
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(FILTER, "not-a-token")
+
+
+def test_build_log_filter_pushes_down_constraints() -> None:
+    """Test that query arguments are translated into the filter expression."""
+    filter_str = build_log_filter(
+        "svc",
+        "2025-01-01T00:00:00Z",
+        "2025-01-02T00:00:00Z",
+        min_severity="error",
+        text='say "hi"',
+        status_min=500,
+        status_max=599,
+        trace_id="abc123",
+    )
+    assert filter_str == (
+        'resource.labels.service_name="svc" '
+        'AND timestamp >= "2025-01-01T00:00:00Z" '
+        'AND timestamp < "2025-01-02T00:00:00Z" '
+        "AND severity >= ERROR "
+        'AND (textPayload:"say \\"hi\\"" OR jsonPayload.message:"say \\"hi\\"") '
+        "AND httpRequest.status >= 500 "
+        "AND httpRequest.status <= 599 "
+        'AND trace:"abc123"'
+    )
+
+
+def test_build_log_filter_rejects_unknown_severity() -> None:
+    """Test that an unknown severity is rejected before querying."""
+    with pytest.raises(ValueError):
+        build_log_filter("svc", "a", "b", min_severity="LOUD")
+
+
+def test_project_entry_custom_fields() -> None:
+    """Test the field projection, including nested payload keys."""
+    entry = make_entry(1, payload={"message": "boom", "user": {"id": 7}})
+    entry.http_request = {"status": 500}
+    entry.labels = {}
+    record = project_entry(entry, ["http_request", "payload.user.id", "labels"])
+    assert record == {"http_request": {"status": 500}, "payload.user.id": 7}
+
+
+def test_entry_from_pb_matches_the_logging_client_entries() -> None:
+    """Test that GAPIC entries project like `google.cloud.logging` entries."""
+    entry = make_pb_entry(1, payload={"message": "boom", "user": {"id": 7}})
+    entry.source_location.line = 12
+    converted = entry_from_pb(entry)
+    assert converted.severity == "ERROR"
+    assert converted.source_location == {"line": 12}
+    record = project_entry(converted, ["timestamp", "message", "payload.user.id"])
+    assert record == {
+        "timestamp": "2025-01-01T00:00:01+00:00",
+        "message": "boom",
+        "payload.user.id": 7,
+    }
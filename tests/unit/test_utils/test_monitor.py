@@ -0,0 +1,110 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+from pathlib import Path
+
+from conftest import FakeClock
+
+from app.utils.monitor import Anomaly, AnomalyMonitor, Ewma
+
+
+def _traces(count: int, errors: int = 0, latency: float = 100.0) -> list[dict]:
+    return [
+        {
+            "root_span": "GET /items",
+            "latency_ms": latency,
+            "error": i < errors,
+            "error_messages": ["GET /items: HTTP 500"] if i < errors else [],
+            "start_time": None,
+            "trace_id": f"trace-{i}",
+        }
+        for i in range(count)
+    ]
+
+
+def test_ewma_tracks_mean_and_variance() -> None:
+    """Test that the baseline converges and z-scores reflect deviations."""
+    baseline = Ewma(alpha=0.5)
+    for value in [10, 12, 10, 12, 10, 12]:
+        baseline.update(value)
+    assert 10 < baseline.mean < 12
+    assert baseline.zscore(11) < 1
+    assert baseline.zscore(30) > 4
+
+
+def test_only_significant_deviations_are_reported() -> None:
+    """Test that anomalies need a warm baseline and a large deviation."""
+    monitor = AnomalyMonitor(lambda *_: [], lambda *_: [], alert=print, warmup=3)
+    for _ in range(2):
+        assert monitor.observe(_traces(20), [], 60) == []
+    assert monitor.observe(_traces(20, errors=10), [], 60) == []
+
+    monitor = AnomalyMonitor(lambda *_: [], lambda *_: [], alert=print, warmup=3)
+    for _ in range(5):
+        assert monitor.observe(_traces(20), [], 60) == []
+    assert monitor.observe(_traces(20, errors=1), [], 60) == []
+
+    anomalies = monitor.observe(_traces(20, errors=10, latency=2000), [], 60)
+    assert {(a.source, a.metric) for a in anomalies} == {
+        ("GET /items", "error_rate"),
+        ("GET /items", "p95_ms"),
+    }
+    error_rate = next(a for a in anomalies if a.metric == "error_rate")
+    assert error_rate.value == 0.5
+    assert error_rate.trace_id == "trace-9"
+    assert "HTTP 500" in error_rate.describe()
+
+
+def test_polls_resume_from_the_persisted_high_water_mark(
+    tmp_path: Path, clock: FakeClock
+) -> None:
+    """Test incremental polling, alerting and state restoration."""
+    windows: list[tuple[datetime, datetime]] = []
+    alerts: list[Anomaly] = []
+    clock.now = 1_000_000.0
+
+    def fetch_traces(start: datetime, end: datetime) -> list[dict]:
+        windows.append((start, end))
+        return _traces(10, errors=10 if len(windows) > 4 else 0)
+
+    def make() -> AnomalyMonitor:
+        return AnomalyMonitor(
+            fetch_traces,
+            lambda *_: [],
+            alerts.append,
+            state_path=str(tmp_path / "state.json"),
+            interval=60,
+            ingestion_lag=0,
+            warmup=3,
+            clock=clock,
+        )
+
+    monitor = make()
+    for _ in range(3):
+        monitor.poll()
+        clock.now += 60
+    assert all(start < end for start, end in windows)
+    assert windows[1][0] == windows[0][1]
+
+    # A restarted monitor keeps the high-water mark and the warm baselines.
+    restarted = make()
+    restarted.poll()
+    assert windows[3][0] == windows[2][1]
+    assert alerts == []
+    clock.now += 60
+    assert [a.metric for a in restarted.poll()] == ["error_rate"]
+    assert len(alerts) == 1
+    assert alerts[0].end is not None
+    assert alerts[0].end.timestamp() == clock.now
@@ -0,0 +1,85 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from conftest import FakeClock
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.utils.prompt import CACHE_REFRESH_MARGIN, PromptCache, SystemPrompt
+
+
+def test_time_line_is_rendered_per_minute(clock: FakeClock) -> None:
+    """Test that the current time follows the clock instead of import time."""
+    start = datetime(2025, 3, 1, 12, 30, 10, tzinfo=ZoneInfo("Europe/Paris"))
+    clock.now = start.timestamp()
+    prompt = SystemPrompt("Be helpful.", clock=clock)
+
+    first = prompt.time_line()
+    assert first == "Current date and time (Europe/Paris): 2025-03-01 12:30"
+    clock.now += 30
+    assert prompt.time_line() is first
+    clock.now += 60
+    assert prompt.time_line().endswith("12:31")
+
+
+def test_messages_reuse_static_prefix() -> None:
+    """Test that the static instructions are the same object on every call."""
+    prompt = SystemPrompt("Be helpful.\n")
+    conversation = [HumanMessage("hi")]
+
+    first = prompt.messages(conversation)
+    second = prompt.messages(conversation)
+    assert first[0] is second[0] is prompt.static
+    assert first[0].content == "Be helpful."
+    assert isinstance(first[1], SystemMessage)
+    assert first[2:] == conversation
+
+    cached = prompt.messages(conversation, cached=True)
+    assert isinstance(cached[0], HumanMessage)
+    assert isinstance(cached[0].content, str)
+    assert cached[0].content.startswith("Current date and time")
+    assert cached[1:] == conversation
+
+
+def test_prompt_cache_is_recreated_before_expiry(clock: FakeClock) -> None:
+    """Test that a cache is reused, then recreated shortly before it expires."""
+    created: list[float] = []
+
+    def create(ttl: float) -> str:
+        created.append(ttl)
+        return f"cache-{len(created)}"
+
+    cache = PromptCache(create, ttl=3600, clock=clock)
+    assert cache.name() == "cache-1"
+    clock.now = 3600 - CACHE_REFRESH_MARGIN - 1
+    assert cache.name() == "cache-1"
+    clock.now = 3600 - CACHE_REFRESH_MARGIN
+    assert cache.name() == "cache-2"
+    assert created == [3600, 3600]
+
+
+def test_prompt_cache_failure_falls_back(clock: FakeClock) -> None:
+    """Test that a failed creation disables caching until the retry interval."""
+    calls = []
+
+    def create(ttl: float) -> str:
+        calls.append(ttl)
+        raise RuntimeError("content too small")
+
+    cache = PromptCache(create, clock=clock)
+    assert cache.name() is None
+    assert cache.name() is None
+    assert len(calls) == 1
@@ -0,0 +1,157 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import tarfile
+from typing import Any
+from unittest.mock import MagicMock, Mock
+
+import requests
+
+from app.utils.repo_index import RepoIndex, trigrams
+
+SHA_1 = "1" * 40
+SHA_2 = "2" * 40
+
+
+def make_tarball(files: dict[str, str]) -> bytes:
+    """Build a GitHub-style tarball with a top-level directory."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for path, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(f"org-repo-{SHA_1[:7]}/{path}")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def make_index(
+    files: dict[str, str], compare: list[dict[str, Any]], status: str = "ahead"
+) -> tuple[RepoIndex, Mock]:
+    """Create a mirror backed by a fake tarball and compare API, and its reader."""
+    session = Mock()
+
+    def get(url: str, **kwargs: Any) -> Any:
+        if "/tarball/" in url:
+            response = MagicMock()
+            response.__enter__.return_value = response
+            response.raw = io.BytesIO(make_tarball(files))
+            return response
+        return Mock(
+            status_code=200,
+            json=Mock(return_value={"status": status, "files": compare}),
+        )
+
+    session.get.side_effect = get
+    contents = Mock()
+    contents.resolve_ref.return_value = SHA_1
+    contents.read.side_effect = lambda path, ref: f"# {path} at {ref}\nnew_handler()\n"
+    index = RepoIndex("org/repo", "token", contents=contents, session=lambda: session)
+    return index, contents
+
+
+FILES = {
+    "app/main.py": "import os\n\ndef handler():\n    raise ValueError('boom')\n",
+    "app/utils/db.py": "def connect():\n    return None\n",
+    "README.md": "Handler docs\n",
+}
+
+
+def test_trigrams() -> None:
+    """Test trigram extraction."""
+    assert trigrams("AbcD") == {"abc", "bcd"}
+
+
+def test_search_paths_and_code_from_snapshot() -> None:
+    """Test that searches are answered from the indexed snapshot."""
+    index, _ = make_index(FILES, [])
+    index.sync()
+
+    assert index.ready.is_set()
+    assert index.search_paths("APP/") == ["app/main.py", "app/utils/db.py"]
+    matches = index.search_code("valueerror", context_lines=1)
+    assert matches == [
+        {
+            "path": "app/main.py",
+            "line": 4,
+            "snippet": "3: def handler():\n4:     raise ValueError('boom')",
+        }
+    ]
+    assert [m["path"] for m in index.search_code("handler")] == [
+        "README.md",
+        "app/main.py",
+    ]
+
+
+def test_sync_applies_incremental_changes() -> None:
+    """Test that a moved head only re-indexes the changed files."""
+    compare = [
+        {"filename": "app/main.py", "status": "modified"},
+        {"filename": "app/utils/db.py", "status": "removed"},
+        {
+            "filename": "app/new.py",
+            "status": "renamed",
+            "previous_filename": "README.md",
+        },
+    ]
+    index, contents = make_index(FILES, compare)
+    index.sync()
+
+    contents.resolve_ref.return_value = SHA_2
+    index.sync()
+
+    assert index.sha == SHA_2
+    assert index.search_paths("") == ["app/main.py", "app/new.py"]
+    assert [m["path"] for m in index.search_code("new_handler")] == [
+        "app/main.py",
+        "app/new.py",
+    ]
+    assert index.search_code("valueerror") == []
+    assert contents.read.call_count == 2
+
+
+def test_unreadable_files_do_not_block_the_sync() -> None:
+    """Test that a file that cannot be read is listed without content."""
+    compare = [
+        {"filename": "app/main.py", "status": "modified"},
+        {"filename": "vendor/lib", "status": "added"},
+    ]
+    index, contents = make_index(FILES, compare)
+    index.sync()
+    contents.resolve_ref.return_value = SHA_2
+
+    def read(path: str, ref: str) -> str:
+        if path == "vendor/lib":
+            raise requests.HTTPError("404 Not Found")
+        return "new_handler()\n"
+
+    contents.read.side_effect = read
+    index.sync()
+
+    assert index.sha == SHA_2
+    assert "vendor/lib" in index.search_paths("vendor")
+    assert [m["path"] for m in index.search_code("new_handler")] == ["app/main.py"]
+
+
+def test_force_push_rebuilds_the_mirror() -> None:
+    """Test that a head that does not descend from the base is rebuilt."""
+    index, contents = make_index(FILES, [], status="diverged")
+    index.sync()
+    contents.resolve_ref.return_value = SHA_2
+    index.sync()
+
+    assert index.sha == SHA_2
+    contents.read.assert_not_called()
+    assert index.search_paths("") == sorted(FILES)
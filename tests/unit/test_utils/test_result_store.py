@@ -0,0 +1,124 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from app.utils.result_store import ResultStore, UnknownHandle
+
+
+def test_small_results_stay_inline(tmp_path: Path) -> None:
+    """Test that results under the inline limit are returned unchanged."""
+    store = ResultStore(spill_dir=str(tmp_path), inline_limit=100)
+    assert store.wrap("short", "tool") == "short"
+
+
+def test_wrap_returns_handle_and_preview(tmp_path: Path) -> None:
+    """Test that large results are stored once and referenced by a handle."""
+    store = ResultStore(spill_dir=str(tmp_path), inline_limit=10, preview_chars=5)
+    content = "\n".join(f"line {i}" for i in range(100))
+
+    first = json.loads(store.wrap(content, "get_gcp_logs"))
+    second = json.loads(store.wrap(content, "get_gcp_logs"))
+
+    assert first["result_handle"] == second["result_handle"]
+    assert first["preview"] == "line "
+    assert first["lines"] == 100
+    assert store.get(first["result_handle"]) == content
+
+
+def test_results_spill_to_disk(tmp_path: Path) -> None:
+    """Test that results evicted from memory are still readable from disk."""
+    store = ResultStore(spill_dir=str(tmp_path), max_memory_bytes=1500)
+    handles = [store.put(str(i) * 1000) for i in range(3)]
+
+    assert len(list(Path(store.spill_dir).iterdir())) == 2
+    assert [store.get(h) for h in handles] == [str(i) * 1000 for i in range(3)]
+    with pytest.raises(UnknownHandle):
+        store.get("res_0000000000000000")
+    with pytest.raises(UnknownHandle):
+        store.get("../../etc/passwd")
+
+
+def test_spilled_results_are_capped_and_cleaned_up(tmp_path: Path) -> None:
+    """Test that the oldest spilled results expire and close deletes the rest."""
+    store = ResultStore(
+        spill_dir=str(tmp_path), max_memory_bytes=1000, max_disk_bytes=2000
+    )
+    other = ResultStore(spill_dir=str(tmp_path))
+    handles = [store.put(str(i) * 1000) for i in range(4)]
+
+    assert store.spill_dir != other.spill_dir
+    assert len(list(Path(store.spill_dir).iterdir())) == 2
+    with pytest.raises(UnknownHandle):
+        store.get(handles[0])
+    assert [store.get(h) for h in handles[1:]] == [str(i) * 1000 for i in (1, 2, 3)]
+
+    store.close()
+    assert not os.path.exists(store.spill_dir)
+    assert os.path.exists(other.spill_dir)
+
+
+def test_read_pages_and_greps(tmp_path: Path) -> None:
+    """Test paging through lines and filtering them with a pattern."""
+    store = ResultStore(spill_dir=str(tmp_path))
+    handle = store.put(
+        "\n".join(f"{'ERROR' if i % 3 == 0 else 'INFO'} {i}" for i in range(10))
+    )
+
+    page = store.read(handle, offset=0, limit=4)
+    assert page["lines"] == ["1: ERROR 0", "2: INFO 1", "3: INFO 2", "4: ERROR 3"]
+    assert page["next_offset"] == 4
+    assert store.read(handle, offset=8, limit=4)["next_offset"] is None
+
+    matches = store.read(handle, pattern="error")
+    assert matches["total"] == 4
+    assert matches["lines"][-1] == "10: ERROR 9"
+
+
+def test_single_line_json_results_are_paged(tmp_path: Path) -> None:
+    """Test that every part of a single-line JSON result can be reached."""
+    store = ResultStore(spill_dir=str(tmp_path))
+    entries = [{"message": f"request {i} failed"} for i in range(2_000)]
+    entries[1_500]["message"] = "x" * 5_000 + " deadline exceeded"
+    handle = store.put(json.dumps({"entries": entries, "count": len(entries)}))
+
+    page = store.read(handle, limit=10)
+    assert page["total"] > 2_000
+    assert page["next_offset"] == 10
+    matches = store.read(handle, pattern="deadline exceeded")
+    assert matches["total"] == 1
+    assert "deadline exceeded" in matches["lines"][0]
+    assert store.read(handle, pattern="request 1999 failed")["total"] == 1
+
+
+def test_aggregate_counts_field_values(tmp_path: Path) -> None:
+    """Test counting a nested field across the records of a JSON result."""
+    store = ResultStore(spill_dir=str(tmp_path))
+    entries = [
+        {"severity": "ERROR", "payload": {"status": 500}},
+        {"severity": "ERROR", "payload": {"status": 503}},
+        {"severity": "INFO", "payload": {"status": 500}},
+    ]
+    handle = store.put(json.dumps({"entries": entries, "count": 3}))
+
+    result = store.aggregate(handle, "payload.status")
+    assert result["records"] == 3
+    assert result["top_values"][0] == {"value": 500, "count": 2}
+
+    with pytest.raises(ValueError):
+        store.aggregate(store.put("not json"), "severity")
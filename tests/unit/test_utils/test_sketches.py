@@ -0,0 +1,105 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from app.utils.sketches import DDSketch, LatencySketches
+
+
+def _record(trace_id: str, minute: int, latency: float, span: str = "GET /") -> dict:
+    return {
+        "trace_id": trace_id,
+        "root_span": span,
+        "start_time": f"2025-01-01T00:{minute:02d}:00+00:00",
+        "latency_ms": latency,
+    }
+
+
+def test_quantiles_are_within_relative_accuracy() -> None:
+    """Test the sketch quantiles against exact nearest-rank values."""
+    rng = random.Random(0)
+    values = sorted(rng.lognormvariate(4, 1) for _ in range(10_000))
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        estimate = sketch.quantile(q)
+        assert estimate is not None
+        assert abs(estimate - exact) <= 0.01 * exact
+
+
+def test_merged_sketches_equal_a_single_sketch() -> None:
+    """Test that merging, including through serialization, is exact."""
+    whole, first, second = DDSketch(), DDSketch(), DDSketch()
+    for i in range(1, 1000):
+        whole.add(i)
+        (first if i % 2 else second).add(i)
+    first.merge(DDSketch.from_dict(second.to_dict()))
+    assert first.bins == whole.bins
+    assert first.quantile(0.95) == whole.quantile(0.95)
+
+
+def test_windows_are_compared_per_span() -> None:
+    """Test window comparison, deduplication of traces and merged stores."""
+    store = LatencySketches(bucket_seconds=300)
+    records = [_record(f"a{i}", 1, 100) for i in range(50)]
+    records += [_record(f"b{i}", 11, 1000) for i in range(50)]
+    assert store.add_trace_records(records, "api") == 100
+    assert store.add_trace_records(records[:10], "api") == 0
+
+    other = LatencySketches(bucket_seconds=300)
+    other.add_trace_records([_record("c", 11, 100, span="POST /")], "api")
+    store.load(other.to_dict())
+
+    rows = store.compare(
+        ("2025-01-01T00:00:00Z", "2025-01-01T00:05:00Z"),
+        ("2025-01-01T00:10:00Z", "2025-01-01T00:15:00Z"),
+    )
+    assert [row["span"] for row in rows] == ["GET /", "POST /"]
+    slow = rows[0]
+    assert slow["baseline"]["count"] == 50
+    assert abs(slow["current"]["p95_ms"] - 1000) <= 10
+    assert slow["histogram_delta"] == {"50-100ms": -1.0, "500-1000ms": 1.0}
+
+
+def test_missing_returns_unfed_ranges() -> None:
+    """Test that covered ranges are merged and subtracted."""
+    store = LatencySketches(bucket_seconds=100)
+    store.mark_covered(100, 200)
+    store.mark_covered(150, 300)
+    gaps = store.missing(0, 400)
+    assert [(s.timestamp(), e.timestamp()) for s, e in gaps] == [(0, 100), (300, 400)]
+    assert store.missing(120, 280) == []
+
+
+def test_missing_ranges_are_whole_buckets() -> None:
+    """Test that partly fed edge buckets are reported as missing."""
+    store = LatencySketches(bucket_seconds=100)
+    store.mark_covered(150, 320)
+    gaps = store.missing(160, 350)
+    assert [(s.timestamp(), e.timestamp()) for s, e in gaps] == [(100, 200), (300, 400)]
+
+
+def test_truncated_ranges_are_covered_but_reported() -> None:
+    """Test that a truncated fetch is not refetched but flagged."""
+    store = LatencySketches(bucket_seconds=100)
+    store.mark_covered(100, 200, complete=False)
+    store.mark_covered(200, 300)
+    assert store.missing(100, 300) == []
+    assert store.truncated(150, 250)
+    assert not store.truncated(200, 300)
+    restored = LatencySketches()
+    restored.load(store.to_dict())
+    assert restored.truncated(100, 200)
@@ -0,0 +1,69 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.source_slice import Block, enclosing_block, slice_lines
+
+PYTHON_SOURCE = """import os
+
+
+class Orders:
+    @property
+    def total(self):
+        return sum(self.items)
+
+    def load(self, order_id):
+        row = db.get(order_id)
+        if row is None:
+            raise KeyError(order_id)
+        return row
+"""
+
+JS_SOURCE = """const x = 1;
+
+function loadOrder(id) {
+  const row = db.get(id);
+  if (!row) {
+    throw new Error("missing");
+  }
+  return row;
+}
+
+module.exports = { loadOrder };
+"""
+
+
+def test_slice_lines() -> None:
+    """Test line-range reads with clamping."""
+    assert slice_lines("a\nb\nc\nd", 2, 3) == "2: b\n3: c"
+    assert slice_lines("a\nb", 2, 10) == "2: b"
+
+
+def test_enclosing_python_method() -> None:
+    """Test that the innermost Python definition is found with the AST."""
+    assert enclosing_block(PYTHON_SOURCE, 12, "orders.py") == Block("load", 9, 13)
+    assert enclosing_block(PYTHON_SOURCE, 6, "orders.py") == Block("total", 5, 7)
+    assert enclosing_block(PYTHON_SOURCE, 8, "orders.py") == Block("Orders", 4, 13)
+
+
+def test_enclosing_block_heuristic_for_other_languages() -> None:
+    """Test the indentation heuristic, including the closing brace."""
+    block = enclosing_block(JS_SOURCE, 6, "orders.js")
+    assert (block.start, block.end) == (3, 9)
+    assert block.name == "function loadOrder(id) {"
+
+
+def test_enclosing_block_falls_back_to_window() -> None:
+    """Test the window fallback outside of any definition."""
+    text = "\n".join(f"line {i}" for i in range(1, 101))
+    assert enclosing_block(text, 50, "notes.txt") == Block(None, 30, 70)
@@ -0,0 +1,142 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app.utils.sources import (
+    Source,
+    SourceRegistry,
+    decode_cursor,
+    encode_cursor,
+    load_sources,
+    merge_by_timestamp,
+)
+
+DEFAULT = Source("api", "prod", "api")
+
+
+def test_load_sources_from_json_or_file(tmp_path: Path) -> None:
+    """Test both configuration shapes, inline and from a file."""
+    config = {"web": {"project": "prod", "service": "web"}}
+    path = tmp_path / "sources.json"
+    path.write_text(json.dumps(config))
+    assert load_sources(str(path)) == [Source("web", "prod", "web")]
+    assert load_sources('[{"name": "jobs", "project": "batch"}]') == [
+        Source("jobs", "batch", None)
+    ]
+    assert load_sources('{"web": {"trace_label": "app"}}') == [
+        Source("web", None, None, "app")
+    ]
+    assert load_sources(None) == []
+    with pytest.raises(ValueError):
+        load_sources('[{"project": "prod"}]')
+
+
+def test_resolve_sources() -> None:
+    """Test the default, named, all and unknown sources."""
+    web = Source("web", "prod", "web")
+    registry = SourceRegistry([web], DEFAULT)
+    assert registry.resolve(None) == [DEFAULT]
+    assert registry.resolve(["web", "web"]) == [web]
+    assert registry.resolve(["all"]) == [web, DEFAULT]
+    with pytest.raises(ValueError, match="Unknown sources"):
+        registry.resolve(["nope"])
+
+
+def test_fan_out_isolates_slow_and_failing_sources() -> None:
+    """Test concurrency, per-source timeouts and errors."""
+    release = threading.Event()
+    sources = [Source(name, None, name) for name in ("fast", "slow", "broken")]
+
+    def query(source: Source) -> str:
+        if source.name == "slow":
+            release.wait(5)
+        if source.name == "broken":
+            raise RuntimeError("unavailable")
+        return source.name.upper()
+
+    registry = SourceRegistry(sources, DEFAULT, timeout=0.2)
+    results, errors = registry.fan_out(sources, query)
+    release.set()
+    assert results == {"fast": "FAST"}
+    assert errors["slow"] == "timed out after 0.2 seconds"
+    assert "unavailable" in errors["broken"]
+
+
+def test_trace_label_only_tells_apart_shared_projects() -> None:
+    """Test that only sources sharing a project, or configured, are labelled."""
+    web = Source("web", "prod", "web")
+    jobs = Source("jobs", "batch", "jobs")
+    worker = Source("worker", None, "worker")
+    labelled = Source("db", "data", "db", trace_label="app")
+    registry = SourceRegistry([web, jobs, worker, labelled], DEFAULT)
+    assert registry.trace_label(DEFAULT, "service.name") == ""
+    assert registry.trace_label(web, "service.name") == "service.name"
+    assert registry.trace_label(worker, "service.name") == "service.name"
+    assert registry.trace_label(jobs, "service.name") == ""
+    assert registry.trace_label(labelled, "service.name") == "app"
+
+
+def test_fan_out_times_sources_from_their_start() -> None:
+    """Test that queued sources get their full timeout and a bounded wait."""
+    sources = [Source(name, None, name) for name in ("a", "b")]
+
+    def query(source: Source) -> str:
+        time.sleep(0.2)
+        return source.name
+
+    registry = SourceRegistry(sources, DEFAULT, max_workers=1, timeout=0.3)
+    results, errors = registry.fan_out(sources, query)
+    assert results == {"a": "a", "b": "b"}
+    assert errors == {}
+
+    release = threading.Event()
+    hung = Source("hung", None, "hung")
+    registry = SourceRegistry([hung, *sources], DEFAULT, max_workers=1, timeout=0.2)
+    waited, errors = registry.fan_out([hung, *sources], lambda _: release.wait(5))
+    release.set()
+    assert waited == {}
+    assert errors == {
+        "hung": "timed out after 0.2 seconds",
+        "a": "did not start within 0.2 seconds",
+        "b": "did not start within 0.2 seconds",
+    }
+
+
+def test_merge_by_timestamp_attributes_sources() -> None:
+    """Test that records are interleaved in timestamp order with their source."""
+    merged = merge_by_timestamp(
+        {
+            "a": [{"timestamp": "2025-01-01T00:02:00"}, {"timestamp": None}],
+            "b": [{"timestamp": "2025-01-01T00:01:00"}],
+        }
+    )
+    assert [(r["source"], r["timestamp"]) for r in merged] == [
+        ("a", None),
+        ("b", "2025-01-01T00:01:00"),
+        ("a", "2025-01-01T00:02:00"),
+    ]
+    assert decode_cursor(encode_cursor({"a": "t"}), ["a", "b"]) == {"a": "t"}
+    with pytest.raises(ValueError):
+        decode_cursor("not a token", ["a"])
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"c": "t"}), ["a", "b"])
+    # A Cloud Logging token of a single-source query.
+    with pytest.raises(ValueError):
+        decode_cursor("EAE4nOi2_8YBSgIIAVoMCJ3L", ["a", "b"])
@@ -0,0 +1,114 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from pathlib import Path
+
+from app.utils.span_spool import SpanSpool, SpoolShipper
+
+
+def _segments(directory: Path) -> list[str]:
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+
+
+def test_unshipped_entries_are_replayed_after_restart(tmp_path: Path) -> None:
+    """Test that only committed entries are skipped when the spool is reopened."""
+    spool = SpanSpool(str(tmp_path))
+    spool.append([{"i": i} for i in range(5)])
+    entries, position = spool.read(2)
+    assert entries == [{"i": 0}, {"i": 1}]
+    spool.commit(position)
+    spool.close()
+
+    # A line torn by a crash is ignored.
+    with open(tmp_path / _segments(tmp_path)[-1], "ab") as f:
+        f.write(b'{"i": 5')
+    reopened = SpanSpool(str(tmp_path))
+    reopened.append([{"i": 6}])
+    entries, _ = reopened.read(10)
+    assert entries == [{"i": 2}, {"i": 3}, {"i": 4}, {"i": 6}]
+
+
+def test_segments_are_compacted_and_capped(tmp_path: Path) -> None:
+    """Test rotation, deletion of shipped segments and the size cap."""
+    spool = SpanSpool(str(tmp_path), segment_bytes=100, max_bytes=350)
+    for i in range(20):
+        spool.append([{"payload": "x" * 40, "i": i}])
+    assert len(_segments(tmp_path)) <= 5
+    assert spool.dropped_segments > 0
+
+    entries, position = spool.read(1000)
+    assert entries[-1]["i"] == 19
+    spool.commit(position)
+    assert len(_segments(tmp_path)) == 1
+
+
+def test_shipper_retries_failed_writes(tmp_path: Path) -> None:
+    """Test that entries stay spooled until a write succeeds."""
+    written: list[dict] = []
+    results = iter([False, True])
+
+    def write(entries: list[dict]) -> bool:
+        if not next(results):
+            return False
+        written.extend(entries)
+        return True
+
+    spool = SpanSpool(str(tmp_path))
+    shipper = SpoolShipper(spool, write, poll_interval=60)
+    shipper.shutdown()
+    spool.append([{"i": 0}, {"i": 1}])
+    assert shipper.flush() is False
+    assert shipper.flush() is True
+
+    assert written == [{"i": 0}, {"i": 1}]
+    assert shipper.shipped == 2
+    assert spool.read(10)[0] == []
+
+
+def test_reads_are_capped_in_bytes(tmp_path: Path) -> None:
+    """Test that a read stops before exceeding max_bytes, but reads one entry."""
+    spool = SpanSpool(str(tmp_path))
+    spool.append([{"payload": "x" * 100, "i": i} for i in range(5)])
+
+    entries, _ = spool.read(10, max_bytes=300)
+    assert [entry["i"] for entry in entries] == [0, 1]
+    entries, _ = spool.read(10, max_bytes=10)
+    assert [entry["i"] for entry in entries] == [0]
+
+
+def test_shipper_skips_permanently_rejected_batches(tmp_path: Path) -> None:
+    """Test that a rejected batch is counted and skipped, not retried forever."""
+
+    def write(entries: list[dict]) -> None:
+        if any(entry.get("invalid") for entry in entries):
+            raise ValueError("invalid entry")
+        if any(entry.get("unavailable") for entry in entries):
+            raise ConnectionError("unavailable")
+
+    spool = SpanSpool(str(tmp_path))
+    shipper = SpoolShipper(
+        spool,
+        write,
+        batch_size=1,
+        poll_interval=60,
+        is_permanent=lambda e: isinstance(e, ValueError),
+    )
+    shipper.shutdown()
+    spool.append([{"i": 0}, {"i": 1, "invalid": True}, {"unavailable": True}])
+
+    assert shipper.flush() is False
+    assert shipper.shipped == 1
+    assert shipper.skipped == 1
+    assert spool.read(10)[0] == [{"unavailable": True}]
@@ -0,0 +1,123 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+from app.utils.sse import (
+    HEARTBEAT,
+    ReplayBuffer,
+    RunLog,
+    format_event,
+    parse_event_id,
+)
+
+
+def test_format_and_parse_event() -> None:
+    """Test SSE framing of multi-line payloads and event id parsing."""
+    assert format_event("a\nb", event="message", event_id="run-1:0") == (
+        "id: run-1:0\nevent: message\ndata: a\ndata: b\n\n"
+    )
+    assert parse_event_id("4f1c:a8:12") == ("4f1c:a8", 12)
+    assert parse_event_id("garbage") is None
+
+
+@pytest.mark.asyncio
+async def test_follow_coalesces_events() -> None:
+    """Test that events produced within the window are written at once."""
+    log = RunLog("run")
+
+    async def produce() -> None:
+        for i in range(5):
+            log.append(str(i))
+            await asyncio.sleep(0.001)
+        log.finish()
+
+    producer = asyncio.create_task(produce())
+    batches = [b async for b in log.follow(window=0.5, heartbeat=5)]
+    await producer
+
+    assert len(batches) == 1
+    assert batches[0].count("event: message") == 5
+    assert batches[0].endswith("id: run:5\nevent: end\ndata: {}\n\n")
+
+
+@pytest.mark.asyncio
+async def test_follow_flushes_at_max_bytes() -> None:
+    """Test that a batch is flushed early once it reaches the byte limit."""
+    log = RunLog("run")
+    for _ in range(10):
+        log.append("x" * 100)
+    log.finish()
+
+    batches = [b async for b in log.follow(window=5, max_bytes=10)]
+    assert len(batches) == 1
+    assert batches[0].count("event: ") == 11
+
+
+@pytest.mark.asyncio
+async def test_follow_sends_heartbeats_and_resumes() -> None:
+    """Test heartbeats while idle and resuming after a given event."""
+    log = RunLog("run")
+    log.append("first")
+    stream = log.follow(window=0, heartbeat=0.01)
+
+    assert "data: first" in await anext(stream)
+    assert await anext(stream) == HEARTBEAT
+    log.append("second")
+    log.finish()
+
+    resumed = [b async for b in log.follow(after=0, window=0)]
+    assert "data: first" not in "".join(resumed)
+    assert "data: second" in "".join(resumed)
+
+
+@pytest.mark.asyncio
+async def test_follow_resets_after_evicted_events() -> None:
+    """Test that a client missing evicted events is told to restart."""
+    log = RunLog("run", max_events=3)
+    for i in range(5):
+        log.append(str(i))
+    log.finish()
+
+    assert not log.retains(1)
+    assert log.retains(2)
+    batches = [b async for b in log.follow(after=1, window=0)]
+    assert batches == [
+        format_event("Events after run:1 are no longer retained.", event="reset")
+    ]
+    resumed = "".join([b async for b in log.follow(after=2, window=0)])
+    assert "data: 3" in resumed
+
+
+def test_replay_buffer_rejects_duplicate_runs() -> None:
+    """Test that a run id cannot be reused while its log is retained."""
+    buffer = ReplayBuffer()
+    buffer.create("a")
+    with pytest.raises(ValueError):
+        buffer.create("a")
+
+
+def test_replay_buffer_evicts_finished_runs_first() -> None:
+    """Test that running runs are kept over older finished ones."""
+    buffer = ReplayBuffer(max_runs=2)
+    running = buffer.create("a")
+    finished = buffer.create("b")
+    finished.finish()
+    buffer.create("c")
+
+    assert buffer.get("a") is running
+    assert buffer.get("b") is None
+    assert buffer.get("c") is not None
@@ -0,0 +1,95 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+
+from app.utils.streaming import (
+    ConcurrencyLimiter,
+    StreamStalled,
+    bounded_stream,
+    coalesce,
+)
+
+
+async def numbers(count: int, closed: list[bool]) -> AsyncIterator[int]:
+    """Yield `count` integers, recording whether the generator was closed."""
+    try:
+        for i in range(count):
+            yield i
+    finally:
+        closed.append(True)
+
+
+def test_limiter_rejects_over_limit() -> None:
+    """Test that slots are rejected once the limit is reached, until released."""
+    limiter = ConcurrencyLimiter(2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release()
+    assert limiter.try_acquire()
+
+
+@pytest.mark.asyncio
+async def test_bounded_stream_preserves_order() -> None:
+    """Test that all items are relayed in order and the source is closed."""
+    closed: list[bool] = []
+    items = [item async for item in bounded_stream(numbers(50, closed), maxsize=4)]
+    assert items == list(range(50))
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_joins_chunks_within_window() -> None:
+    """Test that chunks are joined until the window elapses or the limit."""
+
+    async def tokens() -> AsyncIterator[str]:
+        for token in ["a", "b", "c"]:
+            yield token
+        await asyncio.sleep(0.1)
+        for token in ["dd", "ee", "ff"]:
+            yield token
+
+    batches = [b async for b in coalesce(tokens(), window=0.05, max_bytes=4)]
+    assert batches == ["abc", "ddee", "ff"]
+
+
+@pytest.mark.asyncio
+async def test_bounded_stream_cancels_stalled_consumer() -> None:
+    """Test that a consumer that stops reading gets StreamStalled."""
+    closed: list[bool] = []
+    stream = bounded_stream(numbers(100, closed), maxsize=2, stall_timeout=0.05)
+    assert await anext(stream) == 0
+    await asyncio.sleep(0.2)
+    with pytest.raises(StreamStalled):
+        async for _ in stream:
+            pass
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_bounded_stream_propagates_errors() -> None:
+    """Test that an error of the source is raised to the consumer."""
+
+    async def failing() -> AsyncIterator[int]:
+        yield 1
+        raise RuntimeError("boom")
+
+    stream = bounded_stream(failing())
+    assert await anext(stream) == 1
+    with pytest.raises(RuntimeError, match="boom"):
+        await anext(stream)
@@ -0,0 +1,138 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.graph import MessagesState
+
+from app.utils.result_store import ResultStore
+from app.utils.tool_executor import ParallelToolExecutor
+
+
+@tool
+def slow_tool(seconds: float) -> str:
+    """Sleep for the given number of seconds."""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+@tool
+def failing_tool(reason: str) -> str:
+    """Always fail."""
+    raise RuntimeError(reason)
+
+
+@tool
+def big_tool(size: int) -> str:
+    """Return a result of the given size."""
+    return "x" * size
+
+
+def make_state(*calls: tuple[str, dict]) -> MessagesState:
+    """Create a state whose last message requests the given tool calls."""
+    tool_calls = [
+        {"name": name, "args": args, "id": f"call-{i}"}
+        for i, (name, args) in enumerate(calls)
+    ]
+    return MessagesState(
+        messages=[HumanMessage("hi"), AIMessage("", tool_calls=tool_calls)]
+    )
+
+
+def test_tool_calls_run_concurrently() -> None:
+    """Test that a step costs the slowest call rather than the sum."""
+    executor = ParallelToolExecutor([slow_tool], max_workers=4)
+    state = make_state(*[("slow_tool", {"seconds": 0.3})] * 4)
+
+    started = time.monotonic()
+    result = executor(state, RunnableConfig())
+    elapsed = time.monotonic() - started
+
+    assert [m.content for m in result["messages"]] == ["slept 0.3"] * 4
+    assert [m.tool_call_id for m in result["messages"]] == [
+        "call-0",
+        "call-1",
+        "call-2",
+        "call-3",
+    ]
+    assert elapsed < 1.0
+
+
+def test_partial_failures_and_timeouts() -> None:
+    """Test that failed and timed out calls do not hide other results."""
+    executor = ParallelToolExecutor(
+        [slow_tool, failing_tool], timeout=5, timeouts={"slow_tool": 0.1}
+    )
+    state = make_state(
+        ("slow_tool", {"seconds": 1}),
+        ("failing_tool", {"reason": "quota exceeded"}),
+        ("unknown_tool", {}),
+    )
+    timed_out, failed, unknown = executor(state, RunnableConfig())["messages"]
+
+    assert timed_out.status == "error"
+    assert "timed out after 0.1 seconds" in timed_out.content
+    assert failed.status == "error"
+    assert "quota exceeded" in failed.content
+    assert unknown.status == "error"
+    assert "not a valid tool" in unknown.content
+
+
+def test_queued_calls_do_not_time_out() -> None:
+    """Test that time spent waiting for a free worker is not timed."""
+    executor = ParallelToolExecutor([slow_tool], max_workers=1, timeout=0.5)
+    state = make_state(*[("slow_tool", {"seconds": 0.2})] * 3)
+
+    for messages in (
+        executor(state, RunnableConfig())["messages"],
+        asyncio.run(executor.arun(state, RunnableConfig()))["messages"],
+    ):
+        assert [m.content for m in messages] == ["slept 0.2"] * 3
+
+
+def test_hung_calls_do_not_block_queued_calls_forever() -> None:
+    """Test that calls queued behind hung calls give up after the queue timeout."""
+    state = make_state(*[("slow_tool", {"seconds": 1.0})] * 3)
+    for run in (
+        lambda executor: executor(state, RunnableConfig()),
+        lambda executor: asyncio.run(executor.arun(state, RunnableConfig())),
+    ):
+        executor = ParallelToolExecutor(
+            [slow_tool], max_workers=1, timeout=0.1, queue_timeout=0.2
+        )
+        start = time.monotonic()
+        messages = run(executor)["messages"]
+        assert time.monotonic() - start < 0.8
+        assert "timed out" in messages[0].content
+        assert all("could not start" in m.content for m in messages[1:])
+
+
+def test_large_results_are_stored_out_of_band(tmp_path: Path) -> None:
+    """Test that large results are replaced by a handle, small ones are not."""
+    store = ResultStore(spill_dir=str(tmp_path), inline_limit=100)
+    executor = ParallelToolExecutor([big_tool], result_store=store)
+    state = make_state(("big_tool", {"size": 10}), ("big_tool", {"size": 1000}))
+    small, large = executor(state, RunnableConfig())["messages"]
+
+    assert small.content == "x" * 10
+    assert isinstance(large.content, str)
+    reference = json.loads(large.content)
+    assert reference["chars"] == 1000
+    assert store.get(reference["result_handle"]) == "x" * 1000
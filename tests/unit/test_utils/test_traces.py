@@ -0,0 +1,118 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+from google.cloud import trace_v1
+
+from app.utils.traces import (
+    iter_trace_records,
+    percentile,
+    summarize_trace_records,
+    trace_filter,
+    trace_record,
+)
+
+START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def make_trace(
+    trace_id: str,
+    root_name: str,
+    latency_ms: int,
+    error: str | None = None,
+    offset_s: int = 0,
+) -> trace_v1.Trace:
+    """Create a trace with a root span and one child span."""
+    start = START + timedelta(seconds=offset_s)
+    child_labels = {"/error/message": error} if error else {}
+    return trace_v1.Trace(
+        trace_id=trace_id,
+        spans=[
+            trace_v1.TraceSpan(
+                span_id=1,
+                name=root_name,
+                start_time=start,
+                end_time=start + timedelta(milliseconds=latency_ms),
+            ),
+            trace_v1.TraceSpan(
+                span_id=2,
+                parent_span_id=1,
+                name="db.query",
+                start_time=start,
+                end_time=start + timedelta(milliseconds=latency_ms // 2),
+                labels=child_labels,
+            ),
+        ],
+    )
+
+
+def test_percentile_nearest_rank() -> None:
+    """Test the nearest-rank percentile."""
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+
+def test_trace_record() -> None:
+    """Test the reduction of one trace to a compact record."""
+    record = trace_record(make_trace("t1", "GET /orders", 200, error="db timeout"))
+    assert record["root_span"] == "GET /orders"
+    assert record["latency_ms"] == 200
+    assert record["span_count"] == 2
+    assert record["error"] is True
+    assert record["error_messages"] == ["db.query: db timeout"]
+    assert record["slowest_spans"][0] == {"name": "GET /orders", "duration_ms": 200}
+
+
+def test_summarize_trace_records() -> None:
+    """Test the ranked, bounded summary across traces."""
+    traces = [make_trace(f"ok{i}", "GET /orders", 10 * (i + 1)) for i in range(10)]
+    traces += [
+        make_trace("e1", "POST /pay", 900, error="card 1234 declined", offset_s=1),
+        make_trace("e2", "POST /pay", 800, error="card 5678 declined", offset_s=2),
+    ]
+    summary = summarize_trace_records(iter_trace_records(traces), top_n=2)
+
+    assert summary["trace_count"] == 12
+    assert summary["error_trace_count"] == 2
+    orders = summary["by_root_span"][0]
+    assert orders["root_span"] == "GET /orders"
+    assert (orders["p50_ms"], orders["p95_ms"], orders["max_ms"]) == (50, 100, 100)
+    assert [t["trace_id"] for t in summary["slowest_traces"]] == ["e1", "e2"]
+    assert [t["trace_id"] for t in summary["error_traces"]] == ["e2", "e1"]
+    assert summary["error_templates"][0]["template"] == "db.query: card <*> declined"
+    assert summary["error_templates"][0]["count"] == 2
+
+
+def test_iter_trace_records_stops_at_limit() -> None:
+    """Test that traces past the limit are never pulled from the pager."""
+    pulled = []
+
+    def pager() -> Iterator[trace_v1.Trace]:
+        for i in range(100):
+            pulled.append(i)
+            yield make_trace(str(i), "GET /", 1)
+
+    assert len(list(iter_trace_records(pager(), limit=5))) == 5
+    assert len(pulled) == 5
+
+
+def test_trace_filter_selects_one_service() -> None:
+    """Test the exact service label filter and the project-wide fallbacks."""
+    assert trace_filter("api") == "+service.name:api"
+    assert trace_filter("api", label="") == ""
+    assert trace_filter(None) == ""
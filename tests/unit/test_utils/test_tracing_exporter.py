@@ -12,16 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import threading
+import time
 from collections.abc import Generator
+from concurrent.futures import Future
 from typing import Any
 from unittest.mock import Mock, patch
 
 import pytest
 from google.cloud import logging as google_cloud_logging
 from google.cloud import storage
-from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
 
-from app.utils.tracing import CloudTraceLoggingSpanExporter
+from app.utils.tracing import CloudTraceLoggingSpanExporter, json_size, span_to_dict
 
 
 @pytest.fixture
@@ -88,40 +98,132 @@ def test_init(exporter: CloudTraceLoggingSpanExporter) -> None:
 
 def test_store_in_gcs(exporter: CloudTraceLoggingSpanExporter) -> None:
     """Test the store_in_gcs method of CloudTraceLoggingSpanExporter."""
-    span_id = "test-span-id"
+    blob_name = "spans/attributes/abc.json"
     content = "test-content"
-    uri = exporter.store_in_gcs(content, span_id)
-    assert uri == f"gs://test-bucket/spans/{span_id}.json"
-    exporter.bucket.blob.assert_called_once_with(f"spans/{span_id}.json")
+    uri = exporter.store_in_gcs(content, blob_name)
+    assert uri == f"gs://test-bucket/{blob_name}"
+    exporter.bucket.blob.assert_called_once_with(blob_name)
 
 
-@patch("json.dumps")
 def test_process_large_attributes_small_payload(
-    mock_json_dumps: Mock, exporter: CloudTraceLoggingSpanExporter
+    exporter: CloudTraceLoggingSpanExporter,
 ) -> None:
     """Test processing of small payload attributes."""
-    mock_json_dumps.return_value = "a" * 100  # Small payload
     span_dict = {"attributes": {"key": "value"}}
-    result = exporter._process_large_attributes(span_dict, "span-id")
+    result = exporter._process_large_attributes(span_dict, "span-id").result()
     assert result == span_dict
 
 
-@patch("json.dumps")
 def test_process_large_attributes_large_payload(
-    mock_json_dumps: Mock, exporter: CloudTraceLoggingSpanExporter
+    exporter: CloudTraceLoggingSpanExporter,
 ) -> None:
     """Test processing of large payload attributes."""
-    mock_json_dumps.return_value = "a" * (400 * 1024 + 1)  # Large payload
     span_dict = {
         "attributes": {
-            "key1": "value1",
+            "key1": "a" * (400 * 1024 + 1),  # Large payload
         }
     }
-    result = exporter._process_large_attributes(span_dict, "span-id")
+    result = exporter._process_large_attributes(span_dict, "span-id").result()
     assert "uri_payload" in result["attributes"]
     assert "url_payload" in result["attributes"]
 
 
+def test_only_largest_attributes_are_offloaded(
+    exporter: CloudTraceLoggingSpanExporter,
+) -> None:
+    """Test that the largest attributes are offloaded until the rest fits."""
+    prompt = "p" * (200 * 1024)
+    completion = "c" * (100 * 1024)
+
+    def make_span_dict() -> dict:
+        return {
+            "attributes": {"prompt": prompt, "completion": completion, "model": "m"}
+        }
+
+    result = exporter._process_large_attributes(make_span_dict(), "span-1").result()
+    attributes = result["attributes"]
+    assert attributes["completion"] == completion
+    assert attributes["model"] == "m"
+    assert "prompt" not in attributes
+    assert attributes["uri_payload"].startswith("gs://test-bucket/spans/attributes/")
+    upload = exporter.bucket.blob.return_value.upload_from_string
+    assert json.loads(upload.call_args.args[0]) == {"prompt": prompt}
+
+    # Identical payloads are uploaded once, and the bucket is checked once.
+    exporter._process_large_attributes(make_span_dict(), "span-2")
+    assert exporter.force_flush()
+    assert exporter.bucket.blob.call_count == 1
+    assert exporter.bucket.exists.call_count == 1
+
+
+def test_attributes_are_truncated_without_bucket(
+    exporter: CloudTraceLoggingSpanExporter,
+) -> None:
+    """Test that oversized attributes are truncated when the bucket is missing."""
+    exporter.bucket.exists.return_value = False
+    span_dict = {"attributes": {"prompt": "p" * (300 * 1024)}}
+
+    result = exporter._process_large_attributes(span_dict, "span-id").result()
+    assert result["attributes"]["prompt"].endswith("... [truncated]")
+    assert "uri_payload" not in result["attributes"]
+    exporter.bucket.blob.assert_not_called()
+
+
+def test_attributes_are_truncated_when_upload_fails(
+    exporter: CloudTraceLoggingSpanExporter,
+) -> None:
+    """Test that no URI is recorded for attributes that failed to upload."""
+    upload = exporter.bucket.blob.return_value.upload_from_string
+    upload.side_effect = RuntimeError("forbidden")
+    span_dict = {"attributes": {"prompt": "p" * (300 * 1024)}}
+
+    result = exporter._process_large_attributes(span_dict, "span-id").result()
+    assert result["attributes"]["prompt"].endswith("... [truncated]")
+    assert "uri_payload" not in result["attributes"]
+
+
+def test_json_size_matches_encoding() -> None:
+    """Test that the size estimate follows the JSON encoding."""
+    attributes = {
+        "prompt": 'line "one"\nline two\n' * 100,
+        "unicode": "é" * 10,
+        "tokens": [1, 2, 3],
+        "streaming": True,
+        "temperature": 0.5,
+    }
+    for value in attributes.values():
+        encoded = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        assert json_size(value) == len(encoded.encode())
+
+
+def test_span_to_dict_matches_to_json() -> None:
+    """Test that the span payload has the shape of `ReadableSpan.to_json`."""
+    span_exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    tracer = provider.get_tracer(__name__)
+    with tracer.start_as_current_span("parent"):
+        with tracer.start_as_current_span(
+            "child", attributes={"text": "a\nb", "ids": (1, 2)}
+        ) as span:
+            span.add_event("event", {"key": "value"})
+
+    for finished in span_exporter.get_finished_spans():
+        span_dict, sizes = span_to_dict(finished)
+        assert span_dict == json.loads(finished.to_json())
+        assert set(sizes) == set(span_dict["attributes"])
+
+
+def test_export_skips_spans_without_context(
+    exporter: CloudTraceLoggingSpanExporter,
+) -> None:
+    """Test that a span without a context is skipped instead of failing."""
+    exporter.export([ReadableSpan("orphan", resource=Resource({}))])
+    exporter.force_flush()
+
+    exporter.logger.batch.return_value.log_struct.assert_not_called()
+
+
 @patch.object(CloudTraceLoggingSpanExporter, "_process_large_attributes")
 def test_export(
     mock_process_large_attributes: Mock, exporter: CloudTraceLoggingSpanExporter
@@ -130,11 +232,53 @@ def test_export(
     mock_span = Mock(spec=ReadableSpan)
     mock_span.get_span_context.return_value.trace_id = 123
     mock_span.get_span_context.return_value.span_id = 456
-    mock_span.to_json.return_value = '{"key": "value"}'
+    mock_span.attributes = {"key": "value"}
+    mock_span.events = []
+    mock_span.links = []
+    mock_span.parent = None
+    mock_span.context = None
+    mock_span.start_time = None
+    mock_span.end_time = None
+    mock_span.resource = Resource({})
 
-    mock_process_large_attributes.return_value = {"processed": "data"}
+    processed: Future = Future()
+    processed.set_result({"processed": "data"})
+    mock_process_large_attributes.return_value = processed
 
     exporter.export([mock_span])
+    exporter.force_flush()
 
     mock_process_large_attributes.assert_called_once()
-    exporter.logger.log_struct.assert_called_once()
+    exporter.logger.batch.return_value.log_struct.assert_called_once_with(
+        {"processed": "data"}, severity="INFO"
+    )
+    exporter.logger.batch.return_value.commit.assert_called_once()
+
+
+def test_export_does_not_wait_for_uploads(
+    exporter: CloudTraceLoggingSpanExporter,
+) -> None:
+    """Test that a span with an ongoing upload is logged once the upload is done."""
+    release = threading.Event()
+    upload = exporter.bucket.blob.return_value.upload_from_string
+    upload.side_effect = lambda *args, **kwargs: release.wait(10)
+    span_exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    with provider.get_tracer(__name__).start_as_current_span(
+        "llm", attributes={"prompt": "p" * (300 * 1024)}
+    ):
+        pass
+
+    start = time.monotonic()
+    with patch.object(CloudTraceSpanExporter, "export"):
+        exporter.export(span_exporter.get_finished_spans())
+    assert time.monotonic() - start < 1
+    log_struct = exporter.logger.batch.return_value.log_struct
+    assert not exporter.force_flush(timeout_millis=100)
+    log_struct.assert_not_called()
+
+    release.set()
+    assert exporter.force_flush()
+    entry = log_struct.call_args.args[0]
+    assert entry["attributes"]["uri_payload"].startswith("gs://test-bucket/")
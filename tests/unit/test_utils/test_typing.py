@@ -0,0 +1,64 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from langchain_core.messages import AIMessageChunk, ToolCall, ToolMessage
+
+from app.utils.typing import dumps
+
+METADATA = {
+    "langgraph_node": "agent",
+    "langgraph_step": 3,
+    "langgraph_triggers": ["start:agent"],
+    "user_id": "test-user",
+}
+
+
+def test_legacy_format_is_the_default() -> None:
+    """Test that the constructor envelope is kept unless compact is requested."""
+    event = json.loads(dumps((AIMessageChunk(content="Hi", id="run-1"), METADATA)))
+    assert event[0]["type"] == "constructor"
+    assert event[0]["kwargs"]["content"] == "Hi"
+    assert event[1] == METADATA
+
+
+def test_compact_format_for_message_chunks() -> None:
+    """Test the compact schema of streamed message chunks."""
+    chunk = AIMessageChunk(content="Hi", id="run-1")
+    event = json.loads(dumps((chunk, METADATA), "compact"))
+    assert event == [
+        {"type": "AIMessageChunk", "content": "Hi", "id": "run-1"},
+        {"node": "agent", "step": 3},
+    ]
+
+    tool_call = ToolCall(name="get_gcp_logs", args={"n": 1}, id="call-1")
+    chunk = AIMessageChunk(content="", tool_calls=[tool_call])
+    message = json.loads(dumps((chunk, METADATA), "compact"))[0]
+    assert message["tool_calls"][0]["name"] == "get_gcp_logs"
+    assert message["tool_calls"][0]["args"] == {"n": 1}
+
+
+def test_compact_format_for_tool_messages() -> None:
+    """Test the compact schema of tool results."""
+    message = ToolMessage("result", name="get_gcp_logs", tool_call_id="call-1")
+    event = json.loads(dumps((message, {}), "compact"))
+    assert event[0] == {
+        "type": "tool",
+        "content": "result",
+        "tool_call_id": "call-1",
+        "status": "success",
+        "name": "get_gcp_logs",
+    }
+    assert json.loads(dumps({"plain": [1, 2]}, "compact")) == {"plain": [1, 2]}
@@ -0,0 +1,109 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+
+from conftest import FakeClock
+
+from app.utils.window_cache import WindowCache
+
+
+class Source:
+    """One item per 10 seconds, recording the fetched ranges."""
+
+    def __init__(self, complete: bool = True) -> None:
+        self.calls: list[tuple[float, float]] = []
+        self.complete = complete
+
+    def __call__(self, start: datetime, end: datetime) -> tuple[list[float], bool]:
+        begin, finish = start.timestamp(), end.timestamp()
+        self.calls.append((begin, finish))
+        return [float(t) for t in range(int(begin), int(finish), 10)], self.complete
+
+
+def test_only_missing_buckets_are_fetched() -> None:
+    """Test that narrower and overlapping windows reuse the cached buckets."""
+    source = Source()
+    cache = WindowCache(bucket_seconds=100, clock=FakeClock(10_000))
+
+    items, complete = cache.get("q", 1000, 1600, source, timestamp=float)
+    assert complete
+    assert items == [float(t) for t in range(1000, 1600, 10)]
+    assert source.calls == [(1000, 1600)]
+
+    items, _ = cache.get("q", 1250, 1420, source, timestamp=float)
+    assert items == [float(t) for t in range(1250, 1420, 10)]
+    assert len(source.calls) == 1
+
+    cache.get("q", 800, 1800, source, timestamp=float)
+    assert source.calls[1:] == [(800, 1000), (1600, 1800)]
+    cache.get("other", 1000, 1100, source, timestamp=float)
+    assert len(source.calls) == 4
+
+
+def test_open_buckets_expire() -> None:
+    """Test that buckets fetched before they settled are refetched after the TTL."""
+    source = Source()
+    clock = FakeClock(1250)
+    cache = WindowCache(bucket_seconds=100, open_ttl=30, settle_time=60, clock=clock)
+    cache.get("q", 1000, 1300, source, timestamp=float)
+    clock.now += 20
+    cache.get("q", 1000, 1300, source, timestamp=float)
+    assert len(source.calls) == 1
+
+    clock.now += 20
+    cache.get("q", 1000, 1300, source, timestamp=float)
+    # Only the buckets that were not settled at the first fetch are refetched.
+    assert source.calls[1:] == [(1100, 1300)]
+
+
+def test_truncated_fetches_are_not_cached() -> None:
+    """Test that truncated fetches are refetched on the next query."""
+    truncated = Source(complete=False)
+    cache = WindowCache(bucket_seconds=100, clock=FakeClock(10_000))
+    assert cache.get("q", 1000, 1100, truncated, timestamp=float)[1] is False
+    cache.get("q", 1000, 1100, truncated, timestamp=float)
+    assert len(truncated.calls) == 2
+
+
+def test_fetches_above_the_budget_do_not_evict_themselves() -> None:
+    """Test that a fetch reaching the item budget evicts other queries only."""
+    source = Source()
+    cache = WindowCache(bucket_seconds=100, max_items=30, clock=FakeClock(10_000))
+    cache.get("old", 1000, 1200, source, timestamp=float)
+    cache.get("new", 1000, 1300, source, timestamp=float)
+    cache.get("new", 1000, 1300, source, timestamp=float)
+    assert source.calls == [(1000, 1200), (1000, 1300)]
+    cache.get("old", 1000, 1200, source, timestamp=float)
+    assert len(source.calls) == 3
+
+    items, complete = cache.get("big", 1000, 1400, source, timestamp=float)
+    assert complete
+    assert len(items) == 40
+    cache.get("old", 1000, 1200, source, timestamp=float)
+    assert len(source.calls) == 4
+
+
+def test_items_outside_the_fetched_range_are_not_duplicated() -> None:
+    """Test that an item returned by two fetches is kept in its own bucket only."""
+
+    def overlapping(start: datetime, end: datetime) -> tuple[list[float], bool]:
+        # Like a trace query, also return items that start just before.
+        begin, finish = int(start.timestamp()), int(end.timestamp())
+        return [float(t) for t in range(begin - 10, finish, 10)], True
+
+    cache = WindowCache(bucket_seconds=100, clock=FakeClock(10_000))
+    cache.get("q", 1000, 1100, overlapping, timestamp=float)
+    items, _ = cache.get("q", 1000, 1200, overlapping, timestamp=float)
+    assert items == [float(t) for t in range(1000, 1200, 10)]